@@ -0,0 +1,94 @@
+import math
+from camHandler import pcktsizes
+from pipeline import pixelBits
+
+# Static Defines
+packetheader = 36  # Bytes of a stream packet taken by the IP, UDP and GVSP headers
+wireoverhead = 38  # Bytes added to every packet on the wire by Ethernet framing (header, FCS, preamble and gap)
+tickfrequency = 1000000000  # Tick frequency assumed for devices not reporting GevTimestampTickFrequency (Hz)
+
+
+# Class for sharing one network link between several GigE Vision devices
+# Every device is given a share of the link bandwidth, and its inter-packet delay (GevSCPD) stretches the transmission
+# of a frame to that share, so the devices together never send faster than the link budget even when they all transmit
+# at once. The frame transmission delays (GevSCFTD) stagger the first packets of devices triggered together by the wire
+# time of the packets of the devices before them, so their packets interleave instead of colliding in the switch.
+class BandwidthScheduler:
+    # Initialization method
+    # input: handlers, list of camHandler objects of the devices sharing the link
+    # input: linkrate, bandwidth of the shared link (bytes per second)
+    def __init__(self, handlers, linkrate=125000000):
+        self.handlers = handlers  # camHandler objects of the devices sharing the link
+        self.linkrate = linkrate  # Bandwidth of the shared link (bytes per second)
+        self.usable = 0.9  # Fraction of the link bandwidth given to the devices, the rest is left for control traffic
+
+    # Method for computing the bandwidth a device needs with its current settings
+    # input: handler, camHandler object of the device
+    # return: dictionary with the packet size, packets per frame, bytes per frame on the wire, frame rate and the
+    #         bandwidth (bytes per second)
+    def requirement(self, handler):
+        size = pcktsizes[handler.getProperty("PacketSize") or 0]
+        payload = handler.getProperty("Width") * handler.getProperty("Height") * \
+            pixelBits(handler.getProperty("PixelFormat")) // 8
+        packets = math.ceil(payload / (size - packetheader)) + 2  # Image packets with the leader and trailer
+        wirebytes = packets * (size + wireoverhead)
+        fps = handler.getProperty("FPS")
+        return {"packetsize": size, "packets": packets, "wirebytes": wirebytes, "fps": fps,
+                "bandwidth": wirebytes * fps}
+
+    # Method for computing the transport schedule of the devices without applying it
+    # Every device sends at least as fast as it needs and as its largest inter-packet delay lets it, the rest of the
+    # budget is shared in proportion to the need. Raises ValueError when the devices do not fit in the budget.
+    # return: list with a dictionary per handler with the requirement, the bandwidth share and the PacketInterval and
+    #         FrameDelay in ticks
+    def plan(self):
+        budget = self.linkrate * self.usable
+        reqs = [self.requirement(handler) for handler in self.handlers]
+        ticks = [handler.getProperty("TickFrequency") or tickfrequency for handler in self.handlers]
+        lower = []  # Slowest rate every device can send at (bytes per second)
+        for handler, req, freq in zip(self.handlers, reqs, ticks):
+            packetbytes = req["packetsize"] + wireoverhead
+            maxdelay = (handler.getProperty("MaxPacketInterval") or 0) / freq
+            lower.append(max(req["bandwidth"], packetbytes / (packetbytes / self.linkrate + maxdelay)))
+        if sum(lower) > budget:
+            raise ValueError("Devices need {0:.1f} MB/s of the {1:.1f} MB/s link budget ({2})".format(
+                sum(lower) / 1e6, budget / 1e6, ", ".join(
+                    "{0} {1:.1f} MB/s at {2:.1f} FPS{3}".format(
+                        handler.getProperty("ModelName"), rate / 1e6, req["fps"],
+                        " (packet interval limit)" if rate > req["bandwidth"] else "")
+                    for handler, req, rate in zip(self.handlers, reqs, lower))))
+        total = sum(req["bandwidth"] for req in reqs)
+        slack = budget - sum(lower)
+        ret = []
+        start = 0.0  # Time the first packet of the device is sent after the frame (in s)
+        for handler, req, freq, rate in zip(self.handlers, reqs, ticks, lower):
+            share = rate + (slack * req["bandwidth"] / total if total > 0 else slack / len(reqs))
+            packetbytes = req["packetsize"] + wireoverhead
+            delay = int((packetbytes / share - packetbytes / self.linkrate) * freq)  # Rounded down, within the limit
+            framedelay = round(start * freq)
+            txtime = req["packets"] * (packetbytes / self.linkrate + delay / freq)
+            if req["fps"] > 0 and start + txtime > 1.0 / req["fps"]:  # Frames would queue up in the device
+                raise ValueError("{0} can not send a frame within its frame period of {1:.1f} ms".format(
+                    handler.getProperty("ModelName"), 1000.0 / req["fps"]))
+            if framedelay > 0 and "FrameDelay" in handler.caps and framedelay > handler.getProperty("MaxFrameDelay"):
+                raise ValueError("{0} needs a frame delay of {1} ticks, the device allows {2}".format(
+                    handler.getProperty("ModelName"), framedelay, handler.getProperty("MaxFrameDelay")))
+            entry = dict(req)
+            entry.update({"share": share, "PacketInterval": delay, "FrameDelay": framedelay, "txtime": txtime})
+            ret.append(entry)
+            start += packetbytes / self.linkrate
+        return ret
+
+    # Method for applying the transport schedule to the devices, none of them may be acquiring
+    # Nothing is changed when the schedule does not fit
+    # return: list of the schedule entries (see plan())
+    def apply(self):
+        schedule = self.plan()
+        for handler, entry in zip(self.handlers, schedule):
+            handler.setProperty("PacketInterval", entry["PacketInterval"])
+            handler.setProperty("FrameDelay", entry["FrameDelay"])
+            handler.logerror("Info: Link share {0:.1f} of {1:.1f} MB/s (needs {2:.1f} MB/s), packet interval {3}, "
+                             "frame delay {4} ticks".format(entry["share"] / 1e6, self.linkrate * self.usable / 1e6,
+                                                             entry["bandwidth"] / 1e6, entry["PacketInterval"],
+                                                             entry["FrameDelay"]))
+        return schedule
@@ -0,0 +1,227 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import cv2 as cv
+import numpy
+from camHandler import CamHandler
+from encoders import imgformats, makeEncoder
+from pipeline import Pipeline
+from preview import PreviewChannel
+from rawRecorder import RawRecorder
+from simCam import SimHarvester, SimDeviceInfo
+
+# Static Defines
+resolutions = [(256, 256), (640, 480), (1280, 1024), (2448, 2048)]  # Partial scan up to full sensor
+pixelformats = ["Mono8", "BayerRG8"]
+
+
+# Function for summarizing the measured latencies of a stage
+# input: stage, name of the stage
+# input: width, image width
+# input: height, image height
+# input: pixform, pixel format
+# input: times, list of per frame latencies in seconds
+# input: nbytes, bytes processed per frame
+# return: dictionary of results
+def summarize(stage, width, height, pixform, times, nbytes):
+    times = numpy.array(times)
+    total = times.sum()
+    return {
+        "stage": stage,
+        "width": width,
+        "height": height,
+        "pixelformat": pixform,
+        "frames": len(times),
+        "fps": len(times) / total if total > 0 else 0,
+        "mbps": nbytes * len(times) / total / 1e6 if total > 0 else 0,
+        "p50_ms": float(numpy.percentile(times, 50)) * 1000,
+        "p90_ms": float(numpy.percentile(times, 90)) * 1000,
+        "p99_ms": float(numpy.percentile(times, 99)) * 1000,
+        "max_ms": float(times.max()) * 1000,
+    }
+
+
+# Function for timing a function over several frames
+# input: func, function to be timed, called with the iteration number
+# input: frames, number of timed iterations
+# input: warmup, number of untimed iterations run first
+# return: list of latencies in seconds
+def timeit(func, frames, warmup=3):
+    for i in range(warmup):
+        func(i)
+    times = []
+    for i in range(frames):
+        t0 = time.perf_counter()
+        func(i)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+# Function for benchmarking the acquireImag stage (buffer fetch, copy and demosaic) on a simulated device
+# input: width, image width
+# input: height, image height
+# input: pixform, pixel format
+# input: frames, number of timed frames
+# return: list of latencies in seconds
+def benchAcquire(width, height, pixform, frames):
+    info = SimDeviceInfo("generic", "0001", width=width, height=height, pixelformat=pixform,
+                         fps=100000.0, maxfps=100000.0, bandwidth=1e15, mtu=0, hostpps=0)  # No link model limits
+    camHand = CamHandler(harvester=SimHarvester([info]))
+    camHand.harvester.update()
+    camHand.changeCam(0)
+    camHand.setProperty("ExposureTime", 10)
+    camHand.setProperty("FPS", camHand.getProperty("MaxFPS"))
+    camHand.changeBufnum(frames + 10)  # Never underrun, only the host side is measured
+    camHand.initFramePool()
+    camHand.cam.start_acquisition()
+
+    def acquire(i):
+        frame, tstamp = camHand.acquireImag()
+        if frame is not None:
+            frame.release()
+
+    times = timeit(acquire, frames)
+    camHand.cam.stop_acquisition()
+    camHand.changeCam(-1)
+    camHand.closeerrlog()
+    return times
+
+
+# Function for running the benchmarks of every stage for one image format
+# input: width, image width
+# input: height, image height
+# input: pixform, pixel format
+# input: frames, number of timed frames per stage
+# input: tmpdir, directory the save stages write to
+# return: list of result dictionaries
+def benchFormat(width, height, pixform, frames, tmpdir):
+    results = []
+    raw = numpy.random.randint(0, 256, (height, width), dtype=numpy.uint8)
+    color = pixform == "BayerRG8"
+    imag = cv.cvtColor(raw, cv.COLOR_BayerRGGB2RGB) if color else raw.copy()
+
+    results.append(summarize("acquire", width, height, pixform, benchAcquire(width, height, pixform, frames), raw.nbytes))
+
+    if color:
+        out = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        times = timeit(lambda i: cv.cvtColor(raw, cv.COLOR_BayerRGGB2RGB, dst=out), frames)
+        results.append(summarize("demosaic", width, height, pixform, times, raw.nbytes))
+
+    # Processing chains as run by acquireImag, from the raw image to the stored frame
+    chains = [("threshold", [("threshold", 128)]), ("rotate90", [("rotate", 90)]), ("rotate180", [("rotate", 180)]),
+              ("threshold_rotate180", [("threshold", 128), ("rotate", 180)]), ("bin2", [("bin", 2)])]
+    for stage, stages in chains:
+        pipe = Pipeline(stages + [("demosaic", None)])
+        pipe.plan(raw.shape, pixform)
+        out = numpy.empty(pipe.outshape, dtype=numpy.uint8)
+        results.append(summarize(stage, width, height, pixform, timeit(lambda i: pipe.run(raw, out), frames),
+                                 raw.nbytes))
+
+    # Preview path of the GUI: the PreviewChannel downscale to the widget size, then the QImage built by
+    # GUI.drawImage and rescaled by Screen.paintEvent
+    preview = PreviewChannel()
+    small = preview.downscale(imag)[0]
+    results.append(summarize("preview", width, height, pixform, timeit(lambda i: preview.downscale(imag), frames),
+                             imag.nbytes))
+    try:
+        import PyQt5.QtGui as QtG
+        import PyQt5.QtCore as QtC
+        qformat = QtG.QImage.Format_RGB888 if color else QtG.QImage.Format_Grayscale8
+
+        def toQImage(i):
+            qimg = QtG.QImage(small.data, small.shape[1], small.shape[0], small.strides[0], qformat)
+            qimg.scaled(preview.size[0], preview.size[1], QtC.Qt.AspectRatioMode.KeepAspectRatio)
+
+        results.append(summarize("preview_qimage", width, height, pixform, timeit(toQImage, frames), small.nbytes))
+    except ImportError:  # PyQt5 is not installed on headless machines
+        pass
+
+    for imgformat in imgformats:
+        encoder = makeEncoder(imgformat)
+        savedir = tempfile.mkdtemp(dir=tmpdir)
+        fname = os.path.join(savedir, "bench")
+        results.append(summarize("save_" + imgformat, width, height, pixform,
+                                 timeit(lambda i: encoder.write(imag, fname + str(i)), frames), imag.nbytes))
+        shutil.rmtree(savedir)
+
+    savedir = tempfile.mkdtemp(dir=tmpdir)
+    recorder = RawRecorder()
+    recorder.open(savedir, pixform)
+    results.append(summarize("save_rawstream", width, height, pixform,
+                             timeit(lambda i: recorder.append(imag, i, i), frames), imag.nbytes))
+    recorder.close()
+    shutil.rmtree(savedir)
+    return results
+
+
+# Function for comparing results against a previous run
+# input: results, list of result dictionaries of the current run
+# input: fname, result file of the previous run
+# input: tolerance, allowed throughput decrease (fraction)
+# return: list of regression descriptions
+def compare(results, fname, tolerance):
+    with open(fname, 'r') as file:
+        previous = json.load(file)["results"]
+    old = {}
+    for res in previous:
+        old[(res["stage"], res["width"], res["height"], res["pixelformat"])] = res
+    regressions = []
+    for res in results:
+        key = (res["stage"], res["width"], res["height"], res["pixelformat"])
+        if key in old and res["fps"] < old[key]["fps"] * (1 - tolerance):
+            regressions.append("%s %dx%d %s: %.1f FPS -> %.1f FPS" % (key + (old[key]["fps"], res["fps"])))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of the frame path")
+    parser.add_argument("--frames", type=int, default=50, help="timed frames per stage")
+    parser.add_argument("--out", default="bench", help="directory the result files are written to")
+    parser.add_argument("--sizes", type=int, nargs="+", metavar="N",
+                        help="resolutions given as pairs of width and height, e.g. --sizes 256 256 640 480")
+    parser.add_argument("--formats", nargs="+", choices=pixelformats, default=pixelformats, help="pixel formats")
+    parser.add_argument("--compare", help="result file of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed throughput decrease when comparing")
+    args = parser.parse_args()
+
+    sizes = resolutions
+    if args.sizes is not None:
+        sizes = list(zip(args.sizes[0::2], args.sizes[1::2]))
+    if not os.path.exists(args.out):
+        os.mkdir(args.out)
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for width, height in sizes:
+            for pixform in args.formats:
+                for res in benchFormat(width, height, pixform, args.frames, tmpdir):
+                    print("%-15s %5dx%-5d %-8s %9.1f FPS %8.1f MB/s  p50 %7.3f ms  p99 %7.3f ms" % (
+                        res["stage"], width, height, pixform, res["fps"], res["mbps"], res["p50_ms"], res["p99_ms"]))
+                    results.append(res)
+
+    string = datetime.datetime.now().strftime("%Y-%m-%d_%H;%M;%S")
+    fname = os.path.join(args.out, "bench_%s" % string)
+    with open(fname + ".json", 'w') as file:
+        json.dump({"date": string, "python": sys.version, "opencv": cv.__version__, "numpy": numpy.__version__,
+                   "frames": args.frames, "results": results}, file, indent=1)
+    with open(fname + ".csv", 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print("Results written to %s.json and %s.csv" % (fname, fname))
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.tolerance)
+        for reg in regressions:
+            print("REGRESSION: " + reg)
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
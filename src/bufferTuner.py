@@ -0,0 +1,88 @@
+import math
+from pipeline import pixelBits
+
+
+# Function for getting the GenTL data stream of an image acquirer, for reading its statistics
+# input: cam, image acquirer (harvesters ImageAcquirer or simCam.SimAcquirer)
+# return: data stream object with num_awaiting_delivery and num_underrun, None if not available
+def dataStream(cam):
+    streams = getattr(cam, "data_streams", None)
+    if streams is None:
+        streams = getattr(cam, "_data_streams", None)  # Older harvesters versions
+    if not streams:
+        return None
+    return getattr(streams[0], "module", streams[0])  # harvesters wraps the genicam.gentl.DataStream
+
+
+# Class for tuning the number of acquisition buffers between sessions from the acquisition pressure observed
+# During a session it records the deepest queue of filled buffers waiting for the host and the buffer underruns of the
+# data stream, the longest time the acquisition thread spent on a frame comes from the telemetry (processing and
+# consumers, e.g. a writer blocking on a full queue). After the session the buffer count is set to cover the deepest
+# queue or the longest stall at the measured frame rate, grown faster when frames were lost for lack of buffers and
+# shrunk gradually when buffers were left unused, within a memory budget.
+class BufferTuner:
+    # Initialization method
+    # input: handler, camHandler object whose buffers are tuned
+    def __init__(self, handler):
+        self.camHand = handler  # camHandler object of the device
+        self.minbuf = 3  # Smallest number of buffers
+        self.maxbuf = 64  # Largest number of buffers
+        self.budget = 512  # Memory budget of the buffers (in MB)
+        self.margin = 2  # Buffers added on top of the estimated need
+        self.stream = None  # Data stream of the current session, None if it has no statistics
+        self.underrun0 = 0  # Underrun count of the data stream at the start of the session
+        self.awaiting = 0  # Most filled buffers waiting for the host in the current session
+        self.samples = 0  # Number of frames sampled in the current session
+
+    # Method for starting the observation of a session, called when acquisition starts
+    def begin(self):
+        self.stream = dataStream(self.camHand.cam)
+        self.underrun0 = self.readStream("num_underrun")
+        self.awaiting = 0
+        self.samples = 0
+
+    # Method for reading a data stream counter
+    # input: name, name of the counter
+    # return: value of the counter, 0 if the producer does not report it
+    def readStream(self, name):
+        if self.stream is None:
+            return 0
+        try:
+            return int(getattr(self.stream, name))
+        except Exception:  # Optional GenTL info, not every producer implements it
+            return 0
+
+    # Method for sampling the acquisition pressure, called after every fetched frame
+    def sample(self):
+        self.samples += 1
+        self.awaiting = max(self.awaiting, self.readStream("num_awaiting_delivery"))
+
+    # Method for choosing the buffer count for the next session, called when acquisition has stopped
+    # input: fps, average frame rate of the session
+    # return: new number of buffers
+    def tune(self, fps):
+        cam = self.camHand
+        old = cam.bufnum
+        if self.samples < 2 or fps <= 0:
+            return old
+        underruns = self.readStream("num_underrun") - self.underrun0
+        stats = cam.stats
+        pixels = (cam.getProperty("Width") or 1) * (cam.getProperty("Height") or 1)
+        framesize = max(1, pixels * pixelBits(cam.getProperty("PixelFormat") or "Mono8") // 8)  # Bytes per buffer
+        limit = max(self.minbuf, min(self.maxbuf, self.budget * 1024 * 1024 // framesize))
+        stall = stats.histogram("fetch_emit").max + stats.histogram("consumers").max  # Longest time away from fetch
+        need = max(self.awaiting, math.ceil(stall * fps)) + self.margin
+        if underruns > 0:  # Frames were lost for lack of buffers, grow at least by half
+            new = max(need, old + max(1, old // 2))
+        elif need < old:  # Shrink by half of the unused buffers per session
+            new = old - (old - need + 1) // 2
+        else:
+            new = need
+        new = max(self.minbuf, min(limit, new))
+        cam.logerror("Info: Buffers {0} -> {1} (underruns {2}, lost {3}, timeouts {4}, max awaiting {5}, "
+                     "longest stall {6:.1f} ms at {7:.1f} FPS, budget limit {8})".format(
+                         old, new, underruns, stats.get("lost"), stats.get("timeouts"), self.awaiting,
+                         stall * 1000, fps, limit))
+        if new != old:
+            cam.changeBufnum(new)
+        return new
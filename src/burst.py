@@ -0,0 +1,156 @@
+import threading
+import time
+import genicam.gentl
+import numpy
+from camHandler import deviceTimestamp
+from clockSync import formatTimestamp
+from encoders import makeEncoder
+from pipeline import Pipeline
+from rawRecorder import RawRecorder
+
+
+# Class for burst capture, stores raw frames in preallocated memory at the full device rate and writes them to disk
+# in the background after the burst
+class BurstCapture:
+    # Initialization method
+    # input: handler, camHandler object with an active device
+    def __init__(self, handler):
+        self.camHand = handler  # camHandler object of the device
+        self.data = None  # Preallocated raw frames, shape (count, height, width)
+        self.frameids = None  # Frame numbers given by the device
+        self.devtstamps = None  # Timestamps given by the device (in ns)
+        self.tstamps = None  # Host timestamps (in ns), mapped after the burst
+        self.busy = None  # Time spent on every frame between fetch and requeue (in s)
+        self.captured = 0  # Number of frames captured in the last burst
+        self.flushed = 0  # Number of frames of the last burst written to disk
+        self.thread = None  # Background flush thread
+
+    # Method for preallocating memory for a burst, the memory is kept for later bursts of the same format
+    # input: count, number of frames
+    def allocate(self, count):
+        shape = (count, self.camHand.getProperty("Height"), self.camHand.getProperty("Width"))
+        if self.data is None or self.data.shape != shape:
+            self.data = numpy.empty(shape, dtype=numpy.uint8)
+            self.data.fill(0)  # Touch every page now instead of on the first write during the burst
+            self.frameids = numpy.zeros(count, dtype=numpy.uint64)
+            self.devtstamps = numpy.zeros(count, dtype=numpy.uint64)
+            self.tstamps = numpy.zeros(count, dtype=numpy.int64)
+            self.busy = numpy.zeros(count, dtype=numpy.float64)
+
+    # Method for capturing a burst, runs in the calling thread until the burst ends
+    # input: count, number of frames to capture
+    # input: duration, stop after this many seconds (0 for no limit), memory is allocated for MaxFPS * duration
+    #        frames if that is more than count
+    # return: dictionary of the capture report (see report())
+    def capture(self, count=0, duration=0):
+        self.wait()  # The previous burst must be on disk before its memory is reused
+        if duration > 0:
+            count = max(count, int(self.camHand.getProperty("MaxFPS") * duration) + 1)
+        if count <= 0:
+            raise ValueError("Burst length must be given as a frame count or a duration")
+        self.allocate(count)
+        cam = self.camHand.cam
+        clock = self.camHand.clock
+        height, width = self.data.shape[1:]
+        self.captured = 0
+        self.flushed = 0
+        self.camHand.acquire = True
+        deadline = 0
+        cam.start_acquisition()
+        try:
+            while self.captured < count and self.camHand.acquire:
+                if deadline and time.perf_counter() >= deadline:
+                    break
+                try:
+                    buffer = cam.fetch_buffer(timeout=0.1)
+                except genicam.gentl.TimeoutException:  # Waiting for the trigger
+                    continue
+                start = time.perf_counter()
+                if duration > 0 and deadline == 0:  # The duration counts from the first frame
+                    deadline = start + duration
+                if len(buffer.payload.components) == 0:
+                    buffer.queue()
+                    continue
+                comp = buffer.payload.components[0]
+                if comp.width != width or comp.height != height:
+                    buffer.queue()
+                    raise ValueError("Image format changed during the burst")
+                ind = self.captured
+                numpy.copyto(self.data[ind], comp.data.reshape(height, width))
+                self.frameids[ind] = buffer.module.frame_id
+                self.devtstamps[ind] = deviceTimestamp(buffer, self.camHand.tickfreq)
+                clock.update(int(self.devtstamps[ind]), time.time_ns())
+                buffer.queue()
+                self.busy[ind] = time.perf_counter() - start
+                self.captured = ind + 1
+        finally:
+            self.camHand.acquire = False
+            cam.stop_acquisition()
+        for ind in range(self.captured):  # Map with the fit over the whole burst
+            self.tstamps[ind] = clock.toHost(int(self.devtstamps[ind]))
+        return self.report()
+
+    # Method for reporting the timing of the last burst
+    # return: dictionary with the number of frames, lost frames, frame period, the time spent per frame and the
+    #         headroom left between it and the frame period (all times in ms)
+    def report(self):
+        num = self.captured
+        ret = {"frames": num, "lost": 0, "fps": 0.0, "period_ms": 0.0, "busy_p50_ms": 0.0, "busy_max_ms": 0.0,
+               "headroom_min_ms": 0.0, "headroom_p50_ms": 0.0, "headroom_min_pct": 0.0}
+        if num < 2:
+            return ret
+        ret["lost"] = int(self.frameids[num - 1] - self.frameids[0]) + 1 - num
+        period = float(numpy.median(numpy.diff(self.tstamps[:num]))) / 1e6
+        busy = self.busy[:num] * 1000
+        ret["fps"] = 1000 / period if period > 0 else 0.0
+        ret["period_ms"] = period
+        ret["busy_p50_ms"] = float(numpy.percentile(busy, 50))
+        ret["busy_max_ms"] = float(busy.max())
+        ret["headroom_min_ms"] = period - ret["busy_max_ms"]
+        ret["headroom_p50_ms"] = period - ret["busy_p50_ms"]
+        ret["headroom_min_pct"] = ret["headroom_min_ms"] / period * 100 if period > 0 else 0.0
+        return ret
+
+    # Method for writing the last burst to disk in a background thread, with the storage settings of the camHandler
+    # (raw mode stores the unprocessed frames, image mode runs the processing pipeline and the image encoder)
+    def flush(self):
+        self.wait()
+        self.thread = threading.Thread(target=self.write, name="BurstFlush")
+        self.thread.start()
+
+    # Method for waiting until the background flush has finished
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Method defining the background flush
+    def write(self):
+        cam = self.camHand
+        pixform = cam.getProperty("PixelFormat")
+        if cam.recmode == "raw":
+            recorder = RawRecorder()
+            recorder.open(cam.savepth, pixform)
+            for ind in range(self.captured):
+                recorder.append(self.data[ind], int(self.frameids[ind]), int(self.devtstamps[ind]), None,
+                                int(self.tstamps[ind]))
+                self.flushed = ind + 1
+            recorder.close()
+            return
+        pipe = Pipeline(cam.buildStages())
+        pipe.plan(self.data.shape[1:], pixform)
+        out = numpy.empty(pipe.outshape, dtype=numpy.uint8)
+        encoder = makeEncoder(cam.imgformat, cam.jpgquality, cam.pnglevel)
+        prev = None
+        for ind in range(self.captured):
+            pipe.run(self.data[ind], out)
+            fname = formatTimestamp(int(self.tstamps[ind]))
+            if fname == prev:  # Several frames within a millisecond
+                fname = "{0}_{1}".format(fname, int(self.frameids[ind]))
+            else:
+                prev = fname
+            try:
+                encoder.write(out, fname if cam.savepth is None else cam.savepth + fname)
+            except Exception as e:
+                cam.logerror("Burst image {0} could not be written: {1}".format(fname, e))
+            self.flushed = ind + 1
@@ -1,30 +1,127 @@
-import math
-import cv2 as cv
-from harvesters.core import Harvester
 import genicam.gentl
 import genicam.genapi
 import time
 import datetime
-import numpy
 import os
+import json
+import collections
+import threading
+from framePool import FramePool
+from writerQueue import WriterQueue
+from rawRecorder import RawRecorder
+from encoders import EncoderPool, makeEncoder
+from telemetry import Telemetry, IncompleteCounter
+from clockSync import ClockSync, formatTimestamp
+from pipeline import Pipeline, bayerforms
+from eventRecorder import EventRecorder
+from bufferTuner import BufferTuner
 
 # Static Defines
 colorforms = ["BayerRG8"]
+recmodes = ["image", "raw"]  # Storage modes: one image file per frame, or a raw memory-mapped stream
+#  Default cti file of the GenTL producer
+#  MODIFY THIS TO MATCH YOUR MATRIX VISION INSTALLATION PATH!!!
+ctipath = "C:\\Users\\Paavo\\Documents\\ADENN2021\\MATRIX VISION\\bin\\x64\\mvGenTLProducer.cti"
 pcktsizes = [1440, 2960, 4480, 6000, 7520, 9040, 10560]
+capsfile = "cfgs/capabilities.json"  # Resolved property nodes (and cached description files) per model and version
+xmldir = "cfgs/xml"  # Directory of the cached device description files
+cachexml = False  # Load the device description from the file cached at the first open instead of from the device
+#  Vendor specific node names of the logical device properties with the scale factors to logical units,
+#  resolved once per device (first found is used, except PacketInterval which sets every alias)
+propaliases = {
+    "Width": [("Width", 1)],
+    "Height": [("Height", 1)],
+    "OffsetX": [("OffsetX", 1)],
+    "OffsetY": [("OffsetY", 1)],
+    "PixelFormat": [("PixelFormat", 1)],
+    "FPS": [("FrameRate", 1), ("AcquisitionFrameRateAbs", 1)],  # Frame rate setting
+    "ResultingFPS": [("FrameRate", 1), ("ResultingFrameRateAbs", 1)],  # Frame rate reached by the device
+    "FPSEnable": [("AcquisitionFrameRateEnable", 1)],
+    "PacketSize": [("PacketSize", 1), ("GevSCPSPacketSize", 1)],
+    "PacketInterval": [("InterPacketDelay", 1), ("GevSCPD", 1)],
+    "FrameDelay": [("GevSCFTD", 1)],
+    "Gain": [("Gain_L", 0.0358), ("GainRaw", 0.1)],
+    "ExposureTime": [("Shutter", 1), ("ExposureTimeAbs", 1)],
+    "Trigger": [("Trigger", 1), ("TriggerMode", 1)],
+    "TickFrequency": [("GevTimestampTickFrequency", 1)],
+    "ModelName": [("DeviceModelName", 1)],
+    "SerialNumber": [("DeviceSerialNumber", 1), ("DeviceID", 1)],
+}
+
+# Function for creating a harvester for the real devices, harvesters is imported only when it is needed
+# input: cti, path of the GenTL producer cti file (None for the default ctipath)
+# return: Harvester object
+def makeHarvester(cti=None):
+    from harvesters.core import Harvester
+    if cachexml:  # Keep the description files read from the devices, they are stored in xmldir (harvesters 1.4)
+        from harvesters.core import ParameterSet, ParameterKey
+        harvester = Harvester(config=ParameterSet({ParameterKey.ENABLE_CLEANING_UP_INTERMEDIATE_FILES: False}))
+    else:
+        harvester = Harvester()
+    harvester.add_file(cti if cti is not None else ctipath)  # The producer is loaded by the first update()
+    return harvester
+
+
+# Function for reading the device timestamp of a buffer in nanoseconds
+# Producers supporting it give the timestamp in ns (GenTL BUFFER_INFO_TIMESTAMP_NS), the others in device ticks
+# input: buffer, buffer returned by fetch_buffer
+# input: tickfreq, tick frequency of the device timestamps (Hz), used when the producer gives ticks
+# return: device timestamp (in ns)
+def deviceTimestamp(buffer, tickfreq):
+    try:
+        return buffer.module.timestamp_ns
+    except genicam.gentl.GenericException:
+        return buffer.module.timestamp * 1000000000 // tickfreq
+
+
+# Function for reading the cached capabilities of the device models
+# return: dictionary of model and version to {"nodes": property to node names, "xml": description file}
+def readCapabilities():
+    try:
+        with open(capsfile, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# Function for storing the cached capabilities of a device model
+# input: key, model name and version of the device
+# input: entry, dictionary with the node names of the properties and the cached description file
+def storeCapabilities(key, entry):
+    data = readCapabilities()
+    data[key] = entry
+    os.makedirs(os.path.dirname(capsfile), exist_ok=True)
+    with open(capsfile, 'w') as file:
+        json.dump(data, file, indent=1)
+
 
 # Class for interfacing with the physical device
 
 class CamHandler:
     # Class initialization
-    def __init__(self):
+    # input: cti, path of the GenTL producer cti file (None for the default ctipath)
+    # input: harvester, harvester object to use instead of a new Harvester (e.g. simCam.SimHarvester)
+    def __init__(self, cti=None, harvester=None):
         # Variables for storing runtime variables
         self.errlog = None  # Variable for current error log
         self.logfname = None  # Variable for the filename of the current error log
         self.cam = None  # Variable for current physical device
         self.camprops = None  # Variable shorthand to access properties of the current device
+        self.devid = None  # Variable for the id of the current device in the device list
+        self.xmlfile = None  # Variable for the description file stored at the last device open (see cachexml)
+        self.devlock = threading.Lock()  # Serializes opening, closing and discovering devices
+        self.warm = collections.OrderedDict()  # Idle devices kept open, device id to the saved device state
+        self.warmsize = 0  # Variable for number of idle devices kept open for fast switching
+        self.dirty = False  # Were properties written since the device settings were loaded or saved?
+        self.fpscache = {}  # Maximum frame rates of the current device, by image format and exposure
+        self.nodecache = {}  # Values of the device properties last read or written by profiles, by logical property
+        self.caps = {}  # Resolved nodes of the logical properties, name to list of (node name, node, scale)
+        self.limits = {}  # Cached property limits, cleared when a property is written
+        self.pixform = None  # Cached pixel format, updated when the pixel format is written
         self.savepth = None  # Variable for current save directory path
         self.thrsh = 0  # Variable for binarization threshold
         self.bufnum = 6  # Variable for used number of buffers
+        self.tuner = BufferTuner(self)  # Tuner of the number of buffers, used when autobuf is enabled
         self.partw = 256  # Variable for partial scan width (in pixels)
         self.parth = 256  # Variable for partial scan height (in pixels)
         self.offsetx = 900  # Variable for partial scan horizontal offset (in pixels)
@@ -35,57 +132,64 @@ class CamHandler:
         self.defOffX = 0  # Variable for saving the original horizontal offset (for toggling partial scan off)
         self.defOffY = 0  # Variable for saving the original vertical offset (for toggling partial scan off)
         self.rotation = 90  # Variable for saving the rotation angle (must be 90, 180 or 270)
+        self.binning = 1  # Variable for software binning factor (1 for no binning)
+        self.rawbayer = False  # Are Bayer frames kept raw, demosaiced only for the preview and when read back?
+        self.pipeline = Pipeline()  # Frame processing chain, planned at the start of acquisition and on changes
+        self.poolsize = 12  # Variable for number of preallocated frames in the frame pool
+        self.pool = FramePool()  # Frame pool, sized at the start of every acquisition
+        self.queuelen = 32  # Variable for maximum number of images waiting to be saved
+        self.writernum = 4  # Variable for number of image writer workers
+        self.overflow = "block"  # Variable for the writer queue overflow policy (see writerQueue.overflowpolicies)
+        self.spillsize = 512  # Variable for maximum size of the RAM spill buffer (in MB)
+        self.writer = WriterQueue(self.saveImag, self.logerror)  # Image storage pipeline
+        self.recmode = "image"  # Variable for the storage mode (see recmodes)
+        self.recorder = RawRecorder()  # Raw stream recorder used in the raw storage mode
+        self.imgformat = "jpg"  # Variable for the image file format in the image storage mode (see encoders.imgformats)
+        self.jpgquality = 95  # Variable for JPEG quality (0-100)
+        self.pnglevel = 3  # Variable for PNG compression level (0-9)
+        self.encprocs = 2  # Variable for number of encoder processes (0 encodes in the writer threads)
+        self.encoder = makeEncoder(self.imgformat)  # Encoder used in the image storage mode
+        self.encpool = EncoderPool()  # Process pool for image encoding
+        self.events = EventRecorder(self)  # Pre-trigger ring buffer used in the event recording mode
+        self.stats = Telemetry()  # Hot path counters, latency histograms and queue depths
+        self.lastid = -1  # Variable for the frame number of the previous frame (for counting lost frames)
+        self.executor = None  # Single worker executor for the awaitable property access, created on first use
 
         # Boolean variables for toggle switches
         self.limit = False  # Is the FPS limiter enabled?
+        self.autobuf = False  # Is the number of buffers tuned between acquisition sessions (see bufferTuner)?
         self.partial = False  # Is partial scanning enabled?
         self.triggering = False  # Is triggered acquisition enabled?
         self.acquire = False  # Is image acquisition enabled?
         self.filtering = False  # Is image filtering (thresholding) enabled?
         self.color = False  # Is the device using color format (BAYERNRG8)
         self.saving = False  # Is image storing enabled?
+        self.eventmode = False  # Are only the frames around events stored (see eventRecorder)?
         self.rotate = False  # Is image rotation enabled?
 
         # Variables for timestamp usage
-        self.systime0 = None  # Variable for system timestamp acquired with the first frame
-        self.tstamp0 = 0  # Variable for device timestamp acquired with the first frame
-        self.sync = False  # Are variables systime0 and tstamp0 synchronized i.e. frame count > 1
-
-        self.harvester = Harvester()  # Initialize the harvester class
-        #  Add a cti file to the harvester
-        #  MODIFY THIS TO MATCH YOUR MATRIX VISION INSTALLATION PATH!!!
-        self.harvester.add_file("C:\\Users\\Paavo\\Documents\\ADENN2021\\MATRIX VISION\\bin\\x64\\mvGenTLProducer.cti")
+        self.clock = ClockSync()  # Mapping of the device timestamps (in ns) to host time
+        self.tickfreq = 1000000000  # Tick frequency of the device timestamps (Hz)
+
+        if harvester is None:
+            self.harvester = makeHarvester(cti)  # Initialize the harvester class with the cti file
+        else:
+            self.harvester = harvester
         #self.load()
         self.openerrlog()  # Open the error log for runtime logging
 
-    # Method for loading saved configurations (Currently not used)
-    def load(self):
-        try:
-            file = open('cfgs/default.cfgh', 'r')
-            self.savepth = file.readline()[:-1]
-            if self.savepth == 'None':
-                self.savepth = None
-            self.bufnum = int(file.readline())
-            self.thrsh = int(file.readline())
-            self.partw = int(file.readline())
-            self.parth = int(file.readline())
-            self.offsetx = int(file.readline())
-            self.offsety = int(file.readline())
-            file.close()
-        except FileNotFoundError:
-            pass
-
-    # Method for saving current configurations for later use
-    def save(self):
-        file = open('cfgs/default.cfgh', 'w')
-        file.write('%s\n' % self.savepth)
-        file.write('%d\n' % self.bufnum)
-        file.write('%d\n' % self.thrsh)
-        file.write('%d\n' % self.partw)
-        file.write('%d\n' % self.parth)
-        file.write('%d\n' % self.offsetx)
-        file.write('%d\n' % self.offsety)
-        file.close()
+    # Method for loading a saved configuration profile, only the device properties differing from it are written
+    # input: name, name of the profile (see profiles.ProfileManager)
+    # return: dictionary with lists of the written, the left out and the failed properties, None if there is no profile
+    def load(self, name="default"):
+        from profiles import ProfileManager
+        return ProfileManager(self).load(name)
+
+    # Method for saving the current configuration for later use
+    # input: name, name of the profile
+    def save(self, name="default"):
+        from profiles import ProfileManager
+        ProfileManager(self).save(name)
 
     # Method for running the parameter load function on the end device
     def loadCameraProperties(self):
@@ -100,18 +204,22 @@ class CamHandler:
                     self.camprops.get_node("LoadParameters").value = 'CommonParameters'
                 except genicam.genapi.LogicalErrorException:
                     pass
+            self.nodecache = {}
 
     # Method for running the parameter save function on the end device
-    def saveCameraProperties(self):
-        if self.camprops is not None:
+    # input: camprops, node map of the device (None for the current device)
+    def saveCameraProperties(self, camprops=None):
+        if camprops is None:
+            camprops = self.camprops
+        if camprops is not None:
             try:
-                self.camprops.get_node("UserSetSelector").value = "UserSet1"
-                self.camprops.get_node("UserSetSave").execute()
+                camprops.get_node("UserSetSelector").value = "UserSet1"
+                camprops.get_node("UserSetSave").execute()
             except genicam.genapi.LogicalErrorException:
                 try:
-                    self.camprops.get_node("MemoryChannel").value = 1
-                    self.camprops.get_node("SaveParameters").value = 'CameraParameters'
-                    self.camprops.get_node("SaveParameters").value = 'CommonParameters'
+                    camprops.get_node("MemoryChannel").value = 1
+                    camprops.get_node("SaveParameters").value = 'CameraParameters'
+                    camprops.get_node("SaveParameters").value = 'CommonParameters'
                 except genicam.genapi.LogicalErrorException:
                     pass
 
@@ -137,8 +245,10 @@ class CamHandler:
         if not os.path.exists(os.path.join(os.getcwd(), 'logs')):
             os.mkdir('logs')
         string = datetime.datetime.now().strftime("%Y-%m-%d_%H;%M;%S")
-        if os.path.exists("logs/CamHandlerERRORLog_%s.txt" % string):
-            string = string + "p2"
+        num = 2
+        while os.path.exists("logs/CamHandlerERRORLog_%s.txt" % string):  # Several handlers opened in one second
+            string = string.split("p")[0] + "p%d" % num
+            num = num + 1
         self.logfname = "logs/CamHandlerERRORLog_%s.txt" % string
         self.errlog = open(self.logfname, 'w')
 
@@ -154,271 +264,414 @@ class CamHandler:
         self.errlog.write("{0} ERROR: ".format(tstamp) + message + '\n')
 
     # Method for changing active device
-    # Input: ind, index of the desired device in harvester.device_info_list
+    # The previous device is kept open in the warm pool when warmsize allows, switching back to it skips loading and
+    # initializing its settings. Device settings are saved to the device memory only when properties were written.
+    # Input: ind, index of the desired device in harvester.device_info_list (out of range only deactivates)
     def changeCam(self, ind):
-        if self.cam is not None:  # If another device is in use disconnect it before activating new device
-            self.acquire = False  # Verify that acquisition is stopped before disconnecting
-            while self.cam.is_acquiring():
-                time.sleep(0.01)
-
-            self.saveCameraProperties()  # Save configured device properties to device memory
-            self.cam.destroy()  # Destroy the link to the old device
-            self.cam = None  # Set the current device variable to None to indicate no device is active
-            self.camprops = None  # Reset device property helper variable
-        if 0 <= ind < len(self.harvester.device_info_list):
-            try:
-                self.cam = self.harvester.create_image_acquirer(ind)
-                self.camprops = self.cam.remote_device.node_map
-                self.loadCameraProperties()
-                self.initCamera()
-                self.cam.num_buffers = self.bufnum
-                self.defH = self.getProperty("Height")
-                self.defW = self.getProperty("Width")
-                self.defOffX = self.getProperty("OffsetX")
-                self.defOffY = self.getProperty("OffsetY")
-                for test in ["Trigger", "TriggerMode"]:  # Some manufacturers use different naming
-                    try:
-                        for val in self.camprops.get_node(test).symbolics:
-                            if val.upper() == "OFF":  # Some manufacturers use Off/On and some use OFF/ON
-                                self.camprops.get_node(test).value = val
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-                self.color = False
-                for pixform in self.camprops.PixelFormat.symbolics:
-                    if pixform in colorforms:
-                        self.color = True
-            except genicam.gentl.AccessDeniedException:
-                self.cam = None
-                self.camprops = None
+        with self.devlock:
+            if self.cam is not None:  # If another device is in use disconnect it before activating new device
+                self.acquire = False  # Verify that acquisition is stopped before disconnecting
+                deadline = time.perf_counter() + 5.0
+                while self.cam.is_acquiring() and time.perf_counter() < deadline:
+                    time.sleep(0.01)
+                self.parkCam()
+            if 0 <= ind < len(self.harvester.device_info_list):
+                devid = self.harvester.device_info_list[ind].id_
+                if devid in self.warm:
+                    self.resumeCam(devid)
+                else:
+                    self.openCam(ind, devid)
+
+    # Method for opening a device and initializing it to comply with the software
+    # input: ind, index of the device in harvester.device_info_list
+    # input: devid, id of the device
+    def openCam(self, ind, devid):
+        info = self.harvester.device_info_list[ind]
+        key = "{0}_{1}".format(info.model, info.version)  # The device version holds the firmware version
+        cached = readCapabilities().get(key, {})
+        xml = cached.get("xml") if cachexml and os.path.isfile(cached.get("xml", "")) else None
+        try:
+            self.cam = self.createAcquirer(ind, key, xml)
+            self.camprops = self.cam.remote_device.node_map
+            self.devid = devid
+            self.loadCameraProperties()
+            if "nodes" not in cached or not self.resolveCapabilities(cached["nodes"]):  # Not cached yet or stale
+                self.resolveCapabilities()
+                cached["nodes"] = {prop: [name for name, node, scale in found] for prop, found in self.caps.items()}
+                storeCapabilities(key, cached)
+            if cachexml and xml is None and self.xmlfile is not None:
+                cached["xml"] = self.xmlfile
+                storeCapabilities(key, cached)
+            self.initCamera()
+            self.cam.num_buffers = self.bufnum
+            try:  # Count the incomplete buffers the acquirer discards (not supported by older harvesters)
+                self.cam.add_callback(self.cam.Events.INCOMPLETE_BUFFER, IncompleteCounter(self.stats))
+            except AttributeError:
+                pass
+            self.defH = self.getProperty("Height")
+            self.defW = self.getProperty("Width")
+            self.defOffX = self.getProperty("OffsetX")
+            self.defOffY = self.getProperty("OffsetY")
+            self.setTrigger("OFF")
+            self.tickfreq = self.getProperty("TickFrequency") or 1000000000
+            self.clock.reset()
+            self.color = False
+            for pixform in self.caps["PixelFormat"][0][1].symbolics:
+                if pixform in colorforms:
+                    self.color = True
+            self.dirty = False  # The initialization is repeated on every open, it needs no saving
+        except genicam.gentl.AccessDeniedException:
+            self.cam = None
+            self.camprops = None
+            self.devid = None
+            self.caps = {}
+            self.fpscache = {}
+            self.nodecache = {}
+
+    # Method for creating the image acquirer of a device
+    # input: ind, index of the device in harvester.device_info_list
+    # input: key, model name and version of the device
+    # input: xml, cached description file of the device (None reads it from the device)
+    # return: image acquirer
+    def createAcquirer(self, ind, key, xml):
+        self.xmlfile = None
+        if xml is not None:
+            return self.harvester.create_image_acquirer(ind, file_path=xml)
+        if not cachexml:
+            return self.harvester.create_image_acquirer(ind)
+        path = os.path.abspath(os.path.join(xmldir, "".join(c if c.isalnum() else "_" for c in key)))
+        os.environ["HARVESTERS_XML_FILE_DIR"] = path  # harvesters stores the description file read from the device
+        try:
+            cam = self.harvester.create_image_acquirer(ind)
+        finally:
+            del os.environ["HARVESTERS_XML_FILE_DIR"]
+        if os.path.isdir(path) and len(os.listdir(path)) > 0:  # Devices referring to a local file store nothing
+            self.xmlfile = os.path.join(path, sorted(os.listdir(path))[0])
+        return cam
+
+    # Method for deactivating the current device, kept open in the warm pool or closed
+    def parkCam(self):
+        state = {"cam": self.cam, "camprops": self.camprops, "caps": self.caps, "fpscache": self.fpscache,
+                 "nodecache": self.nodecache, "dirty": self.dirty, "color": self.color,
+                 "defaults": (self.defH, self.defW, self.defOffX, self.defOffY)}
+        if self.warmsize > 0:
+            self.warm[self.devid] = state
+            while len(self.warm) > self.warmsize:  # Close the least recently used devices
+                self.closeCam(self.warm.popitem(last=False)[1])
+        else:
+            self.closeCam(state)
+        self.cam = None  # Set the current device variable to None to indicate no device is active
+        self.camprops = None  # Reset device property helper variable
+        self.devid = None
+        self.caps = {}
+        self.fpscache = {}
+        self.nodecache = {}
+
+    # Method for activating a device kept open in the warm pool
+    # input: devid, id of the device
+    def resumeCam(self, devid):
+        state = self.warm.pop(devid)
+        self.cam = state["cam"]
+        self.camprops = state["camprops"]
+        self.devid = devid
+        self.caps = state["caps"]
+        self.fpscache = state["fpscache"]
+        self.nodecache = state["nodecache"]
+        self.dirty = state["dirty"]
+        self.color = state["color"]
+        self.defH, self.defW, self.defOffX, self.defOffY = state["defaults"]
+        self.invalidateCapabilities()
+        self.cam.num_buffers = self.bufnum
+        self.setTrigger("OFF")
+        self.tickfreq = self.getProperty("TickFrequency") or 1000000000
+        self.clock.reset()
+
+    # Method for closing a device, its settings are saved to the device memory if they were changed
+    # input: state, saved device state (see parkCam)
+    def closeCam(self, state):
+        if state["dirty"]:
+            self.saveCameraProperties(state["camprops"])  # Save configured device properties to device memory
+        state["cam"].destroy()  # Destroy the link to the device
+
+    # Method for closing every device kept open in the warm pool
+    def closeWarm(self):
+        while len(self.warm) > 0:
+            self.closeCam(self.warm.popitem(last=False)[1])
+
+    # Method for updating the list of available devices, may be called from a background thread
+    # Updating the harvester invalidates every open device, so the warm pool is closed first
+    # return: boolean, was the list updated? (False while a device is active)
+    def updateDevices(self):
+        with self.devlock:
+            if self.cam is not None:
+                self.logerror("Info: Device list not updated while a device is active")
+                return False
+            self.closeWarm()
+            self.harvester.update()
+            return True
+
+    # Method for getting the processing stages matching the current settings
+    # return: list of pipeline stages
+    def buildStages(self):
+        stages = []
+        if self.filtering:
+            stages.append(("threshold", self.thrsh))
+        if self.rotate:
+            stages.append(("rotate", self.rotation))
+        if not self.rawbayer:
+            stages.append(("demosaic", None))  # Bayer frames are stored demosaiced to RGB
+        if self.binning > 1 and not (self.rawbayer and self.getProperty("PixelFormat") in bayerforms):
+            stages.append(("bin", self.binning))  # Raw Bayer frames can only be binned after demosaicing
+        return stages
+
+    # Method for marking the processing chain to be planned again with the current settings before the next frame
+    def updatePipeline(self):
+        self.pipeline.dirty = True
+
+    # Method for planning the processing chain and sizing the frame pool to its output, called before acquisition
+    # starts and when the processing settings change
+    # input: height, height of the raw images (None reads it from the device)
+    # input: width, width of the raw images (None reads it from the device)
+    def initFramePool(self, height=None, width=None):
+        if height is None:
+            height = self.getProperty("Height")
+            width = self.getProperty("Width")
+        self.pipeline.configure(self.buildStages())
+        self.pipeline.plan((height, width), self.getProperty("PixelFormat"))
+        self.pool.allocate(self.pipeline.outshape, self.poolsize)
 
     # Method for acquiring a single frame
-    # return: arr, numpy array containing the pixel values of the acquired image
-    # return: syststamp, system timestamp for the acquired image (calculated from the timestamp given by the device)
+    # return: frame, leased Frame object from the frame pool containing the acquired image
+    #         (the receiver must call frame.release() when done with it)
+    # return: syststamp, system timestamp for the acquired image in ns since the epoch
+    #         (mapped from the timestamp given by the device, see clockSync.formatTimestamp for a string)
     def acquireImag(self):
         if self.cam.is_acquiring():
             try:
                 buffer = self.cam.fetch_buffer(timeout=0.1)
-                if len(buffer.payload.components) > 0:
-                    buffimag = buffer.payload.components[0]
-                    tstamp = buffer.timestamp
-                    if not self.sync:
-                        self.synctimestamp(tstamp)
-                    syststamp = self.getsystimestamp(tstamp)
-                    arr = numpy.ndarray.copy(buffimag.data.reshape(buffimag.height, buffimag.width))
-                    if self.camprops.PixelFormat.value == colorforms[0]:  # Is Bayer RG8
-                        arr = cv.cvtColor(arr, cv.COLOR_BayerRGGB2RGB)
+                fetched = time.perf_counter()
+                hostns = time.time_ns()
+                if len(buffer.payload.components) == 0:  # Buffer delivered without image data
                     buffer.queue()
-                    return arr, syststamp
+                    self.stats.count("incomplete")
+                    return None, 0
+                frameid = buffer.module.frame_id  # GenTL buffer, harvesters does not forward it
+                if self.lastid >= 0 and frameid > self.lastid + 1:  # Gap in the frame numbers given by the device
+                    self.stats.count("lost", frameid - self.lastid - 1)
+                self.lastid = frameid
+                buffimag = buffer.payload.components[0]
+                if self.pipeline.dirty:  # Processing settings changed during acquisition
+                    self.initFramePool(buffimag.height, buffimag.width)
+                frame = self.pool.lease()
+                if frame is None:  # Pool exhausted, consumers still hold every frame
+                    buffer.queue()
+                    self.stats.count("pool_exhausted")
+                    return None, 0
+                tstamp = deviceTimestamp(buffer, self.tickfreq)
+                self.clock.update(tstamp, hostns)
+                syststamp = self.clock.toHost(tstamp)
+                arr = buffimag.data.reshape(buffimag.height, buffimag.width)
+                start = time.perf_counter()
+                self.pipeline.run(arr, frame.data)  # Threshold, rotation and demosaic straight from the buffer
+                self.stats.observe("processing", time.perf_counter() - start)
+                buffer.queue()
+                frame.tstamp = syststamp
+                frame.frameid = frameid
+                frame.devtstamp = tstamp
+                frame.pixform = self.pipeline.outformat
+                self.stats.count("frames")
+                self.stats.observe("fetch_emit", time.perf_counter() - fetched)
+                return frame, syststamp
             except genicam.gentl.TimeoutException:
-                pass
+                self.stats.count("timeouts")
         return None, 0
 
+    # Method for resolving the device nodes of the logical properties, called once when a device is activated
+    # input: names, dictionary of property to node names resolved earlier for the device model (None tries every alias)
+    # return: boolean, were the properties resolved? (False if a node given in names was not found)
+    def resolveCapabilities(self, names=None):
+        if names is not None and any(prop not in propaliases for prop in names):
+            return False
+        self.caps = {}
+        for prop, aliases in propaliases.items():
+            found = []
+            for name, scale in aliases:
+                if names is not None and name not in names.get(prop, []):
+                    continue
+                try:
+                    node = self.camprops.get_node(name)
+                    if names is None:
+                        node.value  # Nodes that are listed but not implemented raise on access
+                    found.append((name, node, scale))
+                except genicam.genapi.LogicalErrorException:
+                    if names is not None:
+                        return False
+            if len(found) > 0:
+                self.caps[prop] = found
+        self.invalidateCapabilities()
+        return True
+
+    # Method for clearing the cached limits and pixel format, called after properties are written
+    def invalidateCapabilities(self):
+        self.limits = {}
+        self.pixform = None
+
+    # Method for reading the value of a logical property from its resolved node
+    # input: prop, logical property name (see propaliases)
+    # input: ind, index of the alias node to read when several are resolved
+    # return: value in logical units (None if the device does not have the property)
+    def readNode(self, prop, ind=0):
+        if prop not in self.caps:
+            return None
+        name, node, scale = self.caps[prop][ind]
+        return node.value * scale if scale != 1 else node.value
+
+    # Method for reading a limit of a logical property
+    # input: prop, logical property name (see propaliases)
+    # input: upper, read the maximum instead of the minimum
+    # return: limit in logical units (None if the device does not have the property)
+    def readLimit(self, prop, upper):
+        if prop == "FPS" and upper:
+            prop = "ResultingFPS"
+        if prop not in self.caps:
+            return None
+        ind = -1 if prop == "PacketInterval" else 0  # Last found alias, as with the value
+        name, node, scale = self.caps[prop][ind]
+        if name == "ResultingFrameRateAbs" and "FPSEnable" not in self.caps:  # No limiter to disable
+            val = node.value
+        elif name == "ResultingFrameRateAbs":  # Maximum is the resulting frame rate with the limiter disabled
+            key = tuple(self.readNode(dep) for dep in ["Width", "Height", "PixelFormat", "ExposureTime"])
+            if key not in self.fpscache:  # Toggling the limiter takes two device writes, done once per format
+                self.caps["FPSEnable"][0][1].value = False
+                self.fpscache[key] = node.value
+                self.caps["FPSEnable"][0][1].value = True
+            val = self.fpscache[key]
+        else:
+            val = node.max if upper else node.min
+        return val * scale if scale != 1 else val
+
+    # Method for reading the packet size of the device
+    # return: index of the packet size in pcktsizes
+    def readPacketSize(self):
+        ret = None
+        if "PacketSize" in self.caps:
+            name, node, scale = self.caps["PacketSize"][0]
+            if name == "PacketSize":  # Enumeration with values such as Size1440
+                try:
+                    val = int(node.value[4:])
+                except genicam.genapi.PropertyException:
+                    val = pcktsizes[0]
+            else:
+                val = node.value
+            if val in pcktsizes:
+                ret = pcktsizes.index(val)
+            elif name == "GevSCPSPacketSize":  # Integer packet size not in the list, reset it to the smallest
+                self.setProperty("PacketSize", 0)
+                ret = 0
+        return ret
+
     # Method for getting the value of the desired property
     # input: prop, string containing the name of the property
     # return: value of the property
     def getProperty(self, prop):
         ret = None
         if self.camprops is not None:
-            if prop == "Width":
-                ret = self.camprops.get_node("Width").value
-            elif prop == "Height":
-                ret = self.camprops.get_node("Height").value
-            elif prop == "MaxWidth":
-                ret = self.camprops.get_node("Width").max
-            elif prop == "MaxHeight":
-                ret = self.camprops.get_node("Height").max
-            elif prop == "MinWidth":
-                ret = self.camprops.get_node("Width").min
-            elif prop == "MinHeight":
-                ret = self.camprops.get_node("Height").min
-            elif prop == "OffsetX":
-                ret = self.camprops.get_node("OffsetX").value
-            elif prop == "OffsetY":
-                ret = self.camprops.get_node("OffsetY").value
+            if prop in self.limits:  # Limits are cached until a property is written
+                ret = self.limits[prop]
+            elif prop[:3] in ["Min", "Max"]:
+                ret = self.readLimit(prop[3:], prop[:3] == "Max")
+                self.limits[prop] = ret
             elif prop == "PixelFormat":
-                ret = self.camprops.get_node("PixelFormat").value
+                if self.pixform is None:
+                    self.pixform = self.readNode(prop)
+                ret = self.pixform
             elif prop == "FPS":
-                for test in ["FrameRate", "ResultingFrameRateAbs"]:
-                    try:
-                        ret = self.camprops.get_node(test).value
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "MaxFPS":
-                for test in ["FrameRate", "ResultingFrameRateAbs"]:
-                    try:
-                        if test == "ResultingFrameRateAbs":
-                            self.camprops.get_node("AcquisitionFrameRateEnable").value = False
-                            ret = self.camprops.get_node(test).value
-                            self.camprops.get_node("AcquisitionFrameRateEnable").value = True
-                        else:
-                            ret = self.camprops.get_node(test).max
-
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "MinFPS":
-                for test in ["FrameRate", "AcquisitionFrameRateAbs"]:
-                    try:
-                        ret = self.camprops.get_node(test).min
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
+                ret = self.readNode("ResultingFPS")
             elif prop == "PacketInterval":
-                for test in ["InterPacketDelay", "GevSCPD"]:
-                    try:
-                        ret = self.camprops.get_node(test).value
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "MinPacketInterval":
-                for test in ["InterPacketDelay", "GevSCPD"]:
-                    try:
-                        ret = self.camprops.get_node(test).min
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "MaxPacketInterval":
-                for test in ["InterPacketDelay", "GevSCPD"]:
-                    try:
-                        ret = self.camprops.get_node(test).max
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "FrameDelay":
-                try:
-                    ret = self.camprops.get_node("GevSCFTD").value
-                except genicam.genapi.LogicalErrorException:
-                    pass
-            elif prop == "MinFrameDelay":
-                try:
-                    ret = self.camprops.get_node("GevSCFTD").min
-                except genicam.genapi.LogicalErrorException:
-                    pass
-            elif prop == "MaxFrameDelay":
-                try:
-                    ret = self.camprops.get_node("GevSCFTD").max
-                except genicam.genapi.LogicalErrorException:
-                    pass
+                ret = self.readNode(prop, -1)
             elif prop == "PacketSize":
-                try:
-                    val = pcktsizes[0]
-                    try:
-                        val = self.camprops.get_node("PacketSize").value
-                        val = int(val[4:])
-                    except genicam.genapi.PropertyException:
-                        pass
-                    for i in range(len(pcktsizes)):
-                        if val == pcktsizes[i]:
-                            ret = i
-                except genicam.genapi.LogicalErrorException:
-                    try:
-                        val = self.camprops.get_node("GevSCPSPacketSize").value
-                        for i in range(len(pcktsizes)):
-                            if val == pcktsizes[i]:
-                                ret = i
-                        if ret is None:
-                            self.camprops.get_node("GevSCPSPacketSize").value = pcktsizes[0]
-                            ret = 0
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "Gain":
-                gainsc = [0.0358, 0.1]
-                ind = 0
-                for test in ["Gain_L", "GainRaw"]:
-                    try:
-                        ret = self.camprops.get_node(test).value*gainsc[ind]
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        ind = ind + 1
-            elif prop == "MaxGain":
-                gainsc = [0.0358, 0.1]
-                ind = 0
-                for test in ["Gain_L", "GainRaw"]:
-                    try:
-                        ret = self.camprops.get_node(test).max*gainsc[ind]
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        ind = ind + 1
-            elif prop == "ExposureTime":
-                for test in ["Shutter", "ExposureTimeAbs"]:
-                    try:
-                        ret = self.camprops.get_node(test).value
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "MinExposureTime":
-                for test in ["Shutter", "ExposureTimeAbs"]:
-                    try:
-                        ret = self.camprops.get_node(test).min
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "MaxExposureTime":
-                for test in ["Shutter", "ExposureTimeAbs"]:
-                    try:
-                        ret = self.camprops.get_node(test).max
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
+                ret = self.readPacketSize()
+            else:
+                ret = self.readNode(prop)
         return ret
 
     # Method for setting the value of the desired device property
     # input: prop, String containing the name of the property
     # input: val, Desired value for the property. Type depends on the property
     def setProperty(self, prop, val=None):
-        if self.camprops is not None:
-            if prop == "Width":
-                self.camprops.get_node("Width").value = val
-            elif prop == "Height":
-                self.camprops.get_node("Height").value = val
-            elif prop == "PixelFormat":
-                self.camprops.get_node("PixelFormat").value = val
-            elif prop == "OffsetX":
-                self.camprops.get_node("OffsetX").value = val
-            elif prop == "OffsetY":
-                self.camprops.get_node("OffsetY").value = val
-            elif prop == "PacketSize":
-                try:
-                    self.camprops.get_node("PacketSize").value = "Size"+str(pcktsizes[val])
-                except genicam.genapi.LogicalErrorException:
-                    try:
-                        self.camprops.get_node("GevSCPSPacketSize").value = pcktsizes[val]
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "PacketInterval":
-                for test in ["InterPacketDelay", "GevSCPD"]:
-                    try:
-                        self.camprops.get_node(test).value = val
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "FrameDelay":
+        if self.camprops is not None and prop in self.caps:
+            nodes = self.caps[prop][:1]
+            if prop == "PacketInterval":  # Set every alias the device has
+                nodes = self.caps[prop]
+            for name, node, scale in nodes:
+                if prop == "PacketSize":
+                    node.value = "Size" + str(pcktsizes[val]) if name == "PacketSize" else pcktsizes[val]
+                elif scale != 1:
+                    node.value = int(val / scale)
+                else:
+                    node.value = val
+            self.dirty = True
+            self.nodecache[prop] = val
+            self.invalidateCapabilities()  # Writes can change the limits of dependent properties
+            if prop == "PixelFormat":
+                self.pixform = val
+
+    # Method for getting the value of a property without blocking the asyncio event loop
+    # Device access runs in a single worker executor, so awaited reads and writes reach the device in order
+    # input: prop, string containing the name of the property
+    # return: value of the property
+    async def getPropertyAsync(self, prop):
+        import asyncio
+        import concurrent.futures
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="Property")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.getProperty, prop)
+
+    # Method for setting the value of a property without blocking the asyncio event loop
+    # input: prop, String containing the name of the property
+    # input: val, Desired value for the property. Type depends on the property
+    async def setPropertyAsync(self, prop, val=None):
+        import asyncio
+        import concurrent.futures
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="Property")
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.setProperty, prop, val)
+
+    # Method for acquiring frames as an async iterator, e.g. async for frame in handler.stream()
+    # Acquisition and storage run in their own threads and are stopped when the iteration ends. Breaking out of the
+    # loop or cancelling it only stops them once the generator is closed, which Python defers to garbage collection,
+    # so iterate inside contextlib.aclosing(handler.stream()) (Python 3.10) or await aclose() on the iterator after a
+    # break or cancel. The frame is valid until the next iteration (call frame.retain() to keep it longer),
+    # frame.tstamp holds its host timestamp (in ns).
+    # input: maxsize, maximum number of frames waiting for the consumer, older frames are dropped when it falls behind
+    # input: maxframes, stop after this many frames (0 for no limit)
+    # input: maxtime, stop after this many seconds (0 for no limit)
+    # return: async iterator of Frame objects
+    async def stream(self, maxsize=4, maxframes=0, maxtime=0):
+        from frameStream import FrameStream  # asyncio is imported only for the asynchronous interface
+        stream = FrameStream(self, maxsize)
+        await stream.start(maxframes, maxtime)
+        try:
+            while True:
                 try:
-                    self.camprops.get_node("GevSCFTD").value = val
-                except genicam.genapi.LogicalErrorException:
-                    pass
-            elif prop == "Gain":
-                gainsc = [0.0358, 0.1]
-                ind = 0
-                for test in ["Gain_L", "GainRaw"]:
-                    try:
-                        self.camprops.get_node(test).value = int(val/gainsc[ind])
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        ind = ind + 1
-
-            elif prop == "ExposureTime":
-                for test in ["Shutter", "ExposureTimeAbs"]:
-                    try:
-                        self.camprops.get_node(test).value = val
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
-            elif prop == "FPS":
-                for test in ["FrameRate", "AcquisitionFrameRateAbs"]:
-                    try:
-                        self.camprops.get_node(test).value = val
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
+                    frame = await stream.get()
+                except StopAsyncIteration:
+                    return
+                yield frame
+        finally:
+            await stream.stop()
+
+    # Method for switching the trigger mode of the device
+    # input: state, "ON" or "OFF"
+    def setTrigger(self, state):
+        if "Trigger" in self.caps:
+            node = self.caps["Trigger"][0][1]
+            if node.value.upper() == state:  # Unchanged, the settings need no saving
+                self.nodecache["Trigger"] = node.value
+                return
+            for val in node.symbolics:
+                if val.upper() == state:  # Some manufacturers use Off/On and some use OFF/ON
+                    self.setProperty("Trigger", val)  # Keeps the cached value used by profiles up to date
 
     # Method for toggling the FPS limiter
     def toggleFPSLimit(self):
@@ -450,24 +703,10 @@ class CamHandler:
         if self.cam is not None:
             if self.triggering:
                 self.triggering = False
-                for test in ["Trigger", "TriggerMode"]:  # Some manufacturers use different naming
-                    try:
-                        for val in self.camprops.get_node(test).symbolics:
-                            if val.upper() == "OFF":  # Some manufacturers use Off/On and some use OFF/ON
-                                self.camprops.get_node(test).value = val
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
+                self.setTrigger("OFF")
             else:
                 self.triggering = True
-                for test in ["Trigger", "TriggerMode"]:  # Some manufacturers use different naming
-                    try:
-                        for val in self.camprops.get_node(test).symbolics:
-                            if val.upper() == "ON":  # Some manufacturers use Off/On and some use OFF/ON
-                                self.camprops.get_node(test).value = val
-                        break
-                    except genicam.genapi.LogicalErrorException:
-                        pass
+                self.setTrigger("ON")
 
     # Method to change the number of buffers that can be used
     def changeBufnum(self, val):
@@ -475,73 +714,69 @@ class CamHandler:
             self.bufnum = val
             self.cam.num_buffers = self.bufnum
 
-    # Method for rotating images
-    # input: frame, image to be rotated
-    # return: frame, rotated image
-    def rotateImag(self, frame):
-        if self.rotation == 90:
-            frame = cv.rotate(frame, cv.cv.ROTATE_90_CLOCKWISE)
-        elif self.rotation == 180:
-            frame = cv.rotate(frame, cv.cv.ROTATE_180)
-        else:
-            frame = cv.rotate(frame, cv.cv.ROTATE_90_COUNTERCLOCKWISE)
-        return frame
-    # Method for filtering the image (threshold)
-    # input: frame, image frame to be filtered
-    # return: frame, filtered image frame (if filtering is toggled off returns the input)
-    def filtImag(self, frame):
-        if self.filtering:
-            frame = cv.threshold(frame, self.thrsh, 255, cv.THRESH_TOZERO)[1]  # Threshold the image
-        if self.rotate:
-            frame = self.rotateImag(frame)
-        return frame
+    # Method for passing an acquired frame to the image writer, used as an acquisition engine consumer
+    # In the event recording mode the frame goes to the pre-trigger ring buffer instead
+    # input: frame, acquired Frame object (held by the writer queue until the image is written)
+    # input: tstamp, host timestamp of the frame (in ns)
+    def storeFrame(self, frame, tstamp):
+        if self.saving:
+            if self.eventmode:
+                self.events.push(frame, tstamp)
+            elif not self.writer.put(frame.data, tstamp, frame):
+                self.logerror("Save queue full, frame dropped, FrameID:{0}".format(frame.frameid))
 
     # Method for saving a image
     # input: frame, image frame to be saved
-    # input: timestamp, timestamp of the image frame
-    def saveImag(self, frame, timestamp):
+    # input: timestamp, host timestamp of the image frame (in ns)
+    # input: frameid, frame number given by the device
+    # input: devtstamp, timestamp given by the device
+    def saveImag(self, frame, timestamp, frameid=0, devtstamp=0):
         if self.saving:
-            if self.savepth is None:
-                cv.imwrite(timestamp + '.jpg', frame)
+            start = time.perf_counter()
+            if self.recmode == "raw":
+                self.recorder.append(frame, frameid, devtstamp, self.pipeline.outformat, timestamp)
             else:
-                fname = "{0}{1}.jpg".format(self.savepth, timestamp)
-                cv.imwrite(fname, frame)
+                if self.savepth is None:
+                    fname = formatTimestamp(timestamp)
+                else:
+                    fname = "{0}{1}".format(self.savepth, formatTimestamp(timestamp))
+                if self.encprocs > 0:
+                    self.encpool.encode(self.encoder, frame, fname)
+                else:
+                    self.encoder.write(frame, fname)
+            self.stats.observe("save", time.perf_counter() - start)
+
+    # Method for (re)starting the image writer workers with the current storage settings
+    def startWriter(self):
+        self.writer.configure(self.queuelen, self.writernum, self.overflow, self.spillsize * 1024 * 1024)
+        if self.recmode == "raw":
+            self.recorder.open(self.savepth, self.getProperty("PixelFormat"))
+        else:
+            self.encoder = makeEncoder(self.imgformat, self.jpgquality, self.pnglevel)
+            if self.encprocs > 0:
+                self.encpool.start(self.encprocs)
+        self.writer.start()
+        self.events.start()
+
+    # Method for clearing the telemetry at the start of an acquisition session
+    def resetStats(self):
+        self.stats.reset()
+        self.events.resetCounters()
+        self.lastid = -1
+
+    # Method for stopping the image writer workers after the queued images are written
+    def stopWriter(self):
+        self.events.stop()  # Passes the frames of the last event to the writer
+        self.writer.stop()
+        self.recorder.close()
+        self.encpool.stop()
 
     # Method for changing the image storage directory
     # input: dirname, absolute path to the directory
     # return: boolean, was the change successful?
     def changeSaveDir(self, dirname):
         if os.path.isdir(dirname):
-            self.savepth = dirname + '\\'
+            self.savepth = os.path.join(dirname, '')  # Ends with the path separator
             return True
         else:
             return False
-
-    # Method for syncing the system timestamp with the device timestamp
-    # input: tstamp0, the device timestamp of the first acquired frame
-    def synctimestamp(self, tstamp0):
-        self.systime0 = datetime.datetime.now()
-        self.tstamp0 = tstamp0
-        self.sync = True
-
-    # Method for acquiring a system timestamp based on current synchronization and the device timestamp
-    # input: tstamp, device timestamp used for conversion
-    # return: syststamp, system timestamp
-    def getsystimestamp(self, tstamp):
-        hour = self.systime0.hour
-        min = self.systime0.minute
-        sec = self.systime0.second
-        deltans = tstamp - self.tstamp0
-        deltams = round(deltans / 1000000)
-        ms = round(self.systime0.microsecond / 1000) + deltams
-        if ms >= 1000:
-            sec = sec + math.floor(ms / 1000)
-            ms = ms - math.floor(ms / 1000) * 1000
-            if sec >= 60:
-                min = min + math.floor(sec / 60)
-                sec = sec - math.floor(sec / 60) * 60
-                if min >= 60:
-                    hour = hour + math.floor(min / 60)
-                    min = min - math.floor(min / 60) * 60
-        syststamp = self.systime0.strftime("%Y-%m-%d ") + "{0};{1};{2},{3}".format(hour, min, sec, ms)
-        return syststamp
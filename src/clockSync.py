@@ -0,0 +1,71 @@
+import collections
+import datetime
+
+
+# Function for formatting a host timestamp, used when a file name or log line needs it
+# input: ns, host timestamp in nanoseconds since the epoch
+# return: string in the form "YYYY-MM-DD h;m;s,ms"
+def formatTimestamp(ns):
+    t = datetime.datetime.fromtimestamp(ns // 1000000000)
+    return t.strftime("%Y-%m-%d ") + "{0};{1};{2},{3}".format(t.hour, t.minute, t.second, ns // 1000000 % 1000)
+
+
+# Class for mapping device timestamps to host time with a running linear fit, corrects the drift between the clocks
+class ClockSync:
+    # Initialization method
+    # input: tickfreq, nominal tick frequency of the device timestamps (Hz)
+    # input: interval, seconds between the samples taken for the fit
+    # input: window, number of samples in the fit
+    def __init__(self, tickfreq=1000000000, interval=1.0, window=60):
+        self.interval = int(interval * 1000000000)  # Sampling interval (in ns)
+        self.samples = collections.deque(maxlen=window)  # (tick, host ns) pairs relative to the anchor
+        self.reset(tickfreq)
+
+    # Method for discarding the fit, the next update anchors the mapping again
+    # input: tickfreq, nominal tick frequency of the device timestamps (Hz), None keeps the current one
+    def reset(self, tickfreq=None):
+        if tickfreq:
+            self.tickfreq = tickfreq
+        self.samples.clear()
+        self.synced = False  # Is the mapping anchored i.e. at least one frame seen
+        self.tick0 = 0  # Device timestamp of the anchor sample
+        self.host0 = 0  # Host timestamp of the anchor sample (in ns)
+        self.slope = 1000000000 / self.tickfreq  # Host nanoseconds per device tick
+        self.offset = 0.0  # Host time at tick0 relative to host0 (in ns)
+        self.lastsample = 0  # Host time of the latest sample (in ns)
+
+    # Method for feeding a device timestamp and the host time it was received at
+    # input: tick, device timestamp
+    # input: hostns, host time in nanoseconds since the epoch (time.time_ns)
+    def update(self, tick, hostns):
+        if not self.synced or tick < self.tick0:  # First frame, or the device clock was reset
+            self.reset()
+            self.tick0 = tick
+            self.host0 = hostns
+            self.samples.append((0, 0))
+            self.lastsample = hostns
+            self.synced = True
+        elif hostns - self.lastsample >= self.interval:
+            self.samples.append((tick - self.tick0, hostns - self.host0))
+            self.lastsample = hostns
+            self.fit()
+
+    # Method for fitting the mapping to the current samples (least squares)
+    def fit(self):
+        num = len(self.samples)
+        meanx = sum(s[0] for s in self.samples) / num
+        meany = sum(s[1] for s in self.samples) / num
+        sxx = sum((s[0] - meanx) ** 2 for s in self.samples)
+        sxy = sum((s[0] - meanx) * (s[1] - meany) for s in self.samples)
+        if sxx > 0:
+            slope = sxy / sxx
+            nominal = 1000000000 / self.tickfreq
+            if abs(slope - nominal) < nominal * 0.01:  # Reject fits distorted by delivery stalls
+                self.slope = slope
+                self.offset = meany - slope * meanx
+
+    # Method for converting a device timestamp to host time
+    # input: tick, device timestamp
+    # return: host time in nanoseconds since the epoch
+    def toHost(self, tick):
+        return self.host0 + int(self.offset + self.slope * (tick - self.tick0))
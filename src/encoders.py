@@ -0,0 +1,152 @@
+import concurrent.futures
+import threading
+from multiprocessing import shared_memory
+import cv2 as cv
+import numpy
+
+# Static Defines
+imgformats = ["jpg", "png", "tiff", "raw"]
+
+
+# Class for JPEG encoding with a configurable quality
+class JpegEncoder:
+    ext = ".jpg"
+
+    # Initialization method
+    # input: quality, JPEG quality (0-100)
+    def __init__(self, quality=95):
+        self.params = [cv.IMWRITE_JPEG_QUALITY, quality]
+
+    # Method for encoding an image and writing it to a file
+    # input: imag, image to be written
+    # input: fname, file name without the extension
+    def write(self, imag, fname):
+        cv.imwrite(fname + self.ext, imag, self.params)
+
+
+# Class for PNG encoding with a configurable compression level
+class PngEncoder(JpegEncoder):
+    ext = ".png"
+
+    # Initialization method
+    # input: level, PNG compression level (0-9)
+    def __init__(self, level=3):
+        self.params = [cv.IMWRITE_PNG_COMPRESSION, level]
+
+
+# Class for lossless (LZW compressed) TIFF encoding
+class TiffEncoder(JpegEncoder):
+    ext = ".tiff"
+
+    # Initialization method
+    def __init__(self):
+        self.params = [cv.IMWRITE_TIFF_COMPRESSION, 5]  # 5 = LZW
+
+
+# Class for writing the pixel values unencoded, as a NumPy array file that keeps the image shape
+class RawEncoder:
+    ext = ".npy"
+
+    # Method for writing an image to a file
+    # input: imag, image to be written
+    # input: fname, file name without the extension
+    def write(self, imag, fname):
+        numpy.save(fname + self.ext, imag)
+
+
+# Function for creating an encoder
+# input: imgformat, name of the image format, one of imgformats
+# input: quality, JPEG quality (0-100)
+# input: level, PNG compression level (0-9)
+# return: encoder object
+def makeEncoder(imgformat, quality=95, level=3):
+    if imgformat == "jpg":
+        return JpegEncoder(quality)
+    elif imgformat == "png":
+        return PngEncoder(level)
+    elif imgformat == "tiff":
+        return TiffEncoder()
+    elif imgformat == "raw":
+        return RawEncoder()
+    raise ValueError("Unknown image format: %s" % imgformat)
+
+
+# Shared memory blocks attached in an encoder process, kept open between images
+attached = {}
+
+
+# Function run in an encoder process, encodes an image placed in shared memory
+# input: name, name of the shared memory block
+# input: shape, shape of the image
+# input: encoder, encoder object used to write the image
+# input: fname, file name without the extension
+def encodeShared(name, shape, encoder, fname):
+    if name not in attached:
+        attached[name] = shared_memory.SharedMemory(name=name)
+    imag = numpy.ndarray(shape, dtype=numpy.uint8, buffer=attached[name].buf)
+    encoder.write(imag, fname)
+
+
+# Class for encoding images in a pool of processes, images are handed over through shared memory
+class EncoderPool:
+    # Initialization method
+    def __init__(self):
+        self.cond = threading.Condition()  # Condition guarding the free slot list
+        self.executor = None  # Process pool running the encoders
+        self.procs = 0  # Number of encoder processes
+        self.slots = []  # Shared memory blocks images are copied to
+        self.free = []  # Shared memory blocks available for new images
+
+    # Method for starting the encoder processes
+    # input: procs, number of encoder processes
+    def start(self, procs):
+        if self.executor is not None and self.procs == procs:
+            return
+        self.stop()
+        self.procs = procs
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=procs)
+
+    # Method for stopping the encoder processes and releasing the shared memory
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+        self.slots = []
+        self.free = []
+
+    # Method for encoding an image in the process pool, blocks until the file is written
+    # input: encoder, encoder object used to write the image
+    # input: imag, image to be written
+    # input: fname, file name without the extension
+    def encode(self, encoder, imag, fname):
+        slot = self.lease(imag.nbytes)
+        try:
+            numpy.copyto(numpy.ndarray(imag.shape, dtype=numpy.uint8, buffer=slot.buf), imag)
+            self.executor.submit(encodeShared, slot.name, imag.shape, encoder, fname).result()
+        finally:
+            with self.cond:
+                self.free.append(slot)
+                self.cond.notify()
+
+    # Method for leasing a shared memory block large enough for an image
+    # input: size, size of the image in bytes
+    # return: shared memory block
+    def lease(self, size):
+        with self.cond:
+            while len(self.free) == 0:
+                if len(self.slots) < 2 * self.procs:  # Allocate up to two blocks per process on demand
+                    slot = shared_memory.SharedMemory(create=True, size=size)
+                    self.slots.append(slot)
+                    return slot
+                self.cond.wait()
+            slot = self.free.pop()
+            if slot.size < size:  # Image format changed, replace the block
+                self.slots.remove(slot)
+                slot.close()
+                slot.unlink()
+                slot = shared_memory.SharedMemory(create=True, size=size)
+                self.slots.append(slot)
+            return slot
@@ -0,0 +1,117 @@
+import threading
+import time
+
+
+# Class for Qt-free image acquisition, pushes acquired frames to registered consumers
+class AcquisitionEngine:
+    # Initialization method
+    # input: handler, camHandler object of the device to acquire from
+    def __init__(self, handler):
+        self.camHand = handler  # camHandler object used for acquisition
+        self.consumers = []  # Functions called with every acquired frame, consumer(frame, tstamp)
+        self.thread = None  # Thread running the acquisition loop when started with start()
+        self.framecount = 0  # Number of frames acquired in the current session
+        self.starttime = 0  # Time the current session started (time.perf_counter)
+        self.stoptime = 0  # Time the current session ended (time.perf_counter)
+
+    # Method for registering a frame consumer
+    # A consumer keeping the frame after returning must call frame.retain() and later frame.release()
+    # input: consumer, function called with every acquired frame, consumer(frame, tstamp)
+    def addConsumer(self, consumer):
+        self.consumers.append(consumer)
+
+    # Method for removing a frame consumer
+    # input: consumer, previously registered function
+    def removeConsumer(self, consumer):
+        self.consumers.remove(consumer)
+
+    # Method for starting acquisition in a background thread
+    # input: maxframes, stop after this many frames (0 for no limit)
+    # input: maxtime, stop after this many seconds (0 for no limit)
+    def start(self, maxframes=0, maxtime=0):
+        self.camHand.acquire = True
+        self.thread = threading.Thread(target=self.run, args=(maxframes, maxtime), name="Acquisition", daemon=True)
+        self.thread.start()
+
+    # Method for stopping acquisition started with start()
+    def stop(self):
+        self.camHand.acquire = False
+        self.wait()
+
+    # Method for waiting until the acquisition thread has finished
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # Method defining the acquisition loop, runs while camHandler.acquire is set and no limit is reached
+    # input: maxframes, stop after this many frames (0 for no limit)
+    # input: maxtime, stop after this many seconds (0 for no limit)
+    def run(self, maxframes=0, maxtime=0):
+        cam = self.camHand
+        cam.initFramePool()  # Size the frame pool to the current image format
+        cam.resetStats()
+        cam.clock.reset()  # Map the timestamps of the session from its first frame, before the thread updates it
+        if cam.autobuf:
+            cam.tuner.begin()
+        self.framecount = 0
+        self.stoptime = 0
+        self.starttime = time.perf_counter()
+        deadline = self.starttime + maxtime if maxtime > 0 else 0
+        cam.cam.start_acquisition()  # Signal the device to start acquiring images
+        frame = None
+        try:
+            while cam.acquire:  # Loop acquisition as long as the camHandler defines
+                frame, tstamp = cam.acquireImag()  # Use camHandler method to acquire a single frame
+                if frame is not None:
+                    self.framecount += 1
+                    emitted = time.perf_counter()
+                    for consumer in self.consumers:
+                        consumer(frame, tstamp)
+                    cam.stats.observe("consumers", time.perf_counter() - emitted)
+                    if cam.autobuf:
+                        cam.tuner.sample()
+                    cam.stats.gauge("store_queue", cam.writer.depth())
+                    cam.stats.gauge("pool_in_use", cam.pool.inUse())
+                    frame.release()  # Consumers keeping the frame have retained it
+                    frame = None
+                    if 0 < maxframes <= self.framecount:
+                        cam.acquire = False
+                if deadline and time.perf_counter() >= deadline:
+                    cam.acquire = False
+        except Exception as e:  # A failing consumer must not leave the device streaming
+            cam.logerror("ERROR: Acquisition stopped by an exception: {0!r}".format(e))
+            raise
+        finally:
+            cam.acquire = False
+            if frame is not None:
+                frame.release()
+            self.stoptime = time.perf_counter()
+            self.stopAcquisition()
+        if cam.autobuf:  # Buffers can only be changed while the device is not acquiring
+            cam.tuner.tune(self.getFPS())
+        if cam.pool.exhausted > 0:  # Frames were dropped because consumers held every frame
+            cam.logerror("Warning: Frame pool exhausted {0} times".format(cam.pool.exhausted))
+
+    # Method for stopping acquisition on the device
+    def stopAcquisition(self):
+        retry = 0
+        while retry < 10:  # Retry the acquisition shut down for up to 10 times
+            try:
+                self.camHand.cam.stop_acquisition()  # Signal the device to stop image acquisition
+                break
+            except Exception as e:
+                if retry == 0:  # If shut down is not completed on first try log a warning
+                    self.camHand.logerror("Warning: Exception catched while stopping acquisition, Retrying")
+                retry = retry + 1
+                time.sleep(0.5)
+                if retry == 10:  # If shut down is not completed after 10 tries log an error
+                    self.camHand.logerror("ERROR: Stopping acquisition failed after 10 retries")
+
+    # Method for getting the average frame rate of the current or last session
+    # return: frames per second
+    def getFPS(self):
+        end = self.stoptime if self.stoptime > 0 else time.perf_counter()
+        if end <= self.starttime:
+            return 0
+        return self.framecount / (end - self.starttime)
@@ -0,0 +1,167 @@
+import collections
+import threading
+import time
+import numpy
+from framePool import FramePool
+
+
+# Function for creating an image based trigger firing when the mean brightness rises above a level
+# input: level, brightness level (0-255)
+# input: step, pixel step of the sparse sample the mean is taken from
+# return: function(frame) for EventRecorder.condition, fires once per crossing of the level
+def brightnessTrigger(level, step=8):
+    state = {"above": False}
+
+    def condition(frame):
+        above = frame.data[::step, ::step].mean() > level
+        fired = above and not state["above"]
+        state["above"] = above
+        return fired
+
+    return condition
+
+
+# Class for event triggered recording, keeps the last frames in a fixed amount of memory and stores only the frames
+# around an event (pre-trigger and post-trigger windows)
+# The frames are copied into a frame pool of its own, so the acquisition frame pool is never held for the pre-trigger
+# window. When an event fires the window is handed to a dump thread feeding the image writer of the camHandler, the
+# ring frames stay leased until they are written.
+class EventRecorder:
+    # Initialization method
+    # input: handler, camHandler object whose writer stores the event frames
+    def __init__(self, handler):
+        self.camHand = handler  # camHandler object of the device
+        self.pre = 2.0  # Length of the pre-trigger window (in s)
+        self.post = 1.0  # Length of the post-trigger window (in s)
+        self.memlimit = 1024  # Maximum size of the ring memory (in MB), shortens the windows at high data rates
+        self.condition = None  # Image based trigger, function(frame) returning True to fire an event (or None)
+        self.pool = FramePool()  # Ring memory, sized on the first frame from the device frame rate
+        self.ring = collections.deque()  # Frames of the pre-trigger window, oldest first
+        self.lock = threading.Lock()  # Lock guarding the requested event
+        self.requested = 0  # Host time of an event requested with trigger() (in ns), 0 if none
+        self.until = 0  # Host time the current post-trigger window ends at (in ns)
+        self.lastdump = 0  # Host timestamp of the newest frame handed to the dump thread (in ns)
+        self.cond = threading.Condition()  # Condition guarding the dump queue
+        self.dumpqueue = collections.deque()  # Frames waiting to be passed to the writer
+        self.running = False  # Is the dump thread running?
+        self.thread = None  # Dump thread
+
+        # Counters
+        self.events = 0  # Number of events fired
+        self.dumped = 0  # Number of frames passed to the writer
+        self.overruns = 0  # Number of frames not buffered because every ring frame was still waiting to be written
+
+    # Method for sizing the ring memory for the windows
+    # input: shape, shape of a processed frame
+    # input: fps, frame rate of the device
+    def allocate(self, shape, fps):
+        # The pre-trigger window is kept while the previous window (up to pre + post) is still being written
+        count = int((2 * self.pre + self.post) * max(fps, 1)) + 4
+        count = min(count, max(2, self.memlimit * 1024 * 1024 // int(numpy.prod(shape))))
+        self.release()
+        self.pool.allocate(shape, count)
+
+    # Method for releasing the frames of the pre-trigger window
+    def release(self):
+        while len(self.ring) > 0:
+            self.ring.popleft().release()
+
+    # Method for requesting an event, e.g. from a button or a digital input handler
+    # input: tstamp, host time of the event (in ns), None for now
+    def trigger(self, tstamp=None):
+        with self.lock:
+            self.requested = tstamp if tstamp is not None else time.time_ns()
+
+    # Method for passing a frame to the ring, used as an acquisition engine consumer (see camHandler.storeFrame)
+    # input: frame, acquired Frame object
+    # input: tstamp, host timestamp of the frame (in ns)
+    def push(self, frame, tstamp):
+        if self.pool.shape != frame.data.shape:
+            self.allocate(frame.data.shape, self.camHand.getProperty("FPS"))
+        slot = self.pool.lease()
+        while slot is None and len(self.ring) > 0:  # Reuse the oldest frame of the window
+            self.ring.popleft().release()
+            slot = self.pool.lease()
+        if slot is None:
+            self.overruns += 1
+            return
+        numpy.copyto(slot.data, frame.data)
+        slot.tstamp = tstamp
+        slot.frameid = frame.frameid
+        slot.devtstamp = frame.devtstamp
+        slot.pixform = frame.pixform
+        self.ring.append(slot)
+        start = tstamp - int(self.pre * 1e9)
+        while self.ring[0].tstamp < start:
+            self.ring.popleft().release()
+
+        with self.lock:
+            event = self.requested
+            self.requested = 0
+        if self.condition is not None and self.condition(frame):
+            event = tstamp
+        if event:
+            self.events += 1
+            self.until = max(self.until, event + int(self.post * 1e9))
+            start = event - int(self.pre * 1e9)
+            self.dump([item for item in self.ring if item.tstamp >= start])
+        elif tstamp <= self.until:
+            self.dump([slot])
+
+    # Method for handing frames to the dump thread, frames already handed over are skipped
+    # input: frames, list of ring frames in timestamp order
+    def dump(self, frames):
+        frames = [item for item in frames if item.tstamp > self.lastdump]
+        if len(frames) == 0:
+            return
+        for item in frames:
+            item.retain()
+        self.lastdump = frames[-1].tstamp
+        with self.cond:
+            self.dumpqueue.extend(frames)
+            self.cond.notify()
+
+    # Method for starting the dump thread
+    def start(self):
+        if self.running:
+            return
+        self.until = 0
+        self.lastdump = 0
+        with self.lock:
+            self.requested = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="EventDump", daemon=True)
+        self.thread.start()
+
+    # Method for stopping the dump thread after the queued frames are passed to the writer
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.release()
+
+    # Method for resetting the counters
+    def resetCounters(self):
+        self.events = 0
+        self.dumped = 0
+        self.overruns = 0
+
+    # Method defining the dump thread, blocking on a full writer queue here does not stall acquisition
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and len(self.dumpqueue) == 0:
+                    self.cond.wait()
+                if len(self.dumpqueue) == 0:
+                    return
+                frame = self.dumpqueue.popleft()
+            try:
+                if self.camHand.writer.put(frame.data, frame.tstamp, frame):
+                    self.dumped += 1
+                else:
+                    self.camHand.logerror("Save queue full, event frame dropped, FrameID:{0}".format(frame.frameid))
+            finally:
+                frame.release()
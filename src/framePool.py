@@ -0,0 +1,83 @@
+import threading
+import numpy
+
+
+# Class for a single preallocated frame, leased out by a FramePool
+class Frame:
+    # Initialization method
+    # input: pool, FramePool object owning the frame
+    # input: shape, shape of the preallocated pixel array
+    # input: gen, allocation generation of the pool when the frame was created
+    def __init__(self, pool, shape, gen):
+        self.pool = pool  # Pool the frame is returned to
+        self.gen = gen  # Pool generation, frames of an older generation are not returned
+        self.data = numpy.zeros(shape, dtype=numpy.uint8)  # Preallocated pixel array, filled in place
+        self.tstamp = 0  # Host timestamp of the image currently held in the frame (in ns)
+        self.frameid = 0  # Frame number given by the device
+        self.devtstamp = 0  # Timestamp given by the device (in ns)
+        self.pixform = None  # Pixel format of the image held in the frame (see pipeline.Pipeline.outformat)
+        self.refs = 0  # Number of consumers still holding the frame
+
+    # Method for registering an additional consumer of the frame
+    def retain(self):
+        self.pool.retain(self)
+
+    # Method for releasing the frame, returns it to the pool after the last consumer is done
+    def release(self):
+        self.pool.release(self)
+
+
+# Class for a fixed set of preallocated frames, removes per frame allocations from acquisition
+class FramePool:
+    # Initialization method
+    def __init__(self):
+        self.lock = threading.Lock()  # Lock guarding the free list and reference counts
+        self.frames = []  # All frames of the current generation
+        self.free = []  # Frames available for leasing
+        self.shape = None  # Shape of the pixel arrays in the current generation
+        self.gen = 0  # Allocation generation, increased on every reallocation
+        self.exhausted = 0  # Number of lease requests that found no free frame
+
+    # Method for sizing the pool, reuses the existing frames if the format is unchanged
+    # input: shape, shape of a single frame (height, width) or (height, width, channels)
+    # input: count, number of frames in the pool
+    def allocate(self, shape, count):
+        with self.lock:
+            self.exhausted = 0
+            if self.shape == shape and len(self.frames) == count:
+                return
+            self.gen += 1  # Frames still leased from the old generation are dropped on release
+            self.shape = shape
+            self.frames = [Frame(self, shape, self.gen) for i in range(count)]
+            self.free = list(self.frames)
+
+    # Method for leasing a free frame
+    # return: frame, leased Frame object with one reference, None if the pool is exhausted
+    def lease(self):
+        with self.lock:
+            if len(self.free) == 0:
+                self.exhausted += 1
+                return None
+            frame = self.free.pop()
+            frame.refs = 1
+            return frame
+
+    # Method for adding a reference to a leased frame
+    # input: frame, leased Frame object
+    def retain(self, frame):
+        with self.lock:
+            frame.refs += 1
+
+    # Method for removing a reference from a leased frame
+    # input: frame, leased Frame object
+    def release(self, frame):
+        with self.lock:
+            frame.refs -= 1
+            if frame.refs == 0 and frame.gen == self.gen:
+                self.free.append(frame)
+
+    # Method for getting the number of frames currently leased
+    # return: number of frames not available for leasing
+    def inUse(self):
+        with self.lock:
+            return len(self.frames) - len(self.free)
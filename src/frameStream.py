@@ -0,0 +1,101 @@
+import asyncio
+import collections
+import threading
+from engine import AcquisitionEngine
+
+
+# Class for handing acquired frames to an asyncio event loop, used by camHandler.stream()
+# The acquisition thread puts frames to a bounded queue and wakes the loop only when the queue was empty, so an idle
+# loop is not polled and a busy one is not flooded with callbacks. When the queue is full the oldest frame is dropped,
+# acquisition never waits for the loop.
+class FrameStream:
+    # Initialization method
+    # input: handler, camHandler object with an active device
+    # input: maxsize, maximum number of frames waiting for the loop (held from the frame pool)
+    def __init__(self, handler, maxsize=4):
+        self.camHand = handler  # camHandler object of the device
+        self.engine = AcquisitionEngine(handler)  # Acquisition engine feeding the stream
+        self.engine.addConsumer(handler.storeFrame)
+        self.engine.addConsumer(self.push)
+        self.maxsize = max(1, maxsize)
+        self.lock = threading.Lock()  # Lock guarding the queue and the done flag
+        self.queue = collections.deque()  # Frames waiting for the loop, oldest first
+        self.loop = None  # Event loop the stream is consumed in
+        self.event = None  # Event set by the acquisition thread when a frame or the end is available
+        self.current = None  # Frame last returned by get(), released on the next call
+        self.thread = None  # Acquisition thread
+        self.done = False  # Has the acquisition thread finished?
+        self.dropped = 0  # Number of frames dropped because the loop fell behind
+
+    # Method for starting acquisition, device and writer setup runs in an executor
+    # input: maxframes, stop after this many frames (0 for no limit)
+    # input: maxtime, stop after this many seconds (0 for no limit)
+    async def start(self, maxframes=0, maxtime=0):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        await self.loop.run_in_executor(None, self.camHand.startWriter)
+        self.camHand.writer.resetCounters()
+        self.camHand.acquire = True
+        self.thread = threading.Thread(target=self.run, args=(maxframes, maxtime), name="StreamAcquisition",
+                                       daemon=True)
+        self.thread.start()
+
+    # Method defining the acquisition thread
+    # input: maxframes, stop after this many frames (0 for no limit)
+    # input: maxtime, stop after this many seconds (0 for no limit)
+    def run(self, maxframes, maxtime):
+        try:
+            self.engine.run(maxframes, maxtime)
+        finally:
+            with self.lock:
+                self.done = True
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    # Method for passing a frame to the loop, used as an acquisition engine consumer
+    # input: frame, acquired Frame object
+    # input: tstamp, host timestamp of the frame (in ns)
+    def push(self, frame, tstamp):
+        frame.retain()
+        evicted = None
+        with self.lock:
+            wake = len(self.queue) == 0
+            self.queue.append(frame)
+            if len(self.queue) > self.maxsize:
+                evicted = self.queue.popleft()
+                self.dropped += 1
+        if evicted is not None:
+            evicted.release()
+        if wake:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    # Method for waiting for the next frame, the previously returned frame is released
+    # return: frame, Frame object valid until the next call (call frame.retain() to keep it longer)
+    async def get(self):
+        if self.current is not None:
+            self.current.release()
+            self.current = None
+        while True:
+            with self.lock:
+                if len(self.queue) > 0:
+                    self.current = self.queue.popleft()
+                    return self.current
+                if self.done:
+                    raise StopAsyncIteration
+                self.event.clear()
+            await self.event.wait()
+
+    # Method for stopping acquisition and writing out the queued images, waits in an executor
+    async def stop(self):
+        self.camHand.acquire = False
+        if self.thread is not None:
+            await self.loop.run_in_executor(None, self.thread.join)
+            self.thread = None
+        await self.loop.run_in_executor(None, self.camHand.stopWriter)
+        with self.lock:
+            frames = list(self.queue)
+            self.queue.clear()
+        if self.current is not None:
+            frames.append(self.current)
+            self.current = None
+        for frame in frames:
+            frame.release()
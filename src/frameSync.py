@@ -0,0 +1,77 @@
+import collections
+import threading
+
+
+# Class for matching frames of several devices by timestamp, e.g. frames of one trigger on a stereo rig
+# Each device has a timestamp ordered queue, the queue heads are compared on every frame and either emitted as a
+# matched set or the oldest head is discarded as unmatched, so every frame is handled a constant number of times
+class FrameSync:
+    # Initialization method
+    # input: devices, number of devices
+    # input: tolerance, largest allowed timestamp difference inside a matched set (in ns)
+    # input: callback, function called with every matched set, callback(frames, tstamps), the frames are released
+    #        after it returns (a callback keeping them must call frame.retain())
+    # input: maxlen, maximum frames queued per device while waiting for the other devices (held from the frame pool)
+    # input: devicetime, match by the device timestamps (devices sharing a clock e.g. PTP) instead of host time
+    def __init__(self, devices, tolerance, callback, maxlen=4, devicetime=False):
+        self.lock = threading.Lock()
+        self.queues = [collections.deque() for i in range(devices)]  # Queued (tstamp, frame) pairs per device
+        self.tolerance = tolerance
+        self.callback = callback
+        self.maxlen = maxlen
+        self.devicetime = devicetime
+        self.matched = 0  # Number of matched sets emitted
+        self.unmatched = [0] * devices  # Number of frames discarded without a match per device
+
+    # Method for passing a frame to the synchronizer, used as an acquisition engine consumer of one device
+    # (e.g. functools.partial(sync.push, index))
+    # input: index, index of the device
+    # input: frame, acquired Frame object
+    # input: tstamp, host timestamp of the frame (in ns)
+    def push(self, index, frame, tstamp):
+        if self.devicetime:
+            tstamp = frame.devtstamp
+        frame.retain()
+        released = []
+        matches = []
+        with self.lock:
+            queue = self.queues[index]
+            queue.append((tstamp, frame))
+            if len(queue) > self.maxlen:  # The other devices have stalled, give up on the oldest frame
+                released.append(queue.popleft()[1])
+                self.unmatched[index] += 1
+            while all(len(q) > 0 for q in self.queues):
+                heads = [q[0][0] for q in self.queues]
+                first = min(heads)
+                if max(heads) - first <= self.tolerance:
+                    matches.append([q.popleft() for q in self.queues])
+                    self.matched += 1
+                else:  # The oldest head can not match anything newer in the other queues
+                    ind = heads.index(first)
+                    released.append(self.queues[ind].popleft()[1])
+                    self.unmatched[ind] += 1
+        for match in matches:  # Callbacks run outside the lock so devices do not wait on each other
+            try:
+                self.callback([item[1] for item in match], [item[0] for item in match])
+            finally:
+                for item in match:
+                    item[1].release()
+        for frame in released:
+            frame.release()
+
+    # Method for discarding the queued frames, called when acquisition stops
+    def clear(self):
+        with self.lock:
+            released = []
+            for ind in range(len(self.queues)):
+                self.unmatched[ind] += len(self.queues[ind])
+                released.extend(item[1] for item in self.queues[ind])
+                self.queues[ind].clear()
+        for frame in released:
+            frame.release()
+
+    # Method for resetting the counters
+    def resetCounters(self):
+        with self.lock:
+            self.matched = 0
+            self.unmatched = [0] * len(self.queues)
@@ -1,64 +1,35 @@
+import functools
 import traceback
 
 import PyQt5.QtWidgets as QtW
 import PyQt5.QtCore as QtC
 import PyQt5.QtGui as QtG
-from camHandler import CamHandler, pcktsizes
+from camHandler import CamHandler, pcktsizes, recmodes
+from writerQueue import overflowpolicies
+from encoders import imgformats
+from engine import AcquisitionEngine
+from preview import PreviewChannel
+from transportTuner import TransportTuner
 from genicam import genapi, gentl
+import threading
 import time
-import numpy
 
 
 # Class for image acquisition thread, based on QThread
 class ImageThread(QtC.QThread):
-    # Set a signal to be sent if acquisition is successful
-    # The signal contains the image and timestamp used for further processing
-    imageAcquired = QtC.pyqtSignal(numpy.ndarray, str)
-
     # Initialization method
     # input: handler, programs camHandler object
-    def __init__(self, handler):
+    # input: preview, PreviewChannel object the acquired frames are offered to
+    def __init__(self, handler, preview):
         super().__init__()  # Init the QThread
         self.camHand = handler  # Set the thread camHandler to match the programs
+        self.engine = AcquisitionEngine(handler)  # Qt-free acquisition loop run inside the thread
+        self.engine.addConsumer(handler.storeFrame)  # Filtering and saving run in the acquisition thread
+        self.engine.addConsumer(preview.offer)  # The preview only ever keeps the newest frame
 
     # Method defining the runtime behaviour
     def run(self):
-        self.camHand.cam.start_acquisition()  # Signal the device to start acquiring images
-        while self.camHand.acquire:  # Loop acquisition as long as the camHandler defines
-            arr, tstamp = self.camHand.acquireImag()  # Use camHandler method to acquire a single frame
-            if arr is not None:  # If the image is valid send the image for further processing
-                self.imageAcquired.emit(arr, tstamp)
-
-        retry = 0
-        while retry < 10:  # Retry the acquisition shut down for up to 10 times
-            try:
-                self.camHand.cam.stop_acquisition()  # Signal the device to stop image acquisition
-                break
-            except Exception as e:
-                if retry == 0:  # If shut down is not completed on first try log a warning
-                    self.camHand.logerror("Warning: Exception catched while stopping acquisition, Retrying")
-                retry = retry + 1
-                time.sleep(0.5)
-                if retry == 10:  # If shut down is not completed after 10 tries log an error
-                    self.camHand.logerror("ERROR: Stopping acquisition failed after 10 retries")
-
-
-# Class for image saving thread, based on QThread
-class SaveThread(QtC.QThread):
-    # Set a signal to be sent after an image is saved
-    imageSaved = QtC.pyqtSignal()
-
-    # Initialization method
-    # input: handler, programs camHandler object
-    def __init__(self, handler):
-        super().__init__()  # Init the QThread
-        self.camHand = handler  # Set the thread camHandler to match the programs
-        self.bw = None  # Init a variable for current image
-        self.tstamp = None  # Init a variable for current timestamp
-
-    def run(self):
-        self.camHand.saveImag(self.bw, self.tstamp)  # Use the camHandler method to save the image
-        self.imageSaved.emit()  # Emit a signal to notify image saving is completed
+        self.engine.run()
 
 
 # Class for screen gui element, based on QLabel
@@ -68,6 +39,8 @@ class Screen(QtW.QLabel):
     def __init__(self):
         super().__init__()  # Init the QLabel
         self.img = None  # Init a variable for current image
+        self.arr = None  # Init a variable for the pixel array backing the current image
+        self.scale = 1.0  # Init a variable for the scale of the current image relative to the acquired frame
         self.previewrect = QtC.QRect(0, 0, 0, 0)  # Init a QRect object to preview partial scan area
         self.prev = False  # Bool, Is the preview rectangle active?
         self.setStyleSheet("border:1px solid gray")
@@ -78,19 +51,24 @@ class Screen(QtW.QLabel):
             size = self.size()
             painter = QtG.QPainter(self)
             scimg = self.img.scaled(size.width() - 2, size.height() - 2, QtC.Qt.AspectRatioMode.KeepAspectRatio)
-            point = QtC.QPoint((size.width()-scimg.width())/2, (size.height()-scimg.height())/2)
+            point = QtC.QPoint((size.width()-scimg.width())//2, (size.height()-scimg.height())//2)
             painter.drawImage(point, scimg)
             if self.prev:  # If partial scan preview is enabled draw the preview rectangle on the screen
                 trans = QtG.QTransform()
                 trans.translate(point.x(), point.y())
-                trans.scale(scimg.width()/self.img.width(), scimg.height()/self.img.height())
+                trans.scale(scimg.width()/self.img.width()*self.scale, scimg.height()/self.img.height()*self.scale)
                 painter.setPen(QtG.QPen(QtG.QColor("red")))
                 painter.setTransform(trans)
                 painter.drawRect(self.previewrect)
 
     # Method for setting a new image as the current one
-    def setImage(self, qimg):
+    # input: qimg, QImage to be drawn
+    # input: arr, pixel array the QImage is built on, kept referenced while the image is drawn
+    # input: scale, scale of the image relative to the acquired frame (for the partial scan preview rectangle)
+    def setImage(self, qimg, arr=None, scale=1.0):
         self.img = qimg
+        self.arr = arr
+        self.scale = scale
         self.repaint()  # Calling a repaint to update the graphics on screen
 
 
@@ -98,7 +76,10 @@ class Screen(QtW.QLabel):
 class GUI(QtW.QMainWindow):
 
     # Initialization method
-    def __init__(self):
+    # input: harvester, harvester object passed to the camHandler (None for the real devices)
+    # input: timer, telemetry.PhaseTimer timing the program start, its report is printed at the first frame (None for
+    #        no timing)
+    def __init__(self, harvester=None, timer=None):
         super().__init__()  # Init the QMainWindow
         self.setCentralWidget(QtW.QWidget())  # QMainWindow must have a centralWidget to be able to add layouts
         self.mainlout = QtW.QGridLayout()  # Init the main layout as a grid
@@ -106,11 +87,9 @@ class GUI(QtW.QMainWindow):
         self.setWindowTitle('GenICam Handler v1.1')
         QtW.QApplication.setStyle(QtW.QStyleFactory.create('Windows'))
 
-        savethrnum = 6  # Number of threads to be used in saving of images
-        # Timer variables and image counter for FPS counter
+        # Timer variables and frame counter for FPS counter
         self.start = 0
-        self.stop = 1
-        self.drawimagcount = 0
+        self.startcount = 0
 
         # Variables for storing the default image size parameters
         self.defW = 0
@@ -118,14 +97,23 @@ class GUI(QtW.QMainWindow):
         self.defOffX = 0
         self.defOffY = 0
 
-        # Create the camHandler object for the program and init imaging and saving threads
-        self.camHand = CamHandler()
-        self.imageRet = ImageThread(self.camHand)
-        self.imageRet.imageAcquired.connect(self.drawImage)
-        self.imageSaverList = []
-        for i in range(savethrnum):
-            self.imageSaverList.append(SaveThread(self.camHand))
-            self.imageSaverList[i].imageSaved.connect(self.increaseSaved)
+        self.timer = timer  # Timer of the program start phases
+
+        # Create the camHandler object for the program and init the imaging thread
+        self.camHand = CamHandler(harvester=harvester)
+        self.camHand.warmsize = 2  # Keep the last used devices open for fast switching
+        self.preview = PreviewChannel()
+        self.preview.start()
+        self.imageRet = ImageThread(self.camHand, self.preview)
+        self.previewseq = 0  # Sequence number of the preview image on screen
+        self.previewTimer = QtC.QTimer()  # Preview refresh, independent of the acquisition rate
+        self.previewTimer.setInterval(1000 // self.preview.maxrate)
+        self.previewTimer.timeout.connect(self.drawImage)
+        self.task = None  # Thread running a device operation (discovery, opening, tuning) off the GUI thread
+        self.taskDone = None  # Method called on the GUI thread when the device operation has finished
+        self.taskTimer = QtC.QTimer()  # Polls the device operation thread
+        self.taskTimer.setInterval(20)
+        self.taskTimer.timeout.connect(self.pollTask)
 
         # Create the top layout and GUI elements for top layout controls
         self.toplout = QtW.QHBoxLayout()
@@ -141,6 +129,14 @@ class GUI(QtW.QMainWindow):
         self.acquiringG = QtW.QPushButton()
         self.previewG = QtW.QPushButton()
         self.savingG = QtW.QPushButton()
+        self.recmodeG = QtW.QComboBox()
+        self.imgformatG = QtW.QComboBox()
+        self.overflowG = QtW.QComboBox()
+        self.writernumG = QtW.QSpinBox()
+        self.eventmodeG = QtW.QPushButton()
+        self.fireEventG = QtW.QPushButton()
+        self.preEventG = QtW.QDoubleSpinBox()
+        self.postEventG = QtW.QDoubleSpinBox()
 
         # Create the screen for image drawing
         self.screen = Screen()
@@ -152,11 +148,18 @@ class GUI(QtW.QMainWindow):
         self.maxfps = 0
         self.framecount = 0
         self.savecount = 0
+        self.dropcount = 0
         self.fpsG = QtW.QLabel()
         self.maxfpsG = QtW.QLabel()
         self.maxfpsG.setText("Max FPS: 0.00")
         self.framecountG = QtW.QLabel()
         self.savecountG = QtW.QLabel()
+        self.dropcountG = QtW.QLabel()
+        self.queuedepthG = QtW.QLabel()
+        self.latencyG = QtW.QLabel()  # Fetch to emit latency
+        self.savelatencyG = QtW.QLabel()
+        self.lostcountG = QtW.QLabel()  # Lost frames, fetch timeouts and incomplete buffers
+        self.exhaustedG = QtW.QLabel()
         self.imageHG = QtW.QLabel()
         self.imageHG.setText("Image Height: 0")
         self.imageWG = QtW.QLabel()
@@ -166,8 +169,14 @@ class GUI(QtW.QMainWindow):
         self.infolout.addWidget(self.fpsG, 1, 2)
         self.infolout.addWidget(self.framecountG, 2, 1)
         self.infolout.addWidget(self.savecountG, 2, 2)
-        self.infolout.addWidget(self.imageWG, 3, 1)
-        self.infolout.addWidget(self.imageHG, 3, 2)
+        self.infolout.addWidget(self.dropcountG, 3, 1)
+        self.infolout.addWidget(self.queuedepthG, 3, 2)
+        self.infolout.addWidget(self.latencyG, 4, 1)
+        self.infolout.addWidget(self.savelatencyG, 4, 2)
+        self.infolout.addWidget(self.lostcountG, 5, 1)
+        self.infolout.addWidget(self.exhaustedG, 5, 2)
+        self.infolout.addWidget(self.imageWG, 6, 1)
+        self.infolout.addWidget(self.imageHG, 6, 2)
         self.infobox.setLayout(self.infolout)
 
         # Create Image Properties group GUI elements
@@ -177,6 +186,7 @@ class GUI(QtW.QMainWindow):
         self.formatG = QtW.QPushButton()
         self.formatLG = QtW.QLabel()
         self.rotateG = QtW.QPushButton()
+        self.rawBayerG = QtW.QPushButton()
         self.rotationG = QtW.QComboBox()
         self.threshG = QtW.QPushButton()
         self.bint = QtW.QSpinBox()
@@ -200,6 +210,8 @@ class GUI(QtW.QMainWindow):
         self.packetIntervalG = QtW.QSpinBox()
         self.frameDelayG = QtW.QSpinBox()
         self.bufferG = QtW.QSpinBox()
+        self.autobufG = QtW.QPushButton()
+        self.autotuneG = QtW.QPushButton()
         self.limitFPStogG = QtW.QPushButton()
         self.limitFPSvalG = QtW.QSpinBox()
 
@@ -211,6 +223,7 @@ class GUI(QtW.QMainWindow):
 
         # Load camHandler settings and update GUI elements
         self.setInit()
+        self.markPhase("window")
         self.updateDevicelist()
         self.updateDeviceInfo()
 
@@ -274,6 +287,52 @@ class GUI(QtW.QMainWindow):
         self.savingG.clicked.connect(self.toggleSaving)
         self.handlerproplout.addWidget(self.savingG, 2, 2)
 
+        self.handlerproplout.addWidget(QtW.QLabel("Store Mode"), 3, 1)
+        for mode in recmodes:
+            self.recmodeG.addItem(mode)
+        self.recmodeG.currentIndexChanged.connect(self.changeRecmode)
+        self.handlerproplout.addWidget(self.recmodeG, 3, 2)
+
+        self.handlerproplout.addWidget(QtW.QLabel("Image Format"), 4, 1)
+        for imgformat in imgformats:
+            self.imgformatG.addItem(imgformat)
+        self.imgformatG.currentIndexChanged.connect(self.changeImgformat)
+        self.handlerproplout.addWidget(self.imgformatG, 4, 2)
+
+        self.handlerproplout.addWidget(QtW.QLabel("Store Overflow"), 5, 1)
+        for policy in overflowpolicies:
+            self.overflowG.addItem(policy)
+        self.overflowG.currentIndexChanged.connect(self.changeOverflow)
+        self.handlerproplout.addWidget(self.overflowG, 5, 2)
+
+        self.handlerproplout.addWidget(QtW.QLabel("Store Workers"), 6, 1)
+        self.writernumG.setMinimum(1)
+        self.writernumG.setMaximum(16)
+        self.writernumG.valueChanged.connect(self.changeWriternum)
+        self.handlerproplout.addWidget(self.writernumG, 6, 2)
+
+        self.eventmodeG.setText('Event Store')
+        self.eventmodeG.setCheckable(True)
+        self.eventmodeG.setStyleSheet("background-color : lightgray")
+        self.eventmodeG.clicked.connect(self.toggleEventMode)
+        self.handlerproplout.addWidget(self.eventmodeG, 7, 1)
+
+        self.fireEventG.setText('Fire Event')
+        self.fireEventG.clicked.connect(self.fireEvent)
+        self.handlerproplout.addWidget(self.fireEventG, 7, 2)
+
+        self.handlerproplout.addWidget(QtW.QLabel("Pre-Event (s)"), 8, 1)
+        self.preEventG.setMinimum(0)
+        self.preEventG.setMaximum(60)
+        self.preEventG.valueChanged.connect(self.changePreEvent)
+        self.handlerproplout.addWidget(self.preEventG, 8, 2)
+
+        self.handlerproplout.addWidget(QtW.QLabel("Post-Event (s)"), 9, 1)
+        self.postEventG.setMinimum(0)
+        self.postEventG.setMaximum(60)
+        self.postEventG.valueChanged.connect(self.changePostEvent)
+        self.handlerproplout.addWidget(self.postEventG, 9, 2)
+
         self.handlerpropset.setLayout(self.handlerproplout)
 
     # Method for initializing the Image Properties group box
@@ -345,6 +404,12 @@ class GUI(QtW.QMainWindow):
         self.imageproplout.addWidget(self.exposureG, 5, 2)
 
         self.imageproplout.addWidget(self.partialset, 6, 1, 1, 2)
+
+        self.rawBayerG.setText('Keep Raw Bayer')
+        self.rawBayerG.setCheckable(True)
+        self.rawBayerG.setStyleSheet("background-color : lightgray")
+        self.rawBayerG.clicked.connect(self.toggleRawBayer)
+        self.imageproplout.addWidget(self.rawBayerG, 7, 1, 1, 2)
         self.imagepropset.setLayout(self.imageproplout)
 
     # Method for initializing the Network Properties group box
@@ -365,10 +430,20 @@ class GUI(QtW.QMainWindow):
 
         self.connproplout.addWidget(QtW.QLabel("Number of Buffers"), 4, 1)
         self.bufferG.setMinimum(1)
-        self.bufferG.setMaximum(50)
+        self.bufferG.setMaximum(max(50, self.camHand.tuner.maxbuf))
         self.bufferG.valueChanged.connect(self.changeBuf)
         self.connproplout.addWidget(self.bufferG, 4, 2)
 
+        self.autobufG.setText("Auto Buffers")
+        self.autobufG.setStyleSheet("background-color : lightgray")
+        self.autobufG.setCheckable(True)
+        self.autobufG.clicked.connect(self.toggleAutoBuffers)
+        self.connproplout.addWidget(self.autobufG, 6, 1)
+
+        self.autotuneG.setText("Auto Tune")
+        self.autotuneG.clicked.connect(self.startAutoTune)
+        self.connproplout.addWidget(self.autotuneG, 6, 2)
+
         self.limitFPStogG.setText("Limit FPS")
         self.limitFPStogG.setStyleSheet("background-color : lightgray")
         self.limitFPStogG.setCheckable(True)
@@ -380,9 +455,22 @@ class GUI(QtW.QMainWindow):
 
     # Method for updating Info group elements
     def updateInfo(self):
+        self.savecount = self.camHand.writer.written
+        self.dropcount = self.camHand.writer.dropped
         self.fpsG.setText('FPS: %.2f' % self.fps)
         self.framecountG.setText('Acquired Frames: %d' % self.framecount)
         self.savecountG.setText('Saved Frames: %d' % self.savecount)
+        self.dropcountG.setText('Dropped Frames: %d' % self.dropcount)
+        stats = self.camHand.stats
+        gauge = stats.gauges.get("store_queue")
+        self.queuedepthG.setText('Store Queue: %d (max %d)' % (self.camHand.writer.depth(), gauge.max if gauge else 0))
+        hist = stats.histogram("fetch_emit")
+        self.latencyG.setText('Latency p50/p99: %.2f/%.2f ms' % (hist.percentile(50) * 1000, hist.percentile(99) * 1000))
+        hist = stats.histogram("save")
+        self.savelatencyG.setText('Save p50/p99: %.2f/%.2f ms' % (hist.percentile(50) * 1000, hist.percentile(99) * 1000))
+        self.lostcountG.setText('Lost/Timeouts/Incomplete: %d/%d/%d' % (
+            stats.get("lost"), stats.get("timeouts"), stats.get("incomplete")))
+        self.exhaustedG.setText('Pool Exhausted: %d' % stats.get("pool_exhausted"))
         self.bufferG.setValue(self.camHand.bufnum)
 
     # Method for updating all device related elements (except device list)
@@ -413,9 +501,9 @@ class GUI(QtW.QMainWindow):
                 self.gainG.blockSignals(False)
             if cam.getProperty("ExposureTime") is not None:
                 self.exposureG.blockSignals(True)
-                self.exposureG.setMaximum(cam.getProperty("MaxExposureTime"))
-                self.exposureG.setMinimum(cam.getProperty("MinExposureTime"))
-                self.exposureG.setValue(cam.getProperty("ExposureTime"))
+                self.exposureG.setMaximum(int(cam.getProperty("MaxExposureTime")))
+                self.exposureG.setMinimum(int(cam.getProperty("MinExposureTime")))
+                self.exposureG.setValue(int(cam.getProperty("ExposureTime")))
                 self.exposureG.blockSignals(False)
             pixform = cam.getProperty("PixelFormat")
             if pixform == 'BayerRG8':
@@ -460,8 +548,14 @@ class GUI(QtW.QMainWindow):
 
     # Method for updating the device list
     def updateDevicelist(self):
+        if self.runTask(self.camHand.updateDevices, self.showDevicelist):
+            self.deviceListG.clear()
+            self.deviceListG.addItem('Searching devices...')
+
+    # Method for showing the devices found by the device list update
+    def showDevicelist(self):
+        self.markPhase("discovery")
         self.deviceListG.clear()
-        self.camHand.harvester.update()
         length = len(self.camHand.harvester.device_info_list)
         if length == 0:
             self.deviceListG.addItem('No devices found')
@@ -474,20 +568,74 @@ class GUI(QtW.QMainWindow):
     def toggleCurrDevice(self):
         if self.usedevG.isChecked():
             actdev = self.deviceListG.currentIndex()
-            if actdev != -1:
-                self.camHand.changeCam(actdev)
-            if self.camHand.cam is None:
+            self.markPhase("waiting")
+            if actdev == -1 or not self.runTask(functools.partial(self.openDevice, actdev), self.deviceOpened):
                 self.usedevG.setChecked(False)
-            else:
-                self.usedevG.setStyleSheet("background-color : lightgreen")
-                self.updateDeviceInfo()
-                self.connpropset.setEnabled(True)
-                self.imagepropset.setEnabled(True)
         else:
             count = self.deviceListG.count()
-            self.camHand.changeCam(count)
-            self.usedevG.setStyleSheet("background-color : lightgray")
+            if self.runTask(functools.partial(self.camHand.changeCam, count), self.updateDeviceInfo):
+                self.usedevG.setStyleSheet("background-color : lightgray")
+            else:
+                self.usedevG.setChecked(True)
+
+    # Method for opening a device, run in a background thread
+    # input: ind, index of the device in the device list
+    def openDevice(self, ind):
+        self.camHand.changeCam(ind)
+        if self.camHand.cam is not None:
+            TransportTuner(self.camHand).applyStored()  # Transport settings tuned earlier for the device
+
+    # Method for updating the GUI after a device was opened
+    def deviceOpened(self):
+        self.markPhase("device open")
+        if self.camHand.cam is None:
+            self.usedevG.setChecked(False)
+        else:
+            self.usedevG.setStyleSheet("background-color : lightgreen")
             self.updateDeviceInfo()
+            self.connpropset.setEnabled(True)
+            self.imagepropset.setEnabled(True)
+        self.updtListG.setEnabled(self.camHand.cam is None)  # Updating the list would close the device
+
+    # Method for ending a phase of the program start, phases after the first frame are not timed
+    # input: name, name of the phase
+    def markPhase(self, name):
+        if self.timer is not None and not self.timer.marked("first frame"):
+            self.timer.mark(name)
+
+    # Method for running a device operation in a background thread, keeping the GUI responsive
+    # input: target, function run in the thread
+    # input: done, method called on the GUI thread when the function has returned
+    # return: boolean, was the operation started? (False while another one is running)
+    def runTask(self, target, done):
+        if self.task is not None:
+            return False
+        for widget in [self.deviceListG, self.usedevG, self.updtListG, self.acquiringG]:
+            widget.setEnabled(False)
+        self.taskDone = done
+        self.task = threading.Thread(target=target, name="DeviceTask", daemon=True)
+        self.task.start()
+        self.taskTimer.start()
+        return True
+
+    # Method for checking if the device operation has finished
+    def pollTask(self):
+        if self.task is None or self.task.is_alive():
+            return
+        self.taskTimer.stop()
+        self.task = None
+        for widget in [self.deviceListG, self.usedevG, self.acquiringG]:
+            widget.setEnabled(True)
+        self.updtListG.setEnabled(self.camHand.cam is None)
+        done = self.taskDone
+        self.taskDone = None
+        done()
+
+    # Method for waiting until the device operation has finished
+    def waitTask(self):
+        if self.task is not None:
+            self.task.join()
+            self.pollTask()
 
     # Method for changing the image save directory
     def changeSaveDirectory(self):
@@ -504,6 +652,7 @@ class GUI(QtW.QMainWindow):
     def toggleImaging(self):
         if self.camHand.cam is not None:
             if self.acquiringG.isChecked():
+                self.markPhase("waiting")
                 self.acquiringG.setStyleSheet("background-color : lightgreen")
                 self.camHand.acquire = True
                 self.triggerG.setEnabled(False)
@@ -512,21 +661,42 @@ class GUI(QtW.QMainWindow):
                 self.usedevG.setEnabled(False)
                 self.connpropset.setEnabled(False)
                 self.limitFPStogG.setEnabled(False)
+                self.recmodeG.setEnabled(False)
+                self.imgformatG.setEnabled(False)
+                self.overflowG.setEnabled(False)
+                self.writernumG.setEnabled(False)
+                self.preEventG.setEnabled(False)
+                self.postEventG.setEnabled(False)
                 self.pixform = self.camHand.getProperty("PixelFormat")
                 self.framecount = 0
                 self.savecount = 0
+                self.dropcount = 0
+                self.camHand.startWriter()
+                self.camHand.writer.resetCounters()
                 self.updateDeviceInfo()
+                self.start = time.time()
+                self.startcount = 0
                 self.imageRet.start()
+                self.previewTimer.start()
             else:
                 self.camHand.acquire = False
-                self.camHand.sync = False
                 self.triggerG.setEnabled(True)
                 self.formatG.setEnabled(True)
                 self.connpropset.setEnabled(True)
                 self.partialG.setEnabled(True)
                 self.usedevG.setEnabled(True)
                 self.limitFPStogG.setEnabled(True)
+                self.recmodeG.setEnabled(True)
+                self.imgformatG.setEnabled(True)
+                self.overflowG.setEnabled(True)
+                self.writernumG.setEnabled(True)
+                self.preEventG.setEnabled(True)
+                self.postEventG.setEnabled(True)
                 self.imageRet.wait()  # Avoid race conditions
+                self.previewTimer.stop()
+                self.preview.discard()
+                self.drawImage()  # Show the last preview image and the final counts
+                self.camHand.stopWriter()  # Write out the queued images and finish the recording
                 self.updateDeviceInfo()
                 self.acquiringG.setStyleSheet("background-color : lightgray")
         else:
@@ -537,8 +707,10 @@ class GUI(QtW.QMainWindow):
     def togglePreview(self):
         if self.previewG.isChecked():
             self.previewG.setStyleSheet("background-color : lightgreen")
+            self.preview.enabled = True
         else:
             self.previewG.setStyleSheet("background-color : lightgray")
+            self.preview.enabled = False
 
     # Control method for toggling the image saving
     def toggleSaving(self):
@@ -549,6 +721,19 @@ class GUI(QtW.QMainWindow):
             self.savingG.setStyleSheet("background-color : lightgray")
             self.camHand.saving = False
 
+    # Control method for toggling the event recording mode (only the frames around events are stored)
+    def toggleEventMode(self):
+        if self.eventmodeG.isChecked():
+            self.eventmodeG.setStyleSheet("background-color : lightgreen")
+            self.camHand.eventmode = True
+        else:
+            self.eventmodeG.setStyleSheet("background-color : lightgray")
+            self.camHand.eventmode = False
+
+    # Control method for firing a software event in the event recording mode
+    def fireEvent(self):
+        self.camHand.events.trigger()
+
     # Control method for switching between pixel formats
     def switchFormat(self):
         if self.camHand.cam is not None:
@@ -573,6 +758,7 @@ class GUI(QtW.QMainWindow):
         else:
             self.threshG.setStyleSheet("background-color : lightgray")
             self.camHand.filtering = False
+        self.camHand.updatePipeline()
 
     # Control method for toggling the triggered acquisition
     def toggleTrigger(self):
@@ -637,6 +823,29 @@ class GUI(QtW.QMainWindow):
             self.limitFPSvalG.setEnabled(True)
             self.camHand.toggleFPSLimit()
 
+    # Method for toggling the tuning of the number of buffers between acquisition sessions
+    def toggleAutoBuffers(self):
+        if self.autobufG.isChecked():
+            self.autobufG.setStyleSheet("background-color : lightgreen")
+            self.bufferG.setEnabled(False)
+            self.camHand.autobuf = True
+        else:
+            self.autobufG.setStyleSheet("background-color : lightgray")
+            self.bufferG.setEnabled(True)
+            self.camHand.autobuf = False
+
+    # Method for starting the transport tuning of the device in a background thread
+    def startAutoTune(self):
+        if self.camHand.cam is not None and self.runTask(TransportTuner(self.camHand).tune, self.autoTuneDone):
+            self.connpropset.setEnabled(False)
+            self.autotuneG.setText("Tuning...")
+
+    # Method for updating the GUI after the transport tuning has finished
+    def autoTuneDone(self):
+        self.autotuneG.setText("Auto Tune")
+        self.connpropset.setEnabled(True)
+        self.updateDeviceInfo()
+
     # Method for toggling image rotation
     def toggleRotation(self):
         if self.rotateG.isChecked():
@@ -645,16 +854,35 @@ class GUI(QtW.QMainWindow):
                 self.camHand.rotate = True
         else:
             self.rotateG.setStyleSheet("background-color : lightgray")
+            self.camHand.rotate = False
+        self.camHand.updatePipeline()
+
+    # Method for toggling raw Bayer storage (frames are demosaiced only for the preview)
+    def toggleRawBayer(self):
+        if self.rawBayerG.isChecked():
+            self.rawBayerG.setStyleSheet("background-color : lightgreen")
+            self.camHand.rawbayer = True
+        else:
+            self.rawBayerG.setStyleSheet("background-color : lightgray")
+            self.camHand.rawbayer = False
+        self.camHand.updatePipeline()
 
     # Method for loading camHand options and updating the responding GUI elements
     def setInit(self):
         if self.camHand.savepth is not None:
             self.savepathG.setText(self.camHand.savepth[:-1])
         self.bint.setValue(self.camHand.thrsh)
+        self.recmodeG.setCurrentIndex(recmodes.index(self.camHand.recmode))
+        self.imgformatG.setCurrentIndex(imgformats.index(self.camHand.imgformat))
+        self.overflowG.setCurrentIndex(overflowpolicies.index(self.camHand.overflow))
+        self.writernumG.setValue(self.camHand.writernum)
+        self.preEventG.setValue(self.camHand.events.pre)
+        self.postEventG.setValue(self.camHand.events.post)
 
     # Method for updating the correct image rotation angle
     def changeRotation(self):
         self.camHand.rotation = (self.rotationG.currentIndex() + 1) * 90
+        self.camHand.updatePipeline()
 
     # Method for updating FPS limit variable
     def changeFPSLimit(self):
@@ -664,9 +892,34 @@ class GUI(QtW.QMainWindow):
     def changeBuf(self):
         self.camHand.changeBufnum(self.bufferG.value())
 
+    # Method for updating the storage mode
+    def changeRecmode(self):
+        self.camHand.recmode = recmodes[self.recmodeG.currentIndex()]
+
+    # Method for updating the image file format
+    def changeImgformat(self):
+        self.camHand.imgformat = imgformats[self.imgformatG.currentIndex()]
+
+    # Method for updating the writer queue overflow policy
+    def changeOverflow(self):
+        self.camHand.overflow = overflowpolicies[self.overflowG.currentIndex()]
+
+    # Method for updating the number of image writer workers
+    def changeWriternum(self):
+        self.camHand.writernum = self.writernumG.value()
+
+    # Method for updating the pre-event window length
+    def changePreEvent(self):
+        self.camHand.events.pre = self.preEventG.value()
+
+    # Method for updating the post-event window length
+    def changePostEvent(self):
+        self.camHand.events.post = self.postEventG.value()
+
     # Method for updating the threshold
     def changeBint(self):
         self.camHand.thrsh = self.bint.value()
+        self.camHand.updatePipeline()
 
     # Method for updating frame delay
     def changeFrameDelay(self):
@@ -717,16 +970,9 @@ class GUI(QtW.QMainWindow):
     def changePcktInterval(self):
         self.camHand.setProperty("PacketInterval", self.packetIntervalG.value())
 
-    # Method for polling free saving threads
-    def pollThreads(self):
-        freethr = -1
-        for i in range(len(self.imageSaverList)):
-            if not self.imageSaverList[i].isRunning():
-                freethr = i
-        return freethr
-
     # Method describing the program shutdown behaviour
     def closeEvent(self, e):
+        self.waitTask()  # Let a device operation in progress finish
         if self.camHand.cam is not None:
             if self.acquiringG.isChecked():
                 self.acquiringG.setChecked(False)
@@ -737,43 +983,35 @@ class GUI(QtW.QMainWindow):
                     self.togglePartial()
             self.usedevG.setChecked(False)
             self.toggleCurrDevice()
+            self.waitTask()
+        self.camHand.closeWarm()  # Idle devices save their changed settings
+        self.camHand.stopWriter()  # Write out the images still waiting in the queue
+        self.preview.stop()
         self.camHand.harvester.reset()
         #self.camHand.save()
         self.camHand.closeerrlog()
         e.accept()
 
-    # Method for drawing and saving the acquired image
-    # Uses a slot to intercept the signal transmitted by the acquisition thread
-    @QtC.pyqtSlot(numpy.ndarray, str)
-    def drawImage(self, arr, tstamp):
-        self.framecount += 1
-        imag = self.camHand.filtImag(arr)
-        thr = self.pollThreads()
-        if self.camHand.saving:
-            if thr < 0:
-                self.camHand.logerror("No save threads available, FrameCount:{0}".format(self.framecount))
+    # Method for drawing the latest preview image and updating the counters, run by the preview timer
+    def drawImage(self):
+        self.framecount = self.imageRet.engine.framecount
+        if self.framecount > 0 and self.timer is not None and not self.timer.marked("first frame"):
+            self.markPhase("first frame")
+            self.camHand.logerror("Info: Startup: " + self.timer.report())  # No console for run.pyw
+        now = time.time()
+        if now - self.start >= 0.5:  # Average the frame rate over half a second
+            self.fps = (self.framecount - self.startcount) / (now - self.start)
+            self.start = now
+            self.startcount = self.framecount
+        size = self.screen.size()
+        self.preview.size = (max(1, size.width() - 2), max(1, size.height() - 2))
+        ret = self.preview.latest(self.previewseq)
+        if ret is not None and self.previewG.isChecked():
+            imag, tstamp, scale, self.previewseq = ret
+            if imag.ndim == 3:  # Demosaiced color image
+                qimg = QtG.QImage(imag.data, imag.shape[1], imag.shape[0], imag.strides[0], QtG.QImage.Format_RGB888)
             else:
-                self.imageSaverList[thr].tstamp = tstamp
-                self.imageSaverList[thr].bw = imag
-                self.imageSaverList[thr].start(QtC.QThread.Priority.HighPriority)
-        if self.previewG.isChecked():
-            if self.pixform == 'BayerRG8':
-                qimg = QtG.QImage(imag.data, imag.shape[1], imag.shape[0], QtG.QImage.Format_RGB888)
-                self.screen.setImage(qimg)
-            if self.pixform == 'Mono8':
-                qimg = QtG.QImage(imag.data, imag.shape[1], imag.shape[0], QtG.QImage.Format_Grayscale8)
-                self.screen.setImage(qimg)
-        if self.drawimagcount == 10:
-            self.stop = time.time()
-            self.fps = (1 / ((self.stop - self.start) / 10))
-            self.start = time.time()
-            self.drawimagcount = 0
-        self.updateInfo()
-        self.drawimagcount += 1
-
-    # Method to increase the saved image counter
-    # Uses a slot to receive the image saved signal
-    @QtC.pyqtSlot()
-    def increaseSaved(self):
-        self.savecount += 1
+                qimg = QtG.QImage(imag.data, imag.shape[1], imag.shape[0], imag.strides[0],
+                                  QtG.QImage.Format_Grayscale8)
+            self.screen.setImage(qimg, imag, scale)
         self.updateInfo()
@@ -0,0 +1,144 @@
+import functools
+import os
+from bandwidthScheduler import BandwidthScheduler
+from camHandler import CamHandler, makeHarvester
+from engine import AcquisitionEngine
+from frameSync import FrameSync
+from transportTuner import TransportTuner
+
+
+# Class for acquiring from several devices at once
+# Every device gets its own camHandler (frame pool, processing pipeline, writer) and acquisition thread, only the
+# harvester is shared, so the devices do not wait for each other
+class MultiCamManager:
+    # Initialization method
+    # input: cti, path of the GenTL producer cti file (None for the default ctipath)
+    # input: harvester, harvester object to use instead of a new Harvester (e.g. simCam.SimHarvester)
+    def __init__(self, cti=None, harvester=None):
+        if harvester is None:
+            harvester = makeHarvester(cti)
+        self.harvester = harvester  # Harvester shared by the handlers
+        self.handlers = []  # camHandler object of every open device
+        self.engines = []  # Acquisition engine of every open device
+        self.names = []  # Serial number of every open device
+        self.sync = None  # Frame synchronizer matching the frames of the devices, see synchronize()
+        self.harvester.update()
+
+    # Method for opening devices
+    # input: indices, indices of the devices in harvester.device_info_list (None opens every device)
+    # return: list of indices that could not be opened (e.g. in use by another program)
+    def open(self, indices=None):
+        devices = self.harvester.device_info_list
+        if indices is None:
+            indices = range(len(devices))
+        failed = []
+        for ind in indices:
+            handler = CamHandler(harvester=self.harvester)
+            handler.changeCam(ind)
+            if handler.cam is None:
+                handler.closeerrlog()
+                failed.append(ind)
+                continue
+            TransportTuner(handler).applyStored()  # Transport settings tuned earlier for the device
+            engine = AcquisitionEngine(handler)
+            engine.addConsumer(handler.storeFrame)
+            self.handlers.append(handler)
+            self.engines.append(engine)
+            self.names.append(devices[ind].serial_number)
+        return failed
+
+    # Method for matching the frames of every open device by timestamp, call after open() and before start()
+    # input: tolerance, largest allowed timestamp difference inside a matched set (in ns)
+    # input: callback, function called with every matched set, callback(frames, tstamps) with the frames in the
+    #        order of handlers
+    # input: devicetime, match by the device timestamps (devices sharing a clock e.g. PTP) instead of host time
+    # return: FrameSync object
+    def synchronize(self, tolerance, callback, devicetime=False):
+        self.sync = FrameSync(len(self.handlers), tolerance, callback, devicetime=devicetime)
+        for ind in range(len(self.engines)):
+            self.engines[ind].addConsumer(functools.partial(self.sync.push, ind))
+        return self.sync
+
+    # Method for sharing one network link between the open devices, call after the settings are made and before start()
+    # Raises ValueError when the devices need more than the link budget, nothing is changed then
+    # input: linkrate, bandwidth of the shared link (bytes per second)
+    # return: list of the schedule entries of the devices (see BandwidthScheduler.plan())
+    def schedule(self, linkrate=125000000):
+        return BandwidthScheduler(self.handlers, linkrate).apply()
+
+    # Method for closing every open device
+    def close(self):
+        self.stop()
+        for handler in self.handlers:
+            if handler.partial:
+                handler.togglePartial()
+            handler.changeCam(-1)  # Disconnect the device
+            handler.closeerrlog()
+        self.handlers = []
+        self.engines = []
+        self.names = []
+        self.sync = None
+
+    # Method for storing the images of every device in its own subdirectory
+    # input: dirname, base directory, a subdirectory named by the device serial number is created in it
+    # return: boolean, was the change successful?
+    def changeSaveDir(self, dirname):
+        if not os.path.isdir(dirname):
+            return False
+        for handler, name in zip(self.handlers, self.names):
+            subdir = os.path.join(dirname, name)
+            if not os.path.isdir(subdir):
+                os.mkdir(subdir)
+            handler.changeSaveDir(subdir)
+        return True
+
+    # Method for starting acquisition and storage on every open device
+    # input: maxframes, stop each device after this many frames (0 for no limit)
+    # input: maxtime, stop after this many seconds (0 for no limit)
+    def start(self, maxframes=0, maxtime=0):
+        for handler in self.handlers:
+            handler.startWriter()
+            handler.writer.resetCounters()
+        if self.sync is not None:
+            self.sync.resetCounters()
+        for engine in self.engines:
+            engine.start(maxframes, maxtime)
+
+    # Method for waiting until every device has reached its limits
+    def wait(self):
+        for engine in self.engines:
+            engine.wait()
+
+    # Method for stopping acquisition and writing out the queued images on every device
+    def stop(self):
+        for handler in self.handlers:  # Signal every thread first so the devices stop together
+            handler.acquire = False
+        for handler, engine in zip(self.handlers, self.engines):
+            engine.wait()
+            handler.stopWriter()
+        if self.sync is not None:
+            self.sync.clear()
+
+    # Method for getting the statistics of every device and their totals
+    # return: dictionary with an entry per device serial number and a "total" entry
+    def snapshot(self):
+        ret = {}
+        total = {"frames": 0, "fps": 0.0, "written": 0, "dropped": 0, "failed": 0, "lost": 0, "timeouts": 0,
+                 "incomplete": 0, "pool_exhausted": 0}
+        for handler, engine, name in zip(self.handlers, self.engines, self.names):
+            stats = handler.stats.snapshot()
+            entry = {"frames": engine.framecount, "fps": engine.getFPS(), "written": handler.writer.written,
+                     "dropped": handler.writer.dropped, "failed": handler.writer.failed}
+            for key in ["lost", "timeouts", "incomplete", "pool_exhausted"]:
+                entry[key] = stats["counters"].get(key, 0)
+            for key in total:
+                total[key] = total[key] + entry[key]
+            entry["histograms"] = stats["histograms"]
+            entry["gauges"] = stats["gauges"]
+            ret[name] = entry
+        if self.sync is not None:
+            total["matched"] = self.sync.matched
+            for ind in range(len(self.names)):
+                ret[self.names[ind]]["unmatched"] = self.sync.unmatched[ind]
+        ret["total"] = total
+        return ret
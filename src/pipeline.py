@@ -0,0 +1,203 @@
+import math
+import cv2 as cv
+import numpy
+
+# Static Defines
+stagetypes = ["crop", "lut", "threshold", "rotate", "demosaic", "bin"]
+bayerforms = {"BayerRG8": "RGGB", "BayerGR8": "GRBG", "BayerGB8": "GBRG", "BayerBG8": "BGGR"}
+rotatecodes = {90: cv.ROTATE_90_CLOCKWISE, 180: cv.ROTATE_180, 270: cv.ROTATE_90_COUNTERCLOCKWISE}
+
+
+# Function for getting the number of bits per pixel of a pixel format
+# input: pixform, pixel format name, e.g. "Mono8", "BayerRG12Packed" or "RGB8"
+# return: bits per pixel as transmitted
+def pixelBits(pixform):
+    name = pixform[:-6] if pixform.endswith("Packed") else pixform
+    digits = len(name) - len(name.rstrip("0123456789"))
+    bits = int(name[-digits:]) if digits > 0 else 8
+    if not pixform.endswith("Packed"):
+        bits = 8 * math.ceil(bits / 8)  # Unpacked formats pad every pixel to whole bytes
+    if pixform[:3] in ["RGB", "BGR"]:
+        bits = 3 * bits
+    return bits
+
+
+# Function for demosaicing a raw Bayer image, used where frames kept raw are shown or read back
+# input: imag, raw single plane image
+# input: pixform, pixel format of the image (see bayerforms)
+# input: dst, output array of shape (height, width, 3), None allocates a new one
+# return: RGB image
+def demosaic(imag, pixform, dst=None):
+    return cv.cvtColor(imag, getattr(cv, "COLOR_Bayer%s2RGB" % bayerforms[pixform]), dst=dst)
+
+
+# Function for getting the Bayer pattern of a transformed raw image
+# input: pattern, Bayer pattern of the source image, e.g. "RGGB"
+# input: transform, function mapping a (row, col) of the transformed image to the (row, col) of the source
+# return: Bayer pattern of the transformed image
+def mapPattern(pattern, transform):
+    ret = ""
+    for row, col in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+        srow, scol = transform(row, col)
+        ret += pattern[(srow % 2) * 2 + scol % 2]
+    return ret
+
+
+# Function for mapping a rectangle of a rotated image back to the image before rotation
+# input: rect, (x, y, w, h) in the rotated image
+# input: rotation, rotation angle (90, 180 or 270, clockwise)
+# input: width, width of the image before rotation
+# input: height, height of the image before rotation
+# return: (x, y, w, h) in the image before rotation
+def unrotateRect(rect, rotation, width, height):
+    x, y, w, h = rect
+    if rotation == 90:  # dst(r, c) = src(height - 1 - c, r)
+        return y, height - x - w, h, w
+    elif rotation == 180:
+        return width - x - w, height - y - h, w, h
+    elif rotation == 270:  # dst(r, c) = src(c, width - 1 - r)
+        return width - y - h, x, h, w
+    return rect
+
+
+# Class for a declarative frame processing chain, planned into the fewest full frame passes
+# Stages are (name, parameter) tuples:
+#   ("crop", (x, y, w, h)), ("lut", 256 entry uint8 table), ("threshold", level), ("rotate", 90/180/270),
+#   ("demosaic", None), ("bin", factor)
+# Crops and rotations are composed into one view of the raw image and point operations into one table, which are
+# applied on the raw plane before demosaicing (the Bayer pattern is remapped for the crop offset and rotation).
+# Binning is done last.
+class Pipeline:
+    # Initialization method
+    # input: stages, list of stages
+    def __init__(self, stages=None):
+        self.stages = list(stages) if stages is not None else []  # Declared stages
+        self.dirty = True  # Must the chain be planned again before running?
+        self.inshape = None  # Shape of the raw images the chain is planned for
+        self.outshape = None  # Shape of the processed images
+        self.crop = None  # Composed crop of the raw image as (x, y, w, h)
+        self.outformat = None  # Pixel format of the processed images, e.g. "RGB8" or "BayerGR8" if kept raw
+        self.steps = []  # Planned passes as (name, function, buffer) tuples, function(src, dst)
+
+    # Method for replacing the stages, the chain is planned again before the next frame
+    # input: stages, list of stages
+    def configure(self, stages):
+        self.stages = list(stages)
+        self.dirty = True
+
+    # Method for planning the chain for an image format
+    # input: shape, (height, width) of the raw images
+    # input: pixform, pixel format of the raw images
+    def plan(self, shape, pixform):
+        height, width = shape
+        x, y, w, h = 0, 0, width, height  # Crop of the raw image
+        rotation = 0
+        table = numpy.arange(256, dtype=numpy.uint8)
+        pointwise = []
+        demosaic = False
+        binning = 1
+        for name, param in self.stages:
+            if name == "crop":
+                rw, rh = (h, w) if rotation in [90, 270] else (w, h)  # Size of the rotated image
+                cx, cy, cw, ch = param
+                if cx < 0 or cy < 0 or cw <= 0 or ch <= 0 or cx + cw > rw or cy + ch > rh:
+                    raise ValueError("Crop {0} outside the {1}x{2} image".format(param, rw, rh))
+                cx, cy, cw, ch = unrotateRect(param, rotation, w, h)
+                x, y, w, h = x + cx, y + cy, cw, ch
+            elif name == "lut":
+                table = numpy.asarray(param, dtype=numpy.uint8)[table]
+                pointwise.append(name)
+            elif name == "threshold":
+                level = numpy.arange(256, dtype=numpy.uint8)
+                level[:int(param) + 1] = 0  # Same as cv.THRESH_TOZERO
+                table = level[table]
+                pointwise.append(name)
+            elif name == "rotate":
+                if param not in rotatecodes:
+                    raise ValueError("Unknown rotation {0}".format(param))
+                rotation = (rotation + param) % 360
+            elif name == "demosaic":
+                demosaic = True
+            elif name == "bin":
+                binning = binning * int(param)
+            else:
+                raise ValueError("Unknown processing stage {0}".format(name))
+
+        pattern = bayerforms.get(pixform)
+        if pattern is not None:
+            pattern = mapPattern(pattern, lambda r, c: (r + y, c + x))
+            if rotation == 90:
+                pattern = mapPattern(pattern, lambda r, c: (h - 1 - c, r))
+            elif rotation == 180:
+                pattern = mapPattern(pattern, lambda r, c: (h - 1 - r, w - 1 - c))
+            elif rotation == 270:
+                pattern = mapPattern(pattern, lambda r, c: (c, w - 1 - r))
+        if binning > 1 and pattern is not None and not demosaic:
+            raise ValueError("Binning a Bayer image needs the demosaic stage")
+
+        steps = []
+        curshape = (h, w)
+        if len(pointwise) > 0:
+            if "lut" in pointwise:
+                steps.append(("lut", lambda src, dst, t=table: cv.LUT(src, t, dst=dst), curshape))
+            else:  # Thresholds only, cv.threshold is several times faster than a table lookup
+                level = int(numpy.count_nonzero(table == 0)) - 1
+                steps.append(("threshold", lambda src, dst, t=level: cv.threshold(src, t, 255, cv.THRESH_TOZERO,
+                                                                                   dst=dst), curshape))
+        if rotation != 0:
+            if rotation != 180:
+                curshape = (curshape[1], curshape[0])
+            steps.append(("rotate%d" % rotation, lambda src, dst, c=rotatecodes[rotation]: cv.rotate(src, c, dst=dst),
+                          curshape))
+        if demosaic and pattern is not None:
+            curshape = curshape + (3,)
+            code = getattr(cv, "COLOR_Bayer%s2RGB" % pattern)
+            steps.append(("demosaic" + pattern, lambda src, dst, c=code: cv.cvtColor(src, c, dst=dst), curshape))
+        if binning > 1:
+            binshape = (curshape[0] // binning, curshape[1] // binning) + curshape[2:]
+            if binshape[0] == 0 or binshape[1] == 0:
+                raise ValueError("Binning {0} larger than the {1}x{2} image".format(binning, curshape[1], curshape[0]))
+            curshape = binshape
+
+            def binImag(src, dst, n=binning):
+                src = src[:dst.shape[0] * n, :dst.shape[1] * n]
+                cv.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv.INTER_AREA)
+
+            steps.append(("bin%d" % binning, binImag, curshape))
+
+        # Every pass but the last writes to its own preallocated buffer, the last writes to the output frame
+        self.steps = []
+        for i in range(len(steps)):
+            buf = numpy.empty(steps[i][2], dtype=numpy.uint8) if i < len(steps) - 1 else None
+            self.steps.append((steps[i][0], steps[i][1], buf))
+        self.crop = (x, y, w, h)
+        if pattern is None:
+            self.outformat = pixform
+        elif demosaic:
+            self.outformat = "RGB8"
+        else:  # Raw Bayer with the pattern of the cropped and rotated image
+            self.outformat = "Bayer%s8" % pattern[:2]
+        self.inshape = (height, width)
+        self.outshape = curshape
+        self.dirty = False
+
+    # Method for describing the planned passes
+    # return: string such as "threshold -> rotate90 -> demosaicGRBG"
+    def describe(self):
+        if len(self.steps) == 0:
+            return "copy"
+        return " -> ".join(step[0] for step in self.steps)
+
+    # Method for processing a raw image
+    # input: src, raw image with the planned shape
+    # input: dst, output array with the shape outshape
+    def run(self, src, dst):
+        x, y, w, h = self.crop
+        imag = src[y:y + h, x:x + w]
+        if len(self.steps) == 0:
+            numpy.copyto(dst, imag)
+            return
+        for name, func, buf in self.steps:
+            out = buf if buf is not None else dst
+            func(imag, out)
+            imag = out
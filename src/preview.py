@@ -0,0 +1,114 @@
+import threading
+import time
+import cv2 as cv
+from pipeline import bayerforms, demosaic
+
+
+# Class for the preview channel, keeps only the newest processed frame and downscales it in a worker thread
+# The acquisition side never waits for the preview, frames arriving faster than the preview rate replace each other
+class PreviewChannel:
+    # Initialization method
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = None  # Newest frame waiting for the worker as (frame, tstamp), the frame is retained
+        self.image = None  # Latest preview image
+        self.tstamp = 0  # Host timestamp of the latest preview image (in ns)
+        self.scale = 1.0  # Scale of the latest preview image relative to the acquired frame
+        self.seq = 0  # Number of preview images produced
+        self.size = (798, 598)  # Size the preview images are fitted to (width, height)
+        self.maxrate = 30  # Maximum preview images per second
+        self.enabled = False  # Is the preview in use? Frames are not taken while disabled
+        self.skipped = 0  # Frames replaced by a newer one before being previewed
+        self.running = False
+        self.thread = None
+
+    # Method for starting the worker thread
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name="Preview", daemon=True)
+            self.thread.start()
+
+    # Method for stopping the worker thread and releasing the pending frame
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.discard()
+
+    # Method for releasing a frame still waiting for the worker, called when acquisition stops
+    def discard(self):
+        with self.cond:
+            pending = self.pending
+            self.pending = None
+        if pending is not None:
+            pending[0].release()
+
+    # Method for offering a frame to the preview, used as an acquisition engine consumer and never blocks
+    # input: frame, acquired Frame object
+    # input: tstamp, host timestamp of the frame (in ns)
+    def offer(self, frame, tstamp):
+        if not self.enabled:
+            return
+        frame.retain()
+        with self.cond:
+            old = self.pending
+            self.pending = (frame, tstamp)
+            if old is not None:
+                self.skipped += 1
+            self.cond.notify()
+        if old is not None:
+            old[0].release()
+
+    # Method for getting the latest preview image
+    # input: seq, sequence number of the image the caller already has
+    # return: (image, tstamp, scale, seq) tuple, None if there is no newer image
+    def latest(self, seq):
+        with self.cond:
+            if self.image is None or self.seq == seq:
+                return None
+            return self.image, self.tstamp, self.scale, self.seq
+
+    # Method for downscaling an image to fit the preview size, raw Bayer images are demosaiced first
+    # input: imag, image to be downscaled
+    # input: pixform, pixel format of the image
+    # return: imag, downscaled image (the input if it already fits)
+    # return: scale, scale of the result relative to the input
+    def downscale(self, imag, pixform=None):
+        if pixform in bayerforms:
+            imag = demosaic(imag, pixform)
+        height, width = imag.shape[:2]
+        scale = min(self.size[0] / width, self.size[1] / height, 1.0)
+        if scale < 1.0:
+            dsize = (max(1, int(imag.shape[1] * scale)), max(1, int(imag.shape[0] * scale)))
+            imag = cv.resize(imag, dsize, interpolation=cv.INTER_AREA)
+        return imag, scale
+
+    # Method defining the worker loop
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                frame, tstamp = self.pending
+                self.pending = None
+            started = time.perf_counter()
+            try:
+                imag, scale = self.downscale(frame.data, frame.pixform)
+                if imag is frame.data:  # Not downscaled, the frame goes back to the pool
+                    imag = imag.copy()
+            finally:
+                frame.release()
+            with self.cond:
+                self.image = imag
+                self.tstamp = tstamp
+                self.scale = scale
+                self.seq += 1
+            delay = started + 1 / self.maxrate - time.perf_counter()
+            if delay > 0:  # Cap the preview rate, newer frames replace the pending one meanwhile
+                time.sleep(delay)
@@ -0,0 +1,208 @@
+import datetime
+import json
+import os
+import genicam.genapi
+from camHandler import pcktsizes
+
+# Static Defines
+profileversion = 1  # Version of the profile files written
+profiledir = "cfgs/profiles"  # Directory of the profile files
+legacyfile = "cfgs/default.cfgh"  # Line based settings file of earlier versions, read as the default profile
+#  Handler variables stored in a profile
+handlerkeys = ["savepth", "bufnum", "thrsh", "partw", "parth", "offsetx", "offsety", "fpslimit", "rotation", "binning",
+               "rawbayer", "poolsize", "queuelen", "writernum", "overflow", "spillsize", "recmode", "imgformat",
+               "jpgquality", "pnglevel", "encprocs", "autobuf", "filtering", "rotate", "eventmode", "limit", "partial",
+               "triggering"]
+pipelinekeys = ["thrsh", "rotation", "binning", "rawbayer", "filtering", "rotate"]  # Variables used by the pipeline
+#  Device properties stored in a profile, in the order they are written (the image format before the frame rate, which
+#  is limited by it, the enable before the value)
+nodeorder = ["PixelFormat", "Width", "Height", "OffsetX", "OffsetY", "PacketSize", "PacketInterval", "FrameDelay",
+             "ExposureTime", "Gain", "FPSEnable", "FPS", "Trigger"]
+restartprops = ["PixelFormat", "Width", "Height", "OffsetX", "OffsetY", "PacketSize"]  # Locked while acquiring
+
+
+# Class for storing and applying configuration profiles of the handler and the device
+# A profile holds the handler settings and the resolved device property values. Applying it compares the values with
+# the cached state of the device (CamHandler.nodecache, read from the device only once) and writes only the properties
+# that differ, so changing between profiles of the same device costs only the writes it needs.
+class ProfileManager:
+    # Initialization method
+    # input: handler, camHandler object the profiles are captured from and applied to
+    def __init__(self, handler):
+        self.camHand = handler  # camHandler object
+
+    # Method for getting the file name of a profile
+    # input: name, name of the profile
+    # return: path of the profile file
+    def path(self, name):
+        return os.path.join(profiledir, name + ".json")
+
+    # Method for listing the stored profiles
+    # return: sorted list of profile names
+    def names(self):
+        if not os.path.isdir(profiledir):
+            return []
+        return sorted(name[:-5] for name in os.listdir(profiledir) if name.endswith(".json"))
+
+    # Method for reading the current value of a device property, through the cache
+    # input: prop, logical property name (see nodeorder)
+    # return: value in logical units (PacketSize in bytes), None if the device does not have the property
+    def current(self, prop):
+        cam = self.camHand
+        if prop not in cam.caps:
+            return None
+        if prop not in cam.nodecache:
+            if prop == "PacketSize":
+                cam.nodecache[prop] = cam.getProperty(prop)
+            else:
+                cam.nodecache[prop] = cam.readNode(prop, -1 if prop == "PacketInterval" else 0)
+        val = cam.nodecache[prop]
+        if prop == "PacketSize" and val is not None:
+            return pcktsizes[val]
+        return val
+
+    # Method for converting a value to the units written to the device node, for comparing values
+    # input: prop, logical property name
+    # input: val, value in logical units
+    # return: value as written to the node
+    def nodeValue(self, prop, val):
+        scale = self.camHand.caps[prop][0][2]
+        return int(val / scale) if scale != 1 else val
+
+    # Method for capturing the current settings
+    # return: profile dictionary
+    def capture(self):
+        cam = self.camHand
+        handler = {key: getattr(cam, key) for key in handlerkeys}
+        handler["events"] = {"pre": cam.events.pre, "post": cam.events.post}
+        nodes = {}
+        for prop in nodeorder:
+            cam.nodecache.pop(prop, None)  # Read the device, the cache may miss changes made by the device itself
+            val = self.current(prop)
+            if val is not None:
+                nodes[prop] = val
+        device = {}
+        if cam.cam is not None:
+            device = {"model": cam.getProperty("ModelName"), "serial": cam.getProperty("SerialNumber")}
+        return {"version": profileversion, "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "device": device, "handler": handler, "nodes": nodes}
+
+    # Method for storing the current settings as a profile
+    # input: name, name of the profile
+    # return: profile dictionary
+    def save(self, name):
+        profile = self.capture()
+        os.makedirs(profiledir, exist_ok=True)
+        with open(self.path(name), 'w') as file:
+            json.dump(profile, file, indent=1)
+        return profile
+
+    # Method for reading a profile, profiles of earlier versions are converted
+    # input: name, name of the profile
+    # return: profile dictionary, None if the profile does not exist
+    def read(self, name):
+        try:
+            with open(self.path(name), 'r') as file:
+                profile = json.load(file)
+        except FileNotFoundError:
+            if name != "default" or not os.path.isfile(legacyfile):
+                return None
+            profile = self.readLegacy()
+        version = profile.get("version", 0)
+        if version > profileversion:
+            raise ValueError("Profile {0} has version {1}, newest supported is {2}".format(name, version,
+                                                                                       profileversion))
+        profile.setdefault("handler", {})
+        profile.setdefault("nodes", {})
+        profile["version"] = profileversion
+        return profile
+
+    # Method for reading the settings file of earlier versions
+    # return: profile dictionary of version 0
+    def readLegacy(self):
+        with open(legacyfile, 'r') as file:
+            lines = file.read().splitlines()
+        keys = ["savepth", "bufnum", "thrsh", "partw", "parth", "offsetx", "offsety"]
+        handler = {}
+        for key, line in zip(keys, lines):
+            handler[key] = None if line == "None" else line if key == "savepth" else int(line)
+        return {"version": 0, "handler": handler, "nodes": {}}
+
+    # Method for computing the device properties a profile changes
+    # Sizes are written before their offsets, except when an offset moves towards the origin, which makes room for a
+    # larger size only when written first
+    # input: nodes, dictionary of the property values of the profile
+    # return: list of (property, value) in the order they must be written
+    def diff(self, nodes):
+        changes = []
+        for prop in nodeorder:
+            if prop in nodes and prop in self.camHand.caps:
+                val = self.current(prop)
+                if prop == "PacketSize" or isinstance(val, (str, bool)):
+                    changed = nodes[prop] != val
+                else:
+                    changed = self.nodeValue(prop, nodes[prop]) != self.nodeValue(prop, val)
+                if changed:
+                    changes.append((prop, nodes[prop]))
+        props = [prop for prop, val in changes]
+        for size, offset in [("Width", "OffsetX"), ("Height", "OffsetY")]:
+            if size in props and offset in props and nodes[offset] < self.current(offset):
+                change = changes.pop(props.index(offset))
+                changes.insert(props.index(size), change)
+                props = [prop for prop, val in changes]
+        return changes
+
+    # Method for applying a profile
+    # input: profile, profile dictionary
+    # input: live, leave out the properties locked while acquiring (None decides by the device state); the ones left
+    #        out need stopping the acquisition
+    # return: dictionary with lists of the written, the left out (needing a restart) and the failed properties
+    def apply(self, profile, live=None):
+        cam = self.camHand
+        ret = {"written": [], "restart": [], "failed": []}
+        handler = profile.get("handler", {})
+        for key in handlerkeys:
+            if key not in handler:
+                continue
+            if key == "savepth":
+                if handler[key] is not None and not cam.changeSaveDir(handler[key]):
+                    cam.logerror("Warning: Profile storage folder {0} does not exist".format(handler[key]))
+            elif key == "bufnum":
+                cam.bufnum = handler[key]
+                cam.changeBufnum(handler[key])
+            else:
+                setattr(cam, key, handler[key])
+        if "events" in handler:
+            cam.events.pre = handler["events"]["pre"]
+            cam.events.post = handler["events"]["post"]
+        if any(key in handler for key in pipelinekeys):
+            cam.updatePipeline()
+        if cam.cam is None:
+            return ret
+        if live is None:
+            live = cam.cam.is_acquiring()
+        for prop, val in self.diff(profile.get("nodes", {})):
+            if live and prop in restartprops:
+                ret["restart"].append(prop)
+                continue
+            try:
+                cam.setProperty(prop, pcktsizes.index(val) if prop == "PacketSize" else val)
+                ret["written"].append(prop)
+            except (ValueError, genicam.genapi.LogicalErrorException, genicam.genapi.OutOfRangeException,
+                    genicam.genapi.AccessException) as e:
+                cam.nodecache.pop(prop, None)
+                cam.logerror("Warning: Profile value {0} of {1} could not be written: {2}".format(val, prop, e))
+                ret["failed"].append(prop)
+        if len(ret["restart"]) > 0:
+            cam.logerror("Info: Profile properties {0} need the acquisition stopped".format(", ".join(ret["restart"])))
+        return ret
+
+    # Method for reading and applying a stored profile
+    # input: name, name of the profile
+    # input: live, leave out the properties locked while acquiring (None decides by the device state)
+    # return: result of apply(), None if the profile does not exist
+    def load(self, name, live=None):
+        profile = self.read(name)
+        if profile is None:
+            return None
+        return self.apply(profile, live)
@@ -0,0 +1,159 @@
+import datetime
+import json
+import mmap
+import os
+import threading
+import numpy
+
+# Static Defines
+# Index record per header version: frame number, device timestamp, segment number, byte offset in the segment and
+# (from version 2) host timestamp in ns
+indexdtypes = {
+    1: numpy.dtype([("frame", "<u8"), ("tstamp", "<u8"), ("segment", "<u4"), ("offset", "<u8")]),
+    2: numpy.dtype([("frame", "<u8"), ("tstamp", "<u8"), ("segment", "<u4"), ("offset", "<u8"), ("host", "<i8")]),
+}
+indexversion = 2  # Header version of new recordings
+indexdtype = indexdtypes[indexversion]
+segmentsize = 1024 * 1024 * 1024  # Default size of a preallocated segment file (in bytes)
+
+
+# Class for a single preallocated, memory-mapped segment file
+class Segment:
+    # Initialization method
+    # input: fname, path of the segment file
+    # input: size, size of the segment file in bytes
+    def __init__(self, fname, size):
+        self.file = open(fname, 'w+b')
+        self.file.truncate(size)  # Preallocate the whole segment up front
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = 0  # Bytes reserved for frames in the segment
+        self.pending = 0  # Number of frame copies in progress
+        self.full = False  # Have all the frame slots been reserved?
+        self.closed = False  # Has the segment been closed?
+
+    # Method for closing the segment once it is full and its frame copies are completed
+    def retire(self):
+        if self.full and self.pending == 0 and not self.closed:
+            self.map.flush()
+            self.map.close()
+            self.file.truncate(self.used)  # Remove the unused preallocated tail
+            self.file.close()
+            self.closed = True
+
+
+# Class for streaming raw frames into large memory-mapped segment files with a frame index
+class RawRecorder:
+    # Initialization method
+    def __init__(self):
+        self.lock = threading.Lock()  # Lock guarding slot reservation and the index
+        self.segsize = segmentsize  # Requested segment size (in bytes)
+        self.dir = None  # Directory the recordings are stored in
+        self.pixform = None  # Pixel format of the images stored in the header
+        self.path = None  # Directory of the current recording
+        self.header = None  # Header of the current recording
+        self.segment = None  # Segment of the current recording receiving new frames
+        self.index = None  # Index file of the current recording
+        self.frames = 0  # Number of frames in the current recording
+
+    # Method for starting to record into the given directory, the recording begins with the first frame
+    # input: dirname, directory the recordings are stored in (None for the working directory)
+    # input: pixform, pixel format of the images stored in the header
+    def open(self, dirname, pixform):
+        with self.lock:
+            self.finish()
+            self.dir = dirname if dirname is not None else os.getcwd()
+            self.pixform = pixform
+
+    # Method for finishing the current recording
+    def close(self):
+        with self.lock:
+            self.finish()
+            self.dir = None
+
+    # Method for appending a frame to the recording
+    # input: imag, image to be stored
+    # input: frameid, frame number given by the device
+    # input: tstamp, device timestamp of the frame (in ns)
+    # input: pixform, pixel format of the image (None for the format given to open())
+    # input: host, host timestamp of the frame (in ns)
+    def append(self, imag, frameid, tstamp, pixform=None, host=0):
+        with self.lock:
+            if self.dir is None:
+                raise ValueError("Recorder is not open")
+            if pixform is not None and pixform != self.pixform:
+                self.finish()
+                self.pixform = pixform
+            if self.header is None or list(imag.shape) != self.header["shape"]:
+                self.finish()  # Image format changed, continue in a new recording
+                self.begin(imag)
+            seg = self.segment
+            if seg.used + self.header["framesize"] > self.header["segmentsize"]:
+                seg.full = True
+                seg.retire()
+                seg = Segment(self.segmentName(len(self.header["segments"])), self.header["segmentsize"])
+                self.segment = seg
+                self.header["segments"].append(0)
+            segnum = len(self.header["segments"]) - 1
+            offset = seg.used
+            seg.used += self.header["framesize"]
+            seg.pending += 1
+            self.header["segments"][-1] = seg.used
+            self.index.write(numpy.array([(frameid, tstamp, segnum, offset, host)], dtype=indexdtype).tobytes())
+            self.frames += 1
+        # Copy outside the lock so several writers can fill their own slots concurrently
+        view = numpy.frombuffer(seg.map, dtype=numpy.uint8, count=imag.nbytes, offset=offset)
+        numpy.copyto(view.reshape(imag.shape), imag)
+        del view  # The view must be gone before the map can be closed
+        with self.lock:
+            seg.pending -= 1
+            seg.retire()
+
+    # Method for starting a new recording with the format of the given image (lock must be held)
+    # input: imag, first image of the recording
+    def begin(self, imag):
+        string = datetime.datetime.now().strftime("%Y-%m-%d_%H;%M;%S")
+        self.path = os.path.join(self.dir, "Recording_%s" % string)
+        num = 2
+        while os.path.exists(self.path):
+            self.path = os.path.join(self.dir, "Recording_%s_%d" % (string, num))
+            num += 1
+        os.mkdir(self.path)
+        framesize = imag.nbytes
+        self.header = {
+            "version": indexversion,
+            "shape": list(imag.shape),
+            "dtype": str(imag.dtype),
+            "pixelformat": self.pixform,
+            "framesize": framesize,
+            "segmentsize": max(1, self.segsize // framesize) * framesize,
+            "segments": [0],  # Used bytes per segment
+            "frames": 0,
+        }
+        self.frames = 0
+        self.index = open(os.path.join(self.path, "index.bin"), 'wb')
+        self.segment = Segment(self.segmentName(0), self.header["segmentsize"])
+        self.writeHeader()
+
+    # Method for finishing the current recording (lock must be held)
+    def finish(self):
+        if self.header is None:
+            return
+        self.segment.full = True
+        self.segment.retire()  # Closed by the last pending copy if a writer is still filling it
+        self.segment = None
+        self.index.close()
+        self.index = None
+        self.writeHeader()
+        self.header = None
+
+    # Method for writing the recording header
+    def writeHeader(self):
+        self.header["frames"] = self.frames
+        with open(os.path.join(self.path, "header.json"), 'w') as file:
+            json.dump(self.header, file, indent=1)
+
+    # Method for getting the file name of a segment
+    # input: num, segment number
+    # return: path of the segment file
+    def segmentName(self, num):
+        return os.path.join(self.path, "segment_%05d.raw" % num)
@@ -0,0 +1,232 @@
+import argparse
+import sys
+from camHandler import pcktsizes, recmodes
+from encoders import imgformats
+from multiCam import MultiCamManager
+from burst import BurstCapture
+from eventRecorder import brightnessTrigger
+from transportTuner import TransportTuner
+from telemetry import PhaseTimer
+from writerQueue import overflowpolicies
+
+
+# Function for parsing the command line arguments
+# return: parsed arguments
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Record images from one or more GenICam devices without the GUI")
+    parser.add_argument("--cti", help="path of the GenTL producer cti file")
+    parser.add_argument("--sim", action="store_true", help="use simulated devices instead of the GenTL producer")
+    parser.add_argument("--simsize", type=int, nargs=2, metavar=("W", "H"), default=[2448, 2048],
+                        help="sensor size of the simulated devices")
+    parser.add_argument("--simfps", type=float, default=15.0, help="maximum frame rate of the simulated devices")
+    parser.add_argument("--simjitter", type=float, default=0.0, help="frame period jitter of the simulated devices")
+    parser.add_argument("--simdrop", type=float, default=0.0, help="frame drop probability of the simulated devices")
+    parser.add_argument("--simmtu", type=int, default=0,
+                        help="largest packet the network path of the simulated devices carries (0 for no limit)")
+    parser.add_argument("--simhostpps", type=int, default=0,
+                        help="packets per second the host receives from a simulated device (0 for no limit)")
+    parser.add_argument("--list", action="store_true", help="list the available devices and exit")
+    parser.add_argument("--timing", action="store_true",
+                        help="print the time taken by each start up phase up to the first frame")
+    parser.add_argument("--device", type=int, nargs="+", default=[0],
+                        help="indices of the devices in the device list, several devices are recorded at once")
+    parser.add_argument("--sync", type=float, metavar="MS",
+                        help="match the frames of several devices by timestamp within this tolerance (ms)")
+    parser.add_argument("--linkrate", type=float, metavar="MBPS",
+                        help="share a link of this bandwidth (MB/s) between the devices by their packet and frame delays")
+    parser.add_argument("--frames", type=int, default=0, help="number of frames to record")
+    parser.add_argument("--seconds", type=float, default=0, help="recording duration in seconds")
+    parser.add_argument("--burst", type=int, metavar="N",
+                        help="capture N frames (or --seconds) into memory at the full rate and write them afterwards")
+    parser.add_argument("--out", help="directory the images are stored in (default: working directory)")
+    parser.add_argument("--profile", help="apply a configuration profile saved earlier (in cfgs/profiles) before the "
+                        "other settings")
+    parser.add_argument("--saveprofile", metavar="NAME", help="save the settings as a configuration profile")
+    parser.add_argument("--mode", choices=recmodes, help="storage mode (default: image)")
+    parser.add_argument("--format", choices=imgformats, help="image file format in image mode (default: jpg)")
+    parser.add_argument("--writers", type=int, help="number of image writer workers (default: 4)")
+    parser.add_argument("--overflow", choices=overflowpolicies, help="writer queue overflow policy (default: block)")
+    parser.add_argument("--event", type=float, nargs=2, metavar=("PRE", "POST"),
+                        help="store only PRE seconds before and POST seconds after each event")
+    parser.add_argument("--eventlevel", type=int, help="fire an event when the mean brightness rises above this level")
+    parser.add_argument("--nosave", action="store_true", help="acquire without storing the images")
+    parser.add_argument("--pixelformat", help="pixel format of the device, e.g. Mono8 or BayerRG8")
+    parser.add_argument("--partial", type=int, nargs=4, metavar=("W", "H", "X", "Y"), help="partial scan area")
+    parser.add_argument("--exposure", type=float, help="exposure time (us)")
+    parser.add_argument("--gain", type=float, help="gain (dB)")
+    parser.add_argument("--fps", type=int, help="frame rate limit")
+    parser.add_argument("--packetsize", type=int, choices=pcktsizes, help="GigE packet size (B)")
+    parser.add_argument("--buffers", type=int, help="number of acquisition buffers")
+    parser.add_argument("--autobuffers", action="store_true",
+                        help="tune the number of buffers from the acquisition pressure (logged to the error log)")
+    parser.add_argument("--autotune", action="store_true",
+                        help="tune the packet size and packet interval before recording (stored in cfgs/transport.json)")
+    parser.add_argument("--threshold", type=int, help="binarization threshold (1-255)")
+    parser.add_argument("--rotate", type=int, choices=[90, 180, 270], help="image rotation angle")
+    parser.add_argument("--bin", type=int, help="software binning factor")
+    parser.add_argument("--rawbayer", action="store_true",
+                        help="store Bayer frames raw instead of demosaicing them (a third of the data)")
+    return parser.parse_args()
+
+
+# Function for applying the command line settings to the device and handler
+# input: camHand, camHandler object with an active device
+# input: args, parsed command line arguments
+def applySettings(camHand, args):
+    if args.profile is not None:
+        savepth = camHand.savepth
+        if camHand.load(args.profile) is None:
+            print("Profile %s not found" % args.profile)
+        if args.out is not None:  # The storage folder given on the command line is kept
+            camHand.savepth = savepth
+    if args.pixelformat is not None:
+        camHand.setProperty("PixelFormat", args.pixelformat)
+    if args.partial is not None:
+        camHand.partw, camHand.parth, camHand.offsetx, camHand.offsety = args.partial
+        camHand.togglePartial()
+    if args.exposure is not None:
+        camHand.setProperty("ExposureTime", args.exposure)
+    if args.gain is not None:
+        camHand.setProperty("Gain", args.gain)
+    if args.fps is not None:
+        camHand.fpslimit = args.fps
+        camHand.toggleFPSLimit()
+    if args.packetsize is not None:
+        camHand.setProperty("PacketSize", pcktsizes.index(args.packetsize))
+    if args.buffers is not None:
+        camHand.changeBufnum(args.buffers)
+    if args.autobuffers:
+        camHand.autobuf = True
+    if args.autotune:
+        print("Tuning the transport settings...")
+        if TransportTuner(camHand).tune() is None:
+            print("No transport setting delivered every frame, kept the current settings")
+    if args.threshold is not None:
+        camHand.thrsh = args.threshold
+        camHand.filtering = True
+    if args.rotate is not None:
+        camHand.rotation = args.rotate
+        camHand.rotate = True
+    if args.bin is not None:
+        camHand.binning = args.bin
+    if args.rawbayer:
+        camHand.rawbayer = True
+    if args.mode is not None:
+        camHand.recmode = args.mode
+    if args.format is not None:
+        camHand.imgformat = args.format
+    if args.writers is not None:
+        camHand.writernum = args.writers
+    if args.overflow is not None:
+        camHand.overflow = args.overflow
+    camHand.saving = not args.nosave
+    if args.event is not None:
+        camHand.eventmode = True
+        camHand.events.pre, camHand.events.post = args.event
+        if args.eventlevel is not None:
+            camHand.events.condition = brightnessTrigger(args.eventlevel)
+    if args.saveprofile is not None:
+        camHand.save(args.saveprofile)
+
+
+def main():
+    timer = PhaseTimer()
+    args = parseArgs()
+    harvester = None
+    if args.sim:
+        from simCam import SimHarvester, SimDeviceInfo
+        simcfg = {"width": args.simsize[0], "height": args.simsize[1], "fps": args.simfps, "maxfps": args.simfps,
+                  "jitter": args.simjitter, "droprate": args.simdrop, "mtu": args.simmtu, "hostpps": args.simhostpps}
+        harvester = SimHarvester([SimDeviceInfo("sony", "0001", **simcfg), SimDeviceInfo("generic", "0002", **simcfg)])
+    manager = MultiCamManager(args.cti, harvester)
+    devices = manager.harvester.device_info_list
+    timer.mark("discovery")
+    if args.list or len(devices) == 0:
+        if len(devices) == 0:
+            print("No devices found")
+        for i in range(len(devices)):
+            print("%d: %s %s" % (i, devices[i].vendor, devices[i].model))
+        manager.harvester.reset()
+        return 0 if args.list else 1
+
+    ret = 0
+    failed = manager.open(args.device)
+    timer.mark("device open")
+    if len(failed) > 0:
+        print("Could not open device %s" % ", ".join(str(ind) for ind in failed))
+        ret = 1
+    elif args.out is not None and len(manager.handlers) == 1 and not manager.handlers[0].changeSaveDir(args.out):
+        print("Directory %s does not exist" % args.out)
+        ret = 1
+    elif args.out is not None and len(manager.handlers) > 1 and not manager.changeSaveDir(args.out):
+        print("Directory %s does not exist" % args.out)
+        ret = 1
+    elif args.burst is not None:
+        if len(manager.handlers) > 1:
+            print("Burst capture records one device at a time")
+            ret = 1
+        else:
+            camHand = manager.handlers[0]
+            applySettings(camHand, args)
+            burst = BurstCapture(camHand)
+            report = burst.capture(args.burst, args.seconds)
+            print("Captured %d frames (%.2f FPS), lost %d" % (report["frames"], report["fps"], report["lost"]))
+            print("Frame period %.3f ms, capture time p50 %.3f ms, max %.3f ms, headroom min %.3f ms (%.1f %%)" % (
+                report["period_ms"], report["busy_p50_ms"], report["busy_max_ms"], report["headroom_min_ms"],
+                report["headroom_min_pct"]))
+            if camHand.saving:
+                burst.flush()
+                burst.wait()
+                print("Wrote %d frames" % burst.flushed)
+    else:
+        for camHand in manager.handlers:
+            applySettings(camHand, args)
+        if args.linkrate is not None:
+            try:
+                for entry, name in zip(manager.schedule(int(args.linkrate * 1000000)), manager.names):
+                    print("%s: needs %.1f MB/s, packet interval %d, frame delay %d ticks" % (
+                        name, entry["bandwidth"] / 1e6, entry["PacketInterval"], entry["FrameDelay"]))
+            except ValueError as e:
+                print(e)
+                manager.close()
+                manager.harvester.reset()
+                return 1
+        if args.sync is not None and len(manager.handlers) > 1:
+            manager.synchronize(int(args.sync * 1000000), lambda frames, tstamps: None)
+        timer.mark("settings")
+        if args.timing:
+            manager.engines[0].addConsumer(lambda frame, tstamp: timer.marked("first frame") or (
+                timer.mark("first frame"), print("Startup: " + timer.report())))
+        manager.start(args.frames, args.seconds)
+        try:
+            manager.wait()
+        except KeyboardInterrupt:  # Ctrl+C ends the recording
+            pass
+        manager.stop()
+        for camHand, engine, name in zip(manager.handlers, manager.engines, manager.names):
+            prefix = "%s: " % name if len(manager.handlers) > 1 else ""
+            print(prefix + "Acquired %d frames (%.2f FPS), saved %d, dropped %d, failed %d" % (
+                engine.framecount, engine.getFPS(), camHand.writer.written, camHand.writer.dropped,
+                camHand.writer.failed))
+            print(prefix + "Processing: " + camHand.pipeline.describe())
+            if camHand.eventmode:
+                print(prefix + "Events %d, stored %d frames, ring overruns %d" % (
+                    camHand.events.events, camHand.events.dumped, camHand.events.overruns))
+            stats = camHand.stats
+            hist = stats.histogram("fetch_emit")
+            print(prefix + "Latency p50 %.2f ms, p99 %.2f ms, lost %d, timeouts %d, incomplete %d, "
+                  "pool exhausted %d" % (hist.percentile(50) * 1000, hist.percentile(99) * 1000, stats.get("lost"),
+                                         stats.get("timeouts"), stats.get("incomplete"), stats.get("pool_exhausted")))
+        if len(manager.handlers) > 1:
+            total = manager.snapshot()["total"]
+            print("Total: acquired %d frames (%.2f FPS), saved %d, dropped %d" % (
+                total["frames"], total["fps"], total["written"], total["dropped"]))
+            if manager.sync is not None:
+                unmatched = ", ".join("%s: %d" % item for item in zip(manager.names, manager.sync.unmatched))
+                print("Matched %d frame sets, unmatched frames %s" % (manager.sync.matched, unmatched))
+    manager.close()
+    manager.harvester.reset()
+    return ret
+
+if __name__ == "__main__":
+    sys.exit(main())
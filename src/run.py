@@ -1,12 +1,21 @@
-import PyQt5.QtWidgets as QtW
 import sys
-from gui import GUI
+from telemetry import PhaseTimer
 
 
 def main():
+    timer = PhaseTimer()
+    import PyQt5.QtWidgets as QtW  # Imported here, encoder processes import this module without the GUI
+    from gui import GUI
+    timer.mark("imports")
     app = QtW.QApplication(sys.argv)
-    ex = GUI()
+    timer.mark("qt")
+    harvester = None
+    if "--sim" in sys.argv:  # Use simulated devices instead of the GenTL producer
+        from simCam import SimHarvester
+        harvester = SimHarvester()
+    ex = GUI(harvester, timer if "--timing" in sys.argv else None)  # --timing prints the start up phases
     sys.exit(app.exec())
 
 
-main()
+if __name__ == "__main__":  # Encoder processes import this module without starting the GUI
+    main()
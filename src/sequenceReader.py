@@ -0,0 +1,158 @@
+import json
+import os
+import numpy
+from pipeline import bayerforms, demosaic
+from rawRecorder import indexdtypes
+
+
+# Function for listing the raw recordings stored in a directory
+# input: dirname, directory the recordings were stored in
+# return: sorted list of recording directory paths
+def findRecordings(dirname):
+    ret = []
+    for name in sorted(os.listdir(dirname)):
+        path = os.path.join(dirname, name)
+        if os.path.isfile(os.path.join(path, "header.json")):
+            ret.append(path)
+    return ret
+
+
+# Class for random access to a recording of rawRecorder.RawRecorder
+# Frames are memory-mapped straight from the segment files, so reading a frame copies nothing until it is used. The
+# index is sorted by frame number at open (several writers may have appended out of order), positions used by the
+# methods refer to that order.
+class SequenceReader:
+    # Initialization method
+    # input: path, directory of the recording (containing header.json, index.bin and the segment files)
+    def __init__(self, path):
+        self.path = path  # Directory of the recording
+        with open(os.path.join(path, "header.json"), 'r') as file:
+            self.header = json.load(file)  # Header written by the recorder
+        version = self.header.get("version", 1)
+        if version not in indexdtypes:
+            raise ValueError("Unsupported recording version {0}".format(version))
+        self.shape = tuple(self.header["shape"])  # Shape of a single frame
+        self.dtype = numpy.dtype(self.header["dtype"])  # Data type of the pixels
+        self.pixform = self.header["pixelformat"]  # Pixel format of the stored frames
+        self.framesize = self.header["framesize"]  # Size of a single frame (in bytes)
+        self.segments = {}  # Memory maps of the segment files, opened on first use
+
+        dtype = indexdtypes[version]
+        with open(os.path.join(path, "index.bin"), 'rb') as file:
+            data = file.read()
+        index = numpy.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)  # A torn last record is ignored
+        # Frames of an interrupted recording may point past the end of the truncated segment files
+        sizes = numpy.zeros(int(index["segment"].max()) + 1 if len(index) > 0 else 0, dtype=numpy.uint64)
+        for num in numpy.unique(index["segment"]):
+            fname = self.segmentName(int(num))
+            sizes[num] = os.path.getsize(fname) if os.path.isfile(fname) else 0
+        index = index[index["offset"] + self.framesize <= sizes[index["segment"]]]
+        self.index = index[numpy.argsort(index["frame"], kind="stable")]  # Index records in frame number order
+        self.frameids = self.index["frame"]  # Frame numbers given by the device
+        self.devtstamps = self.index["tstamp"]  # Timestamps given by the device (in ns)
+        self.tstamps = self.index["host"] if "host" in dtype.names else None  # Host timestamps (in ns), version 2
+
+    # Method for getting the number of frames
+    # return: number of frames in the recording
+    def __len__(self):
+        return len(self.index)
+
+    # Method for getting a frame by position, same as frame()
+    # input: ind, position of the frame
+    # return: read-only view of the frame
+    def __getitem__(self, ind):
+        return self.frame(ind)
+
+    # Method for getting the file name of a segment
+    # input: num, segment number
+    # return: path of the segment file
+    def segmentName(self, num):
+        return os.path.join(self.path, "segment_%05d.raw" % num)
+
+    # Method for getting the memory map of a segment
+    # input: num, segment number
+    # return: read-only uint8 memory map of the segment file
+    def segment(self, num):
+        if num not in self.segments:
+            self.segments[num] = numpy.memmap(self.segmentName(num), dtype=numpy.uint8, mode='r')
+        return self.segments[num]
+
+    # Method for getting a frame
+    # input: ind, position of the frame (negative counts from the end)
+    # input: rgb, demosaic raw Bayer frames (returns a new array instead of a view)
+    # return: read-only view of the frame in the segment file, or the demosaiced image
+    def frame(self, ind, rgb=False):
+        rec = self.index[ind]
+        offset = int(rec["offset"])
+        data = self.segment(int(rec["segment"]))[offset:offset + self.framesize]
+        imag = data.view(self.dtype).reshape(self.shape)
+        if rgb and self.pixform in bayerforms:
+            return demosaic(imag, self.pixform)
+        return imag
+
+    # Method for finding a frame by its frame number
+    # input: frameid, frame number given by the device
+    # return: position of the frame, None if it is not in the recording (e.g. lost)
+    def find(self, frameid):
+        ind = int(numpy.searchsorted(self.frameids, frameid))
+        if ind < len(self.frameids) and self.frameids[ind] == frameid:
+            return ind
+        return None
+
+    # Method for getting the frames inside a time range
+    # input: start, start of the range (in ns, inclusive)
+    # input: end, end of the range (in ns, exclusive)
+    # input: device, compare device timestamps instead of host timestamps
+    # return: range of frame positions
+    def timeRange(self, start, end, device=False):
+        tstamps = self.devtstamps if device or self.tstamps is None else self.tstamps
+        first = int(numpy.searchsorted(tstamps, start, side="left"))
+        last = int(numpy.searchsorted(tstamps, end, side="left"))
+        return range(first, max(first, last))
+
+    # Method for reading several frames into one array
+    # Frames evenly spaced in one segment (e.g. a strided range of frames stored in order) are returned as a
+    # read-only strided view without copying
+    # input: positions, frame positions (e.g. a range)
+    # input: rgb, demosaic raw Bayer frames
+    # return: array of shape (count,) + frame shape
+    def stack(self, positions, rgb=False):
+        recs = self.index[positions]
+        rgb = rgb and self.pixform in bayerforms
+        if not rgb and len(recs) > 0:
+            offsets = recs["offset"].astype(numpy.int64)
+            stride = int(offsets[1] - offsets[0]) if len(recs) > 1 else self.framesize
+            if (stride >= self.framesize and numpy.all(recs["segment"] == recs["segment"][0])
+                    and numpy.all(numpy.diff(offsets) == stride)):
+                data = self.segment(int(recs["segment"][0]))
+                data = data[offsets[0]:offsets[0] + stride * (len(recs) - 1) + self.framesize].view(self.dtype)
+                inner = tuple(self.dtype.itemsize * int(numpy.prod(self.shape[i + 1:])) for i in range(len(self.shape)))
+                return numpy.lib.stride_tricks.as_strided(data, (len(recs),) + self.shape, (stride,) + inner,
+                                                          writeable=False)
+        shape = self.shape + (3,) if rgb else self.shape
+        ret = numpy.empty((len(recs),) + shape, dtype=self.dtype)
+        for i, ind in enumerate(numpy.arange(len(self.index))[positions]):
+            if rgb:
+                demosaic(self.frame(ind), self.pixform, dst=ret[i])
+            else:
+                ret[i] = self.frame(ind)
+        return ret
+
+    # Method for iterating the recording in batches, e.g. for offline analysis
+    # input: size, number of frames per batch
+    # input: start, first position
+    # input: stop, position to stop at (None for the end)
+    # input: step, position step (e.g. 10 for every tenth frame)
+    # input: rgb, demosaic raw Bayer frames
+    # return: generator of (frames, records) tuples, frames as returned by stack() and the index records of the batch
+    def batches(self, size, start=0, stop=None, step=1, rgb=False):
+        if size <= 0 or step <= 0:
+            raise ValueError("Batch size and step must be positive")
+        positions = range(len(self.index))[start:stop:step]
+        for first in range(0, len(positions), size):
+            batch = positions[first:first + size]
+            yield self.stack(batch, rgb), self.index[batch.start:batch.stop:batch.step]
+
+    # Method for closing the memory maps, views returned earlier keep their segment open until deleted
+    def close(self):
+        self.segments = {}
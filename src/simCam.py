@@ -0,0 +1,520 @@
+import collections
+import math
+import random
+import time
+import genicam.gentl
+import genicam.genapi
+import numpy
+from bandwidthScheduler import packetheader, wireoverhead
+
+# Static Defines
+simpcktsizes = ["Size1440", "Size2960", "Size4480", "Size6000", "Size7520", "Size9040", "Size10560"]
+# Nodes that can not be written while the device is acquiring
+streamnodes = ["Width", "Height", "OffsetX", "OffsetY", "PixelFormat", "PacketSize", "GevSCPSPacketSize"]
+
+
+# Class for a simulated GenApi node
+class SimNode:
+    # Initialization method
+    # input: value, initial value of the node (a function for computed read-only nodes)
+    # input: min, minimum value (a function for limits depending on other nodes)
+    # input: max, maximum value (a function for limits depending on other nodes)
+    # input: symbolics, list of allowed values for enumeration nodes
+    # input: command, function run by execute() for command nodes
+    # input: device, SimAcquirer the node belongs to
+    # input: name, name of the node
+    def __init__(self, value=None, min=None, max=None, symbolics=None, command=None, device=None, name=""):
+        self._value = value
+        self._min = min
+        self._max = max
+        self.symbolics = symbolics
+        self.command = command
+        self.device = device
+        self.name = name
+
+    @property
+    def value(self):
+        if callable(self._value):
+            return self._value()
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        if callable(self._value) or self.command is not None:
+            raise genicam.genapi.AccessException("Node %s is not writable" % self.name)
+        if self.device.acquiring and self.name in streamnodes:
+            raise genicam.genapi.AccessException("Node %s is locked during acquisition" % self.name)
+        if self.symbolics is not None:
+            if val not in self.symbolics:
+                raise genicam.genapi.InvalidArgumentException("%s is not a valid value for %s" % (val, self.name))
+        elif self._min is not None and not self.min <= val <= self.max:
+            raise genicam.genapi.OutOfRangeException("%s is out of range for %s" % (val, self.name))
+        if isinstance(self._value, int) and not isinstance(self._value, bool):
+            val = int(val)
+        self._value = val
+        self.device.nodeChanged(self.name)
+
+    @property
+    def min(self):
+        if self._min is None:
+            raise genicam.genapi.LogicalErrorException("Node %s has no minimum" % self.name)
+        return self._min() if callable(self._min) else self._min
+
+    @property
+    def max(self):
+        if self._max is None:
+            raise genicam.genapi.LogicalErrorException("Node %s has no maximum" % self.name)
+        return self._max() if callable(self._max) else self._max
+
+    # Method for running a command node
+    def execute(self):
+        if self.command is None:
+            raise genicam.genapi.LogicalErrorException("Node %s is not a command" % self.name)
+        self.command()
+
+
+# Class for a simulated node map, missing nodes raise LogicalErrorException like GenApi
+class SimNodeMap:
+    # Initialization method
+    def __init__(self):
+        self.nodes = {}
+
+    # Method for getting a node by name
+    # input: name, name of the node
+    # return: SimNode object
+    def get_node(self, name):
+        if name not in self.nodes:
+            raise genicam.genapi.LogicalErrorException("Node %s does not exist" % name)
+        return self.nodes[name]
+
+    def __getattr__(self, name):
+        if name == "nodes":
+            raise AttributeError(name)
+        return self.get_node(name)
+
+
+# Class for the remote device of a simulated acquirer
+class SimRemoteDevice:
+    def __init__(self):
+        self.node_map = SimNodeMap()
+
+
+# Class for the component (image) of a simulated buffer
+class SimComponent:
+    def __init__(self, data, width, height):
+        self.data = data  # Pixel values as a 1D array, like harvesters
+        self.width = width
+        self.height = height
+
+
+# Class for the payload of a simulated buffer
+class SimPayload:
+    def __init__(self, components):
+        self.components = components
+
+
+# Class for the GenTL buffer wrapped by a simulated buffer, harvesters gives the frame id only through it
+class SimGenTLBuffer:
+    # Initialization method
+    # input: frameid, frame number
+    # input: tick, device timestamp (in ticks)
+    # input: tickfreq, tick frequency of the device (Hz)
+    # input: nsinfo, does the producer give the timestamp in ns? (GenTL BUFFER_INFO_TIMESTAMP_NS)
+    def __init__(self, frameid, tick, tickfreq, nsinfo):
+        self.frame_id = frameid
+        self.timestamp = tick
+        self.tickfreq = tickfreq
+        self.nsinfo = nsinfo
+
+    @property
+    def timestamp_ns(self):
+        if not self.nsinfo:
+            raise genicam.gentl.NotImplementedException("Timestamp in ns is not supported by the producer")
+        return self.timestamp * 1000000000 // self.tickfreq
+
+
+# Class for a simulated buffer returned by fetch_buffer
+class SimBuffer:
+    def __init__(self, acquirer, data, width, height, frameid, tstamp):
+        self.acquirer = acquirer
+        self.payload = SimPayload([SimComponent(data, width, height)])
+        cfg = acquirer.info.config
+        self.module = SimGenTLBuffer(frameid, tstamp, cfg["tickfreq"], cfg["timestampns"])
+
+    # Timestamp in the unit of the producer like harvesters, ns when supported and ticks otherwise
+    @property
+    def timestamp(self):
+        try:
+            return self.module.timestamp_ns
+        except genicam.gentl.GenericException:
+            return self.module.timestamp
+
+    # Method for returning the buffer to the acquirer
+    def queue(self):
+        self.acquirer.outstanding -= 1
+
+
+# Class for the statistics of the simulated data stream, matches the GenTL DataStream counters
+class SimDataStream:
+    def __init__(self, acquirer):
+        self.acquirer = acquirer
+
+    @property
+    def num_announced(self):
+        return self.acquirer.num_buffers
+
+    @property
+    def num_awaiting_delivery(self):
+        return len(self.acquirer.filled)
+
+    @property
+    def num_delivered(self):
+        return self.acquirer.delivered
+
+    @property
+    def num_underrun(self):
+        return self.acquirer.underrun
+
+
+# Class for a simulated ImageAcquirer, generates Mono8 and BayerRG8 frames at the configured rate
+class SimAcquirer:
+    # Class for the event names accepted by add_callback
+    class Events:
+        INCOMPLETE_BUFFER = "INCOMPLETE_BUFFER"
+
+    # Initialization method
+    # input: info, SimDeviceInfo describing the device
+    def __init__(self, info):
+        self.info = info
+        self.remote_device = SimRemoteDevice()
+        self.num_buffers = 6
+        self.data_streams = [SimDataStream(self)]
+        self.callbacks = {}  # Event callbacks, event name to callback object
+        self.acquiring = False
+        self.filled = collections.deque()  # Delivered frames waiting to be fetched
+        self.triggers = collections.deque()  # Times of pending software triggers
+        self.outstanding = 0  # Buffers fetched and not yet queued back
+        self.patterns = []  # Pregenerated frames for the current format
+        self.frameid = 0  # Frame number of the last exposed frame
+        self.nextdue = 0  # Time the next free running frame arrives (time.perf_counter)
+        self.delivered = 0  # Frames delivered to the host
+        self.underrun = 0  # Frames lost because every buffer was in use
+        self.dropped = 0  # Frames lost in transmission
+        self.incomplete = 0  # Frames discarded as incomplete
+        self.time0 = time.perf_counter()  # Time the device clock started
+        self.userset = {}  # Saved node values, restored by the user set load commands
+        self.createNodes()
+
+    # Method for creating the node map of the device
+    def createNodes(self):
+        cfg = self.info.config
+        nodes = self.remote_device.node_map.nodes
+
+        def add(name, value=None, min=None, max=None, symbolics=None, command=None):
+            nodes[name] = SimNode(value, min, max, symbolics, command, self, name)
+
+        sw, sh = cfg["width"], cfg["height"]
+        add("DeviceVendorName", self.info.vendor)
+        add("DeviceModelName", self.info.model)
+        add("DeviceFirmwareVersion", self.info.version)
+        add("DeviceSerialNumber", self.info.serial_number)
+        add("Width", sw, 16, lambda: sw - nodes["OffsetX"].value)
+        add("Height", sh, 16, lambda: sh - nodes["OffsetY"].value)
+        add("OffsetX", 0, 0, lambda: sw - nodes["Width"].value)
+        add("OffsetY", 0, 0, lambda: sh - nodes["Height"].value)
+        add("PixelFormat", cfg["pixelformat"], symbolics=["Mono8", "BayerRG8"])
+        add("GevTimestampTickFrequency", cfg["tickfreq"])
+        if cfg["vendor"] == "sony":
+            add("Shutter", 10000, 10, 2000000)
+            add("Gain_L", 0, 0, 502)
+            add("FrameRate", cfg["fps"], 1.0, self.maxFPS)
+            add("PacketSize", simpcktsizes[0], symbolics=simpcktsizes)
+            add("InterPacketDelay", 0, 0, 1000)
+            add("Trigger", "OFF", symbolics=["OFF", "ON"])
+            add("AutoGain", "OFF", symbolics=["OFF", "ON"])
+            add("Binning", "OFF", symbolics=["OFF", "ON"])
+            add("AutoFrameRate", "OFF", symbolics=["OFF", "ON"])
+            add("MemoryChannel", 1, 0, 3)
+            add("SaveParameters", "CameraParameters", symbolics=["CameraParameters", "CommonParameters"])
+            add("LoadParameters", "CameraParameters", symbolics=["CameraParameters", "CommonParameters"])
+        else:
+            add("ExposureTimeAbs", 10000.0, 10.0, 2000000.0)
+            add("GainRaw", 0, 0, 240)
+            add("AcquisitionFrameRateEnable", False)
+            add("AcquisitionFrameRateAbs", float(cfg["fps"]), 1.0, 1000000.0)
+            add("ResultingFrameRateAbs", self.getFPS)
+            add("GevSCPSPacketSize", 1440, 576, 10560)
+            add("GevSCPD", 0, 0, 65535)
+            add("GevSCFTD", 0, 0, 65535)
+            add("TriggerMode", "Off", symbolics=["Off", "On"])
+            add("GainAuto", "Off", symbolics=["Off", "Continuous"])
+            add("ExposureAuto", "Off", symbolics=["Off", "Continuous"])
+            add("BalanceWhiteAuto", "Off", symbolics=["Off", "Continuous"])
+            add("UserSetSelector", "UserSet1", symbolics=["Default", "UserSet1"])
+            add("UserSetSave", command=self.saveUserSet)
+            add("UserSetLoad", command=self.loadUserSet)
+        add("TriggerSoftware", command=self.softwareTrigger)
+
+    # Method called after a node has been written
+    # input: name, name of the written node
+    def nodeChanged(self, name):
+        if name == "SaveParameters":
+            self.saveUserSet()
+        elif name == "LoadParameters":
+            self.loadUserSet()
+
+    # Method for storing the writable node values as the user set
+    def saveUserSet(self):
+        nodes = self.remote_device.node_map.nodes
+        self.userset = {}
+        for name in nodes:
+            node = nodes[name]
+            if not callable(node._value) and node.command is None and name not in ["SaveParameters", "LoadParameters"]:
+                self.userset[name] = node._value
+
+    # Method for restoring the node values of the user set
+    def loadUserSet(self):
+        nodes = self.remote_device.node_map.nodes
+        for name in self.userset:
+            nodes[name]._value = self.userset[name]
+
+    # Method for getting a node value with the first existing name
+    # input: names, alternative node names
+    # input: default, value returned if none of the nodes exist
+    # return: node value
+    def nodeValue(self, names, default=None):
+        nodes = self.remote_device.node_map.nodes
+        for name in names:
+            if name in nodes:
+                return nodes[name].value
+        return default
+
+    # Method for getting the maximum frame rate allowed by the sensor readout and exposure time
+    # return: maximum frame rate
+    def maxFPS(self):
+        cfg = self.info.config
+        height = self.nodeValue(["Height"])
+        exposure = self.nodeValue(["Shutter", "ExposureTimeAbs"])
+        return min(cfg["maxfps"] * cfg["height"] / height, 1000000.0 / exposure)
+
+    # Method for getting the effective frame rate
+    # return: frame rate
+    def getFPS(self):
+        if self.nodeValue(["AcquisitionFrameRateEnable"], True):
+            return min(self.nodeValue(["FrameRate", "AcquisitionFrameRateAbs"]), self.maxFPS())
+        return self.maxFPS()
+
+    # Method for getting the stream packet size set on the device
+    # return: packet size in bytes
+    def packetSize(self):
+        val = self.nodeValue(["PacketSize", "GevSCPSPacketSize"])
+        return int(val[4:]) if isinstance(val, str) else int(val)
+
+    # Method for modelling the transmission of a frame over the link
+    # Packets larger than the path MTU never arrive, and packets sent faster than the host can take them (hostpps)
+    # are lost, which leaves the frame incomplete. The inter-packet delay (in ticks) spaces the packets out at the
+    # cost of a longer transmission time, which limits the frame rate together with the link bandwidth.
+    # return: transmission time of a frame (in s)
+    # return: probability of a frame arriving incomplete
+    def transport(self):
+        cfg = self.info.config
+        size = self.packetSize()
+        packets = math.ceil(self.nodeValue(["Width"]) * self.nodeValue(["Height"]) / (size - packetheader))
+        delay = self.nodeValue(["InterPacketDelay", "GevSCPD"], 0) / cfg["tickfreq"]
+        txtime = packets * ((size + wireoverhead) / cfg["bandwidth"] + delay)
+        if cfg["mtu"] and size > cfg["mtu"]:
+            return txtime, 1.0
+        if cfg["hostpps"] and packets / txtime > cfg["hostpps"]:  # The receive buffer overflows on every frame
+            return txtime, 1.0
+        return txtime, 0.0
+
+    # Method for checking whether triggered acquisition is enabled
+    # return: boolean, is triggering enabled?
+    def isTriggered(self):
+        return self.nodeValue(["Trigger", "TriggerMode"]).upper() == "ON"
+
+    # Method for converting host time to device ticks, the device clock drifts by the configured ppm
+    # input: t, host time (time.perf_counter)
+    # return: device timestamp in ticks
+    def deviceTime(self, t):
+        cfg = self.info.config
+        return int((t - self.time0) * cfg["tickfreq"] * (1 + cfg["driftppm"] * 1e-6))
+
+    # Method for issuing a software trigger
+    def softwareTrigger(self):
+        if self.acquiring and self.isTriggered():
+            exposure = self.nodeValue(["Shutter", "ExposureTimeAbs"]) / 1000000.0
+            self.triggers.append(time.perf_counter() + exposure)
+
+    # Method for generating the frames cycled through during acquisition
+    def createPatterns(self):
+        width = self.nodeValue(["Width"])
+        height = self.nodeValue(["Height"])
+        count = self.info.config["patterns"]
+        y = numpy.arange(height, dtype=numpy.int32).reshape(-1, 1)
+        x = numpy.arange(width, dtype=numpy.int32).reshape(1, -1)
+        self.patterns = []
+        for k in range(count):
+            shift = k * 256 // count
+            r = ((x + shift) * 255 // max(1, width - 1)).astype(numpy.uint8) + numpy.zeros_like(y, dtype=numpy.uint8)
+            g = ((y + shift) * 255 // max(1, height - 1)).astype(numpy.uint8) + numpy.zeros_like(x, dtype=numpy.uint8)
+            b = ((x + y + 2 * shift) % 256).astype(numpy.uint8)
+            if self.nodeValue(["PixelFormat"]) == "BayerRG8":
+                frame = numpy.empty((height, width), dtype=numpy.uint8)
+                frame[0::2, 0::2] = r[0::2, 0::2]
+                frame[0::2, 1::2] = g[0::2, 1::2]
+                frame[1::2, 0::2] = g[1::2, 0::2]
+                frame[1::2, 1::2] = b[1::2, 1::2]
+            else:
+                frame = ((r.astype(numpy.int32) + g + b) // 3).astype(numpy.uint8)
+            self.patterns.append(frame.reshape(-1))
+
+    # Method for registering an event callback
+    # input: event, event name from SimAcquirer.Events
+    # input: callback, object whose emit() is called when the event occurs (replaces the previous one like harvesters)
+    def add_callback(self, event, callback):
+        self.callbacks[event] = callback
+
+    def start_acquisition(self):
+        self.createPatterns()
+        self.filled.clear()
+        self.triggers.clear()
+        self.outstanding = 0
+        self.acquiring = True
+        self.nextdue = time.perf_counter() + 1.0 / self.getFPS()
+
+    def stop_acquisition(self):
+        self.acquiring = False
+        self.filled.clear()
+        self.triggers.clear()
+
+    def is_acquiring(self):
+        return self.acquiring
+
+    def destroy(self):
+        self.acquiring = False
+        self.info.inuse = False
+
+    # Method for delivering a frame that has arrived at the host
+    # input: t, arrival time (time.perf_counter)
+    def arrive(self, t):
+        cfg = self.info.config
+        self.frameid += 1
+        if random.random() < cfg["droprate"]:
+            self.dropped += 1
+        elif random.random() < max(cfg["incompleterate"], self.transport()[1]):
+            self.incomplete += 1
+            if self.Events.INCOMPLETE_BUFFER in self.callbacks:
+                self.callbacks[self.Events.INCOMPLETE_BUFFER].emit(context=self)
+        elif len(self.filled) + self.outstanding >= self.num_buffers:
+            self.underrun += 1
+        else:
+            self.filled.append((self.frameid, self.deviceTime(t)))
+
+    # Method for moving the frames that have arrived by the given time to the filled buffers
+    # input: now, current time (time.perf_counter)
+    def advance(self, now):
+        if self.isTriggered():
+            while len(self.triggers) > 0 and self.triggers[0] <= now:
+                self.arrive(self.triggers.popleft())
+            self.nextdue = now + 1.0 / self.getFPS()
+        else:
+            period = max(1.0 / self.getFPS(), self.transport()[0])  # The link limits the delivered frame rate
+            jitter = self.info.config["jitter"]
+            while self.nextdue <= now:
+                self.arrive(self.nextdue)
+                self.nextdue += max(0.1 * period, period * (1 + random.gauss(0, jitter)))
+
+    # Method for fetching the next filled buffer
+    # input: timeout, maximum time to wait in seconds (0 waits forever)
+    # return: SimBuffer object, must be returned with queue()
+    def fetch_buffer(self, *, timeout=0, is_raw=False, cycle_s=None):
+        start = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            self.advance(now)
+            if len(self.filled) > 0:
+                frameid, tstamp = self.filled.popleft()
+                self.outstanding += 1
+                self.delivered += 1
+                data = self.patterns[frameid % len(self.patterns)]
+                width = self.nodeValue(["Width"])
+                height = self.nodeValue(["Height"])
+                return SimBuffer(self, data, width, height, frameid, tstamp)
+            if not self.acquiring:
+                raise genicam.gentl.TimeoutException("Acquisition is not running")
+            if self.isTriggered():
+                due = self.triggers[0] if len(self.triggers) > 0 else now + 0.01
+            else:
+                due = self.nextdue
+            if timeout > 0 and due > start + timeout:
+                time.sleep(max(0.0, start + timeout - now))
+                raise genicam.gentl.TimeoutException("Timed out waiting for a buffer")
+            time.sleep(max(0.0, due - now))
+
+
+# Class for describing a simulated device in the device list
+class SimDeviceInfo:
+    # Initialization method
+    # input: vendor, vendor profile deciding the node names, "sony" or "generic"
+    # input: serial, serial number of the device
+    # input: config, settings overriding the defaults (see defaults below)
+    def __init__(self, vendor="sony", serial="0001", **config):
+        self.config = {
+            "vendor": vendor,
+            "width": 2448,  # Sensor width (pixels)
+            "height": 2048,  # Sensor height (pixels)
+            "pixelformat": "Mono8",  # Initial pixel format
+            "fps": 15.0,  # Initial frame rate
+            "maxfps": 15.0,  # Maximum frame rate at full sensor height
+            "jitter": 0.0,  # Standard deviation of the frame period (fraction of the period)
+            "droprate": 0.0,  # Probability of a frame being lost in transmission
+            "incompleterate": 0.0,  # Probability of a frame being delivered incomplete
+            "bandwidth": 125000000,  # Link bandwidth (bytes per second)
+            "mtu": 0,  # Largest packet size passing the network path (0 for no limit)
+            "hostpps": 0,  # Packets per second the host receives without losing any (0 for no limit)
+            "tickfreq": 125000000,  # Device timestamp tick frequency (Hz), GigE devices commonly count at 125 MHz
+            "timestampns": True,  # Does the producer give the buffer timestamps in ns as well as in ticks?
+            "driftppm": 20.0,  # Device clock drift relative to the host clock (ppm)
+            "patterns": 8,  # Number of pregenerated frames
+        }
+        self.config.update(config)
+        self.vendor = "Sony" if vendor == "sony" else "Generic"
+        self.model = "SIM-XCG-5005E" if vendor == "sony" else "SIM-GIGE"
+        self.serial_number = serial
+        self.version = "1.0"
+        self.id_ = "SIM-%s-%s" % (vendor, serial)
+        self.user_defined_name = ""
+        self.tl_type = "GEV"
+        self.inuse = False
+
+
+# Class for a simulated Harvester, stands in for harvesters.core.Harvester
+class SimHarvester:
+    # Initialization method
+    # input: devices, list of SimDeviceInfo objects (None for one device of each vendor profile)
+    def __init__(self, devices=None):
+        if devices is None:
+            devices = [SimDeviceInfo("sony", "0001"), SimDeviceInfo("generic", "0002")]
+        self.devices = devices
+        self.device_info_list = []
+        self.files = []
+
+    def add_file(self, file_path):
+        self.files.append(file_path)
+
+    def update(self):
+        self.device_info_list = list(self.devices)
+
+    def reset(self):
+        self.device_info_list = []
+
+    # Method for opening a device
+    # input: list_index, index of the device in device_info_list
+    # input: file_path, description file used instead of the one read from the device, ignored by the simulation
+    def create_image_acquirer(self, list_index=None, file_path=None):
+        info = self.device_info_list[list_index]
+        if info.inuse:
+            raise genicam.gentl.AccessDeniedException("Device %s is already open" % info.id_)
+        info.inuse = True
+        return SimAcquirer(info)
@@ -0,0 +1,170 @@
+import threading
+import time
+
+
+# Class for a latency histogram with fixed power of two buckets (in microseconds)
+class Histogram:
+    # Initialization method
+    # input: buckets, number of buckets, bucket i counts values below 2^i us (the last one counts the rest)
+    def __init__(self, buckets=24):
+        self.lock = threading.Lock()
+        self.counts = [0] * buckets  # Number of values per bucket
+        self.count = 0  # Number of recorded values
+        self.total = 0.0  # Sum of the recorded values (in seconds)
+        self.max = 0.0  # Largest recorded value (in seconds)
+
+    # Method for recording a value
+    # input: value, duration in seconds
+    def record(self, value):
+        ind = min(int(value * 1000000).bit_length(), len(self.counts) - 1)
+        with self.lock:
+            self.counts[ind] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    # Method for getting an upper bound of a percentile
+    # input: pct, percentile (0-100)
+    # return: upper bound of the bucket holding the percentile (in seconds)
+    def percentile(self, pct):
+        with self.lock:
+            if self.count == 0:
+                return 0.0
+            target = self.count * pct / 100
+            cumulative = 0
+            for i in range(len(self.counts)):
+                cumulative += self.counts[i]
+                if cumulative >= target:
+                    return min((2 ** i) / 1000000, self.max)
+            return self.max
+
+    # Method for getting the mean value
+    # return: mean of the recorded values (in seconds)
+    def mean(self):
+        with self.lock:
+            return self.total / self.count if self.count > 0 else 0.0
+
+
+# Class for a sampled value such as a queue depth
+class Gauge:
+    # Initialization method
+    def __init__(self):
+        self.value = 0  # Last sampled value
+        self.max = 0  # Largest sampled value
+
+    # Method for sampling a value
+    # input: value, current value
+    def set(self, value):
+        self.value = value
+        if value > self.max:
+            self.max = value
+
+
+# Class for the hot path instrumentation, counters, latency histograms and gauges by name
+class Telemetry:
+    # Initialization method
+    def __init__(self):
+        self.lock = threading.Lock()  # Lock guarding the counters
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    # Method for clearing every metric, called at the start of an acquisition session
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.gauges = {}
+
+    # Method for increasing a counter
+    # input: name, name of the counter
+    # input: num, amount to add
+    def count(self, name, num=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + num
+
+    # Method for recording a duration to a histogram
+    # input: name, name of the histogram
+    # input: value, duration in seconds
+    def observe(self, name, value):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms.setdefault(name, Histogram())
+        hist.record(value)
+
+    # Method for sampling a gauge
+    # input: name, name of the gauge
+    # input: value, current value
+    def gauge(self, name, value):
+        gauge = self.gauges.get(name)
+        if gauge is None:
+            gauge = self.gauges.setdefault(name, Gauge())
+        gauge.set(value)
+
+    # Method for getting a counter value
+    # input: name, name of the counter
+    # return: counter value (0 if never counted)
+    def get(self, name):
+        return self.counters.get(name, 0)
+
+    # Method for getting a histogram
+    # input: name, name of the histogram
+    # return: Histogram object (empty if never recorded)
+    def histogram(self, name):
+        return self.histograms.get(name, Histogram())
+
+    # Method for getting all metrics as plain values
+    # return: dictionary with counters, histogram summaries (in ms) and gauges
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+        hists = {}
+        for name, hist in list(self.histograms.items()):
+            hists[name] = {"count": hist.count, "mean_ms": hist.mean() * 1000, "p50_ms": hist.percentile(50) * 1000,
+                           "p99_ms": hist.percentile(99) * 1000, "max_ms": hist.max * 1000}
+        gauges = {}
+        for name, gauge in list(self.gauges.items()):
+            gauges[name] = {"value": gauge.value, "max": gauge.max}
+        return {"counters": counters, "histograms": hists, "gauges": gauges}
+
+
+# Class for counting incomplete buffers reported by the image acquirer through its callback interface
+class IncompleteCounter:
+    # Initialization method
+    # input: stats, Telemetry object to count to
+    def __init__(self, stats):
+        self.stats = stats
+
+    # Method called by the image acquirer when it discards an incomplete buffer
+    # input: context, image acquirer emitting the event
+    def emit(self, context=None):
+        self.stats.count("incomplete")
+
+
+# Class for timing the phases of the program start, e.g. imports, device discovery and opening, first frame
+class PhaseTimer:
+    # Initialization method, starts timing the first phase
+    def __init__(self):
+        self.start = time.perf_counter()  # Time the timer was created
+        self.last = self.start  # Time the previous phase ended
+        self.phases = []  # List of (phase name, duration in seconds)
+
+    # Method for ending the current phase
+    # input: name, name of the phase that ended
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    # Method for checking if a phase has ended
+    # input: name, name of the phase
+    # return: boolean, has the phase been marked?
+    def marked(self, name):
+        return any(phase == name for phase, duration in self.phases)
+
+    # Method for describing the phases
+    # return: string of the phase durations and the total
+    def report(self):
+        parts = ["{0} {1:.1f} ms".format(name, duration * 1000) for name, duration in self.phases]
+        return ", ".join(parts + ["total {0:.1f} ms".format((self.last - self.start) * 1000)])
@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Modules are in src
+
+from camHandler import CamHandler  # noqa: E402
+from simCam import SimHarvester, SimDeviceInfo  # noqa: E402
+
+
+# Fixture for a camHandler with an opened simulated device, run in a temporary working directory (logs and cfgs)
+# Small frames at a high rate keep the sessions short, the link model is left unlimited
+@pytest.fixture
+def handler(tmp_path, monkeypatch, request):
+    monkeypatch.chdir(tmp_path)
+    config = {"width": 64, "height": 48, "fps": 200.0, "maxfps": 200.0, "bandwidth": 1e12, "patterns": 2}
+    config.update(getattr(request, "param", {}))
+    camHand = CamHandler(harvester=SimHarvester([SimDeviceInfo("generic", "0001", **config)]))
+    camHand.updateDevices()
+    camHand.changeCam(0)
+    os.mkdir("out")
+    camHand.changeSaveDir(os.path.join(str(tmp_path), "out"))
+    camHand.saving = True
+    yield camHand
+    camHand.changeCam(-1)
+    camHand.closeWarm()
+    camHand.closeerrlog()
@@ -0,0 +1,47 @@
+import pytest
+from bandwidthScheduler import BandwidthScheduler, wireoverhead
+from camHandler import CamHandler
+from simCam import SimHarvester, SimDeviceInfo
+
+
+@pytest.fixture
+def handlers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = {"width": 640, "height": 480, "fps": 60.0, "maxfps": 200.0}
+    harvester = SimHarvester([SimDeviceInfo("generic", "0001", **config), SimDeviceInfo("sony", "0002", **config)])
+    harvester.update()
+    ret = []
+    for ind in range(2):
+        handler = CamHandler(harvester=harvester)
+        handler.changeCam(ind)
+        ret.append(handler)
+    yield ret
+    for handler in ret:
+        handler.changeCam(-1)
+        handler.closeerrlog()
+
+
+def test_plan_shares_link(handlers):
+    scheduler = BandwidthScheduler(handlers, 125000000)
+    plan = scheduler.plan()
+    budget = 125000000 * scheduler.usable
+    assert sum(entry["share"] for entry in plan) == pytest.approx(budget)
+    for handler, entry in zip(handlers, plan):
+        assert entry["share"] >= entry["bandwidth"]
+        assert entry["txtime"] <= 1.0 / entry["fps"]
+        assert 0 <= entry["PacketInterval"] <= handler.getProperty("MaxPacketInterval")
+    assert plan[0]["FrameDelay"] == 0
+    freq = handlers[1].getProperty("TickFrequency")
+    assert plan[1]["FrameDelay"] == round((plan[0]["packetsize"] + wireoverhead) / 125000000 * freq)
+
+
+def test_apply_and_refuse(handlers):
+    scheduler = BandwidthScheduler(handlers, 125000000)
+    plan = scheduler.apply()
+    assert handlers[1].getProperty("PacketInterval") == plan[1]["PacketInterval"]
+    for handler in handlers:
+        handler.setProperty("ExposureTime", 2000)
+        handler.setProperty("FPS", 200.0)  # 2 x 61 MB/s
+    with pytest.raises(ValueError):
+        scheduler.apply()
+    assert handlers[1].getProperty("PacketInterval") == plan[1]["PacketInterval"]  # Nothing changed
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.mark.parametrize("pixform, bytesperpixel", [("Mono8", 1), ("Mono16", 2), ("RGB8", 3)])
+def test_budget_counts_pixel_bytes(handler, monkeypatch, pixform, bytesperpixel):
+    getProperty = handler.getProperty
+    monkeypatch.setattr(handler, "getProperty", lambda prop: pixform if prop == "PixelFormat" else getProperty(prop))
+    tuner = handler.tuner
+    tuner.budget = 1  # MB
+    tuner.maxbuf = 10000
+    tuner.begin()
+    tuner.samples = 10
+    tuner.awaiting = 5000  # Needs more buffers than the budget allows
+    assert tuner.tune(100.0) == 1024 * 1024 // (64 * 48 * bytesperpixel)
@@ -0,0 +1,27 @@
+import numpy
+import pytest
+from burst import BurstCapture
+from sequenceReader import SequenceReader, findRecordings
+
+
+def test_burst_timing_and_flush(handler):
+    handler.recmode = "raw"
+    burst = BurstCapture(handler)
+    report = burst.capture(40)
+    period = 1000.0 / handler.getProperty("FPS")
+    assert report["frames"] == 40 and report["lost"] == 0
+    assert report["period_ms"] == pytest.approx(period, rel=0.05)  # Mapped from the device timestamps (in ns)
+    assert 0 < report["busy_max_ms"] < period
+    burst.flush()
+    burst.wait()
+    assert burst.flushed == 40
+    reader = SequenceReader(findRecordings(handler.savepth)[0])
+    assert len(reader) == 40
+    assert numpy.array_equal(reader.frame(5), burst.data[5])
+    assert numpy.median(numpy.diff(reader.tstamps)) == pytest.approx(period * 1e6, rel=0.05)
+    reader.close()
+
+
+def test_burst_requires_length(handler):
+    with pytest.raises(ValueError):
+        BurstCapture(handler).capture()
@@ -0,0 +1,36 @@
+import numpy
+import pytest
+from clockSync import ClockSync
+from engine import AcquisitionEngine
+
+
+# Function for acquiring frames and collecting their timestamps
+# input: camHand, camHandler object with an opened device
+# input: frames, number of frames to acquire
+# return: arrays of the device timestamps and the mapped host timestamps (in ns)
+def collect(camHand, frames):
+    stamps = []
+    engine = AcquisitionEngine(camHand)
+    engine.addConsumer(lambda frame, tstamp: stamps.append((frame.devtstamp, tstamp)))
+    engine.start(frames, 10.0)
+    engine.wait()
+    stamps = numpy.array(stamps, dtype=numpy.int64)
+    return stamps[:, 0], stamps[:, 1]
+
+
+def test_fit_corrects_drift():
+    clock = ClockSync(interval=1.0)
+    host0 = 1600000000 * 10 ** 9
+    for sec in range(30):  # Device clock 50 ppm fast, sampled once a second
+        clock.update(int(sec * 1e9 * 1.00005), host0 + sec * 10 ** 9)
+    assert clock.slope == pytest.approx(1 / 1.00005, rel=1e-7)
+    assert abs(clock.toHost(int(40 * 1e9 * 1.00005)) - (host0 + 40 * 10 ** 9)) < 1000
+
+
+@pytest.mark.parametrize("handler", [{"timestampns": True}, {"timestampns": False}], indirect=True)
+def test_timestamps_in_ns(handler):
+    assert handler.tickfreq == 125000000  # Not 1 GHz, ticks used as ns would be off by 8x
+    devtstamps, tstamps = collect(handler, 30)
+    period = 1e9 / handler.getProperty("FPS")
+    assert numpy.median(numpy.diff(devtstamps)) == pytest.approx(period, rel=0.05)
+    assert numpy.median(numpy.diff(tstamps)) == pytest.approx(period, rel=0.05)
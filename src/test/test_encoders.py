@@ -0,0 +1,22 @@
+import os
+import cv2 as cv
+import numpy
+from engine import AcquisitionEngine
+
+
+def test_encoder_processes(handler):
+    handler.recmode = "image"
+    handler.imgformat = "png"
+    handler.encprocs = 2
+    engine = AcquisitionEngine(handler)
+    engine.addConsumer(handler.storeFrame)
+    handler.startWriter()
+    engine.start(12, 10.0)
+    engine.wait()
+    handler.stopWriter()
+    names = sorted(name for name in os.listdir(handler.savepth) if name.endswith(".png"))
+    assert len(names) == handler.writer.written == 12
+    imag = cv.imread(os.path.join(handler.savepth, names[0]), cv.IMREAD_UNCHANGED)
+    assert imag.shape == (48, 64) and imag.dtype == numpy.uint8
+    assert handler.encpool.executor is None and handler.encpool.slots == []  # Stopped and shared memory unlinked
+    assert handler.pool.inUse() == 0
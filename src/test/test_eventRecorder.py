@@ -0,0 +1,30 @@
+import numpy
+from engine import AcquisitionEngine
+from sequenceReader import SequenceReader, findRecordings
+
+
+def test_event_window(handler):
+    handler.recmode = "raw"
+    handler.eventmode = True
+    handler.events.pre = 0.05  # 10 frames at 200 FPS
+    handler.events.post = 0.05
+    handler.events.condition = lambda frame: frame.frameid == 40
+    engine = AcquisitionEngine(handler)
+    engine.addConsumer(handler.storeFrame)
+    handler.startWriter()
+    engine.start(80, 10.0)
+    engine.wait()
+    handler.stopWriter()
+    assert handler.events.events == 1
+    assert handler.pool.inUse() == 0
+    assert handler.events.pool.inUse() == 0
+    reader = SequenceReader(findRecordings(handler.savepth)[0])
+    frameids = [int(frameid) for frameid in reader.frameids]
+    assert 40 in frameids
+    assert frameids == list(range(frameids[0], frameids[-1] + 1))  # One contiguous window
+    tstamps = reader.tstamps.astype(numpy.int64)  # Host timestamps (in ns), the windows are in host time
+    event = tstamps[frameids.index(40)]
+    assert frameids[0] < 40 < frameids[-1]
+    assert event - tstamps[0] <= 50000000 and tstamps[-1] - event <= 50000000
+    assert handler.events.dumped == len(reader)
+    reader.close()
@@ -0,0 +1,57 @@
+from framePool import FramePool
+from frameSync import FrameSync
+
+
+# Function for leasing a frame with the given timestamps
+# input: pool, FramePool object
+# input: tstamp, host timestamp (in ns)
+# input: devtstamp, device timestamp (in ns)
+# return: Frame object
+def makeFrame(pool, tstamp, devtstamp=0):
+    frame = pool.lease()
+    frame.tstamp = tstamp
+    frame.devtstamp = devtstamp
+    return frame
+
+
+# Function for pushing a frame to the synchronizer like the acquisition engine, which releases it afterwards
+def push(sync, index, frame):
+    sync.push(index, frame, frame.tstamp)
+    frame.release()
+
+
+def test_matches_within_tolerance():
+    pool = FramePool()
+    pool.allocate((2, 2), 16)
+    sets = []
+    sync = FrameSync(2, 1000000, lambda frames, tstamps: sets.append(tstamps))
+    for k in range(5):  # Device 1 lags by 0.4 ms, its third frame is lost
+        push(sync, 0, makeFrame(pool, k * 10000000))
+        if k != 2:
+            push(sync, 1, makeFrame(pool, k * 10000000 + 400000))
+    assert sets == [[k * 10000000, k * 10000000 + 400000] for k in [0, 1, 3, 4]]
+    assert sync.matched == 4
+    assert sync.unmatched == [1, 0]
+    assert pool.inUse() == 0
+
+
+def test_device_time():
+    pool = FramePool()
+    pool.allocate((2, 2), 8)
+    sets = []
+    sync = FrameSync(2, 1000, lambda frames, tstamps: sets.append(tstamps), devicetime=True)
+    push(sync, 0, makeFrame(pool, 0, 5000))
+    push(sync, 1, makeFrame(pool, 900000, 5500))  # Host times far apart, device times within the tolerance
+    assert sets == [[5000, 5500]]
+    assert pool.inUse() == 0
+
+
+def test_stalled_device_bounded():
+    pool = FramePool()
+    pool.allocate((2, 2), 8)
+    sync = FrameSync(2, 1000, lambda frames, tstamps: None, maxlen=3)
+    for k in range(6):  # Device 1 delivers nothing
+        push(sync, 0, makeFrame(pool, k * 10000))
+    assert len(sync.queues[0]) == 3
+    assert sync.unmatched == [3, 0]
+    assert pool.inUse() == 3
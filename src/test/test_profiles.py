@@ -0,0 +1,48 @@
+import os
+from profiles import ProfileManager, legacyfile
+
+
+def test_trigger_toggle_updates_cache(handler):
+    profiles = ProfileManager(handler)
+    profile = profiles.save("off")
+    assert profile["nodes"]["Trigger"].upper() == "OFF"
+    handler.dirty = False
+    handler.toggleTrigger()
+    assert handler.dirty
+    assert handler.readNode("Trigger").upper() == "ON"
+    ret = profiles.load("off")
+    assert ret["written"] == ["Trigger"]
+    assert handler.readNode("Trigger").upper() == "OFF"
+
+
+def test_diff_writes_only_changes(handler):
+    profiles = ProfileManager(handler)
+    profile = profiles.capture()
+    assert profiles.diff(profile["nodes"]) == []
+    profile["nodes"]["ExposureTime"] = 2000
+    profile["nodes"]["Width"] = 32
+    profile["nodes"]["OffsetX"] = 16
+    assert [prop for prop, val in profiles.diff(profile["nodes"])] == ["Width", "OffsetX", "ExposureTime"]
+    ret = profiles.apply(profile)
+    assert ret["failed"] == [] and ret["restart"] == []
+    assert handler.getProperty("Width") == 32 and handler.getProperty("OffsetX") == 16
+
+
+def test_offset_before_size_when_moving_back(handler):
+    handler.setProperty("Width", 32)
+    handler.setProperty("OffsetX", 32)
+    profiles = ProfileManager(handler)
+    nodes = {"Width": 48, "OffsetX": 0}  # The larger width fits only once the offset has moved
+    assert [prop for prop, val in profiles.diff(nodes)] == ["OffsetX", "Width"]
+    assert profiles.apply({"nodes": nodes})["failed"] == []
+    assert handler.getProperty("Width") == 48
+
+
+def test_legacy_default(handler):
+    os.makedirs(os.path.dirname(legacyfile), exist_ok=True)
+    with open(legacyfile, 'w') as file:
+        file.write("None\n7\n100\n320\n240\n8\n16\n")
+    profile = ProfileManager(handler).read("default")
+    assert profile["version"] == 1
+    assert profile["handler"]["bufnum"] == 7 and profile["handler"]["savepth"] is None
+    assert profile["handler"]["offsety"] == 16
@@ -0,0 +1,112 @@
+import os
+import numpy
+import pytest
+from engine import AcquisitionEngine
+from sequenceReader import SequenceReader, findRecordings
+
+
+# Function for recording a session of the simulated device through the engine and the image writer
+# input: camHand, camHandler object with an opened device
+# input: frames, number of frames to acquire
+# return: AcquisitionEngine object of the finished session
+def record(camHand, frames):
+    engine = AcquisitionEngine(camHand)
+    engine.addConsumer(camHand.storeFrame)
+    camHand.startWriter()
+    engine.start(frames, 10.0)
+    engine.wait()
+    camHand.stopWriter()
+    return engine
+
+
+# Function for opening the only raw recording of the handler
+# input: camHand, camHandler object that recorded in the raw storage mode
+# return: SequenceReader object
+def readRecording(camHand):
+    paths = findRecordings(camHand.savepth)
+    assert len(paths) == 1
+    return SequenceReader(paths[0])
+
+
+def test_raw_recording(handler):
+    handler.recmode = "raw"
+    engine = record(handler, 30)
+    assert engine.framecount == 30
+    assert handler.pool.inUse() == 0
+    reader = readRecording(handler)
+    assert len(reader) == 30
+    assert reader.shape == (48, 64)
+    assert reader.pixform == "Mono8"
+    assert numpy.all(numpy.diff(reader.frameids.astype(numpy.int64)) == 1)
+    assert numpy.all(numpy.diff(reader.devtstamps.astype(numpy.int64)) > 0)
+    assert reader.frame(0).max() > 0  # Pattern data, not an empty buffer
+    assert handler.stats.get("lost") == 0
+    reader.close()
+
+
+def test_pipeline_binning(handler):
+    handler.recmode = "raw"
+    handler.binning = 2
+    handler.updatePipeline()
+    record(handler, 10)
+    assert handler.pool.inUse() == 0
+    reader = readRecording(handler)
+    assert len(reader) == 10
+    assert reader.shape == (24, 32)
+    reader.close()
+
+
+@pytest.mark.parametrize("handler", [{"pixelformat": "BayerRG8"}], indirect=True)
+def test_pipeline_demosaic(handler):
+    handler.recmode = "raw"
+    record(handler, 10)
+    reader = readRecording(handler)
+    assert reader.shape == (48, 64, 3)
+    reader.close()
+    handler.rawbayer = True
+    handler.updatePipeline()
+    record(handler, 10)
+    reader = SequenceReader(findRecordings(handler.savepth)[-1])  # Named by the start time, later sorts last
+    assert reader.shape == (48, 64)
+    assert reader.pixform == "BayerRG8"
+    assert reader.stack(range(2), rgb=True).shape == (2, 48, 64, 3)
+    reader.close()
+
+
+@pytest.mark.parametrize("handler", [{"droprate": 0.3}], indirect=True)
+def test_lost_frames(handler):
+    handler.recmode = "raw"
+    record(handler, 40)
+    reader = readRecording(handler)
+    frameids = reader.frameids.astype(numpy.int64)
+    assert len(reader) == 40
+    assert handler.stats.get("lost") == frameids[-1] - frameids[0] + 1 - len(reader)  # Every gap is counted
+    assert handler.pool.inUse() == 0
+    reader.close()
+
+
+def test_image_files(handler):
+    handler.recmode = "image"
+    handler.imgformat = "png"
+    handler.writernum = 2
+    record(handler, 15)
+    assert handler.pool.inUse() == 0
+    assert handler.writer.enqueued == 15
+    assert len([name for name in os.listdir(handler.savepth) if name.endswith(".png")]) == 15
+
+
+def test_failing_consumer_stops_acquisition(handler):
+    def consumer(frame, tstamp):
+        raise RuntimeError("consumer failed")
+
+    engine = AcquisitionEngine(handler)
+    engine.addConsumer(consumer)
+    handler.acquire = True
+    with pytest.raises(RuntimeError):
+        engine.run(10, 5.0)
+    assert not handler.acquire
+    assert not handler.cam.is_acquiring()
+    assert handler.pool.inUse() == 0
+    handler.errlog.flush()
+    with open(handler.logfname, 'r') as file:
+        assert "consumer failed" in file.read()
@@ -0,0 +1,28 @@
+import camHandler
+from camHandler import readCapabilities, storeCapabilities
+
+
+def test_capabilities_cached(handler):
+    caps = readCapabilities()
+    assert len(caps) == 1
+    key, entry = list(caps.items())[0]
+    assert entry["nodes"]["Width"] == ["Width"]
+    handler.changeCam(-1)
+    handler.closeWarm()
+    handler.changeCam(0)  # Opened with the cached node names
+    assert sorted(handler.caps) == sorted(entry["nodes"])
+
+
+def test_cached_description_file(handler, monkeypatch, tmp_path):
+    key = list(readCapabilities())[0]
+    xml = tmp_path / "device.xml"
+    xml.write_text("<RegisterDescription/>")
+    entry = readCapabilities()[key]
+    entry["xml"] = str(xml)
+    storeCapabilities(key, entry)
+    monkeypatch.setattr(camHandler, "cachexml", True)
+    handler.changeCam(-1)
+    handler.closeWarm()
+    handler.changeCam(0)  # Passes the stored file to create_image_acquirer
+    assert handler.cam is not None
+    assert handler.getProperty("Width") == 64
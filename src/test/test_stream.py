@@ -0,0 +1,33 @@
+import asyncio
+import contextlib
+
+
+def test_stream_frames(handler):
+    async def consume():
+        shapes = []
+        async for frame in handler.stream(maxsize=4, maxframes=10):
+            shapes.append(frame.data.shape)
+        return shapes
+
+    assert asyncio.run(consume()) == [(48, 64)] * 10
+    assert not handler.acquire and not handler.cam.is_acquiring()
+    assert handler.pool.inUse() == 0
+
+
+def test_stream_closed_on_break(handler):
+    async def consume():
+        async with contextlib.aclosing(handler.stream()) as frames:
+            async for frame in frames:
+                if frame.frameid >= 5:
+                    break
+        return handler.acquire, handler.cam.is_acquiring(), handler.pool.inUse()
+
+    assert asyncio.run(consume()) == (False, False, 0)
+
+
+def test_property_async(handler):
+    async def change():
+        await handler.setPropertyAsync("ExposureTime", 2000)
+        return await handler.getPropertyAsync("ExposureTime")
+
+    assert asyncio.run(change()) == 2000
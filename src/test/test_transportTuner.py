@@ -0,0 +1,22 @@
+import pytest
+from camHandler import pcktsizes
+from transportTuner import TransportTuner
+
+
+def test_measure_uses_device_time(handler):
+    tuner = TransportTuner(handler)
+    tuner.frames = 20
+    res = tuner.measure(handler.getProperty("PacketSize"), 0)
+    assert res["clean"]
+    assert res["fps"] == pytest.approx(handler.getProperty("FPS"), rel=0.05)
+
+
+@pytest.mark.parametrize("handler", [{"mtu": 1500}], indirect=True)
+def test_tune_respects_mtu(handler):
+    tuner = TransportTuner(handler)
+    tuner.frames = 10
+    res = tuner.tune()
+    assert res is not None
+    assert res["PacketSize"] == max(size for size in pcktsizes if size <= 1500)
+    assert pcktsizes[handler.getProperty("PacketSize")] == res["PacketSize"]
+    assert tuner.applyStored()
@@ -0,0 +1,47 @@
+import numpy
+from framePool import FramePool
+from writerQueue import WriterQueue
+
+
+def test_stopped_writer_releases_frame():
+    pool = FramePool()
+    pool.allocate((4, 4), 2)
+    writer = WriterQueue(lambda *args: None)
+    frame = pool.lease()
+    assert not writer.put(frame.data, 0, frame)  # Not started
+    frame.release()
+    assert writer.dropped == 1
+    assert pool.inUse() == 0
+
+
+def test_spill_drains_to_queue():
+    writer = WriterQueue(lambda *args: None)
+    writer.configure(2, 1, "spill", 2 * 16)
+    writer.running = True  # Accepting images without workers, the test takes them from the queue itself
+    imag = numpy.zeros((4, 4), dtype=numpy.uint8)
+    for i in range(4):  # Two queued, two spilled
+        assert writer.put(imag, i)
+    assert writer.spilled == 2
+    assert not writer.put(imag, 4)  # Queue and spill buffer full
+    writer.queue.popleft()  # A worker took an image, the queue has room again
+    assert writer.put(imag, 5)
+    assert [entry[1] for entry in writer.queue] == [1, 2]  # Oldest spilled image moved to the queue first
+    assert [entry[1] for entry in writer.spill] == [3, 5]
+    assert writer.dropped == 1
+
+
+def test_failed_write_logged():
+    messages = []
+
+    def write(imag, tstamp, frameid, devtstamp):
+        raise OSError("disk full")
+
+    writer = WriterQueue(write, messages.append)
+    writer.configure(4, 1, "block", 0)
+    writer.start()
+    for i in range(3):
+        writer.put(numpy.zeros(4, dtype=numpy.uint8), i)
+    writer.stop()
+    assert writer.failed == 3
+    assert len(messages) == 1  # Rate limited
+    assert "disk full" in messages[0]
@@ -0,0 +1,171 @@
+import datetime
+import json
+import os
+import genicam.genapi
+from camHandler import pcktsizes
+from engine import AcquisitionEngine
+
+# Static Defines
+transportfile = "cfgs/transport.json"  # Tuned transport settings per device
+
+
+# Class for tuning the GigE Vision transport settings of a device with short test acquisitions
+# Packet sizes are tried from the largest down. For each size the smallest inter-packet delay that delivers every
+# frame complete is searched (a longer delay spreads the packets but lowers the frame rate the link can carry), and
+# the clean setting with the highest delivered frame rate wins. The search stops at the first size reaching the frame
+# rate set on the device. The frame delay only matters when devices share a link and is kept as set.
+class TransportTuner:
+    # Initialization method
+    # input: handler, camHandler object with an active device
+    def __init__(self, handler):
+        self.camHand = handler  # camHandler object of the device
+        self.frames = 20  # Number of frames in a test acquisition
+        self.duration = 2.0  # Maximum length of a test acquisition (in s)
+        self.steps = 8  # Number of halvings of the largest inter-packet delay tried
+        self.results = []  # Results of the test acquisitions of the last sweep
+
+    # Method for getting the key the settings of the device are stored under
+    # return: string of the model name and serial number
+    def deviceKey(self):
+        return "{0}_{1}".format(self.camHand.getProperty("ModelName"), self.camHand.getProperty("SerialNumber"))
+
+    # Method for getting the packet sizes the device accepts
+    # return: list of indices in camHandler.pcktsizes
+    def packetSizes(self):
+        cam = self.camHand
+        name, node, scale = cam.caps["PacketSize"][0]
+        if name == "PacketSize":  # Enumeration with values such as Size1440
+            return [i for i in range(len(pcktsizes)) if "Size%d" % pcktsizes[i] in node.symbolics]
+        low, high = cam.getProperty("MinPacketSize"), cam.getProperty("MaxPacketSize")
+        return [i for i in range(len(pcktsizes)) if low <= pcktsizes[i] <= high]
+
+    # Method for running a test acquisition with the given settings
+    # input: size, index of the packet size in camHandler.pcktsizes
+    # input: delay, inter-packet delay (in ticks)
+    # return: dictionary with the settings, delivered frame rate and the frame losses
+    def measure(self, size, delay):
+        cam = self.camHand
+        cam.setProperty("PacketSize", size)
+        cam.setProperty("PacketInterval", delay)
+        tstamps = []
+        engine = AcquisitionEngine(cam)
+        engine.addConsumer(lambda frame, tstamp: tstamps.append(frame.devtstamp))  # Device time (in ns)
+        cam.resetStats()  # The counters of the previous test must not end this one
+        engine.start(self.frames, self.duration)
+        while engine.thread.is_alive():  # Give up on the setting after a few broken frames
+            if cam.stats.get("incomplete") + cam.stats.get("lost") >= 3:
+                cam.acquire = False
+            engine.thread.join(0.05)
+        engine.wait()
+        fps = 0.0
+        if len(tstamps) > 1 and tstamps[-1] > tstamps[0]:  # Frame rate from the device timestamps, without start up
+            fps = (len(tstamps) - 1) * 1e9 / (tstamps[-1] - tstamps[0])
+        ret = {"PacketSize": pcktsizes[size], "PacketInterval": delay, "fps": fps, "frames": len(tstamps)}
+        for key in ["incomplete", "lost", "timeouts"]:
+            ret[key] = cam.stats.get(key)
+        # Timeouts are reported but not judged, at low frame rates the fetch times out between frames
+        ret["clean"] = ret["frames"] > 1 and ret["incomplete"] == 0 and ret["lost"] == 0
+        self.results.append(ret)
+        return ret
+
+    # Method for finding the smallest clean inter-packet delay for a packet size
+    # input: size, index of the packet size in camHandler.pcktsizes
+    # input: delays, increasing inter-packet delays to choose from
+    # return: result of the test acquisition with the chosen delay, None if no delay is clean
+    def sweepDelay(self, size, delays):
+        ret = self.measure(size, delays[0])
+        if ret["clean"]:
+            return ret
+        low, high = 0, len(delays) - 1
+        ret = self.measure(size, delays[high])
+        if not ret["clean"]:  # e.g. packets larger than the network path allows
+            return None
+        while high - low > 1:  # A longer delay only lowers the packet rate, so cleanliness is monotonic
+            mid = (low + high) // 2
+            res = self.measure(size, delays[mid])
+            if res["clean"]:
+                high = mid
+                ret = res
+            else:
+                low = mid
+        return ret
+
+    # Method for sweeping the transport settings and applying the best one, the device must not be acquiring
+    # return: dictionary of the applied settings and their test result, None if no setting delivered every frame
+    #         (the original settings are restored then)
+    def tune(self):
+        cam = self.camHand
+        if cam.cam is None or "PacketSize" not in cam.caps:
+            return None
+        original = (cam.getProperty("PacketSize"), cam.getProperty("PacketInterval"))
+        autobuf = cam.autobuf
+        cam.autobuf = False  # Test acquisitions must not retune the buffers
+        target = cam.getProperty("FPS")
+        maxdelay = cam.getProperty("MaxPacketInterval") or 0
+        delays = sorted(set([0] + [maxdelay >> k for k in range(self.steps, -1, -1)]))
+        self.results = []
+        best = None
+        try:
+            for size in sorted(self.packetSizes(), reverse=True):
+                res = self.sweepDelay(size, delays)
+                if res is None:
+                    continue
+                if best is None or res["fps"] > best["fps"] * 1.01:  # Larger packets win within measuring accuracy
+                    best = res
+                if res["fps"] >= 0.99 * target:
+                    break
+        finally:
+            cam.autobuf = autobuf
+        if best is None:
+            cam.setProperty("PacketSize", original[0])
+            cam.setProperty("PacketInterval", original[1])
+            cam.logerror("Info: Transport tuning found no setting delivering every frame, {0} settings tried".format(
+                len(self.results)))
+            return None
+        cam.setProperty("PacketSize", pcktsizes.index(best["PacketSize"]))
+        cam.setProperty("PacketInterval", best["PacketInterval"])
+        ret = {"PacketSize": best["PacketSize"], "PacketInterval": best["PacketInterval"],
+               "FrameDelay": cam.getProperty("FrameDelay") or 0, "fps": best["fps"],
+               "date": datetime.datetime.now().isoformat(timespec="seconds")}
+        cam.logerror("Info: Transport tuned to packet size {0}, packet interval {1} at {2:.1f} FPS "
+                     "(target {3:.1f}, {4} settings tried)".format(ret["PacketSize"], ret["PacketInterval"], ret["fps"],
+                                                                  target, len(self.results)))
+        self.store(ret)
+        return ret
+
+    # Method for reading the tuned settings of every device
+    # return: dictionary of device key to settings
+    def readStore(self):
+        try:
+            with open(transportfile, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    # Method for storing tuned settings of the device
+    # input: settings, dictionary of the settings
+    def store(self, settings):
+        data = self.readStore()
+        data[self.deviceKey()] = settings
+        os.makedirs(os.path.dirname(transportfile), exist_ok=True)
+        with open(transportfile, 'w') as file:
+            json.dump(data, file, indent=1)
+
+    # Method for applying the stored settings of the device, called when the device is opened
+    # return: boolean, were stored settings found and applied?
+    def applyStored(self):
+        settings = self.readStore().get(self.deviceKey())
+        if settings is None:
+            return False
+        cam = self.camHand
+        try:
+            if settings["PacketSize"] in pcktsizes:
+                cam.setProperty("PacketSize", pcktsizes.index(settings["PacketSize"]))
+            cam.setProperty("PacketInterval", settings["PacketInterval"])
+            if "FrameDelay" in cam.caps:
+                cam.setProperty("FrameDelay", settings["FrameDelay"])
+        except (genicam.genapi.LogicalErrorException, genicam.genapi.OutOfRangeException,
+                genicam.genapi.AccessException) as e:
+            cam.logerror("Warning: Stored transport settings could not be applied: {0}".format(e))
+            return False
+        return True
@@ -0,0 +1,187 @@
+import collections
+import threading
+import time
+
+# Static Defines
+overflowpolicies = ["block", "dropoldest", "dropnewest", "spill"]
+
+
+# Class for the image storage pipeline, a bounded queue feeding a pool of writer workers
+class WriterQueue:
+    # Initialization method
+    # input: write, function called by the workers to store an image, write(imag, tstamp, frameid, devtstamp)
+    # input: log, function called with the messages of failed writes (e.g. camHandler.logerror), None for no logging
+    def __init__(self, write, log=None):
+        self.write = write  # Function used to store a single image
+        self.log = log  # Function used to report failed writes
+        self.size = 32  # Maximum number of images in the queue
+        self.workernum = 4  # Number of writer workers
+        self.overflow = "block"  # Policy used when the queue is full, one of overflowpolicies
+        self.spillsize = 512 * 1024 * 1024  # Maximum size of the RAM spill buffer in bytes
+
+        self.cond = threading.Condition()  # Condition guarding the queues and counters
+        self.queue = collections.deque()  # Queued images as (imag, tstamp, frameid, devtstamp, frame) tuples
+        self.spill = collections.deque()  # Images copied to RAM after the queue filled up
+        self.spillbytes = 0  # Current size of the spill buffer in bytes
+        self.workers = []  # Running worker threads
+        self.running = False  # Are the workers accepting images?
+        self.busy = 0  # Number of workers currently writing an image
+        self.lastlog = 0  # Time the last failed write was logged (time.perf_counter)
+        self.unlogged = 0  # Failed writes since the last logged one
+
+        # Counters, enqueued == written + failed + dropped (oldest) + pending
+        self.enqueued = 0  # Images accepted to the queue or spill buffer
+        self.written = 0  # Images stored by the workers
+        self.dropped = 0  # Images lost because of the overflow policy
+        self.failed = 0  # Images whose write raised an exception
+        self.spilled = 0  # Images moved to the spill buffer
+
+    # Method for changing the queue settings, applied on the next start
+    # input: size, maximum number of images in the queue
+    # input: workernum, number of writer workers
+    # input: overflow, overflow policy, one of overflowpolicies
+    # input: spillsize, maximum size of the spill buffer in bytes
+    def configure(self, size, workernum, overflow, spillsize):
+        if overflow not in overflowpolicies:
+            raise ValueError("Unknown overflow policy: %s" % overflow)
+        with self.cond:
+            self.size = max(1, size)
+            self.overflow = overflow
+            self.spillsize = spillsize
+        if self.running and workernum != len(self.workers):
+            self.stop()
+        self.workernum = max(1, workernum)
+
+    # Method for starting the writer workers
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.workers = []
+        for i in range(self.workernum):
+            worker = threading.Thread(target=self.run, name="ImageWriter%d" % i, daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    # Method for stopping the writer workers after the queued images are written
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    # Method for resetting the counters
+    def resetCounters(self):
+        with self.cond:
+            self.enqueued = len(self.queue) + len(self.spill) + self.busy
+            self.written = 0
+            self.dropped = 0
+            self.failed = 0
+            self.spilled = 0
+
+    # Method for getting the number of images waiting to be written
+    # return: number of images in the queue and spill buffer
+    def depth(self):
+        with self.cond:
+            return len(self.queue) + len(self.spill)
+
+    # Method for adding an image to the queue
+    # input: imag, image to be stored
+    # input: tstamp, timestamp of the image
+    # input: frame, leased Frame backing the image, released once the image is written or dropped
+    # return: boolean, was the image accepted?
+    def put(self, imag, tstamp, frame=None):
+        if frame is not None:
+            frame.retain()
+            item = (imag, tstamp, frame.frameid, frame.devtstamp, frame)
+        else:
+            item = (imag, tstamp, 0, 0, None)
+        evicted = None
+        with self.cond:
+            if self.overflow == "block":
+                while self.running and len(self.queue) >= self.size:
+                    self.cond.wait()
+            if self.running:
+                self.drainSpill()
+            if not self.running:
+                self.dropped += 1
+                evicted = item
+                item = None
+            elif len(self.queue) < self.size:
+                self.queue.append(item)
+            elif self.overflow == "dropoldest":
+                evicted = self.queue.popleft()
+                self.queue.append(item)
+                self.dropped += 1
+            elif self.overflow == "spill" and self.spillbytes + imag.nbytes <= self.spillsize:
+                # Copy the image to RAM so the frame can return to the pool, keeps the order of arrival
+                self.spill.append((imag.copy(), tstamp, item[2], item[3], None))
+                self.spillbytes += imag.nbytes
+                self.spilled += 1
+                evicted = item
+            else:  # dropnewest, or spill buffer full
+                self.dropped += 1
+                evicted = item
+                item = None
+            if item is not None:
+                self.enqueued += 1
+                self.cond.notify()
+        if evicted is not None and evicted[4] is not None:
+            evicted[4].release()
+        return item is not None
+
+    # Method for moving spilled images to the queue while it has room, the spilled images are older than the ones
+    # arriving (lock must be held)
+    def drainSpill(self):
+        while len(self.spill) > 0 and len(self.queue) < self.size:
+            entry = self.spill.popleft()
+            self.spillbytes -= entry[0].nbytes
+            self.queue.append(entry)
+
+    # Method for reporting a failed write, at most once a second
+    # input: frameid, frame number of the image
+    # input: error, exception raised by the write
+    def logFailure(self, frameid, error):
+        with self.cond:
+            now = time.perf_counter()
+            if now - self.lastlog < 1.0:
+                self.unlogged += 1
+                return
+            skipped = self.unlogged
+            self.lastlog = now
+            self.unlogged = 0
+        if self.log is not None:
+            self.log("Warning: Writing image failed, FrameID:{0}: {1!r}{2}".format(
+                frameid, error, " ({0} more failures not logged)".format(skipped) if skipped > 0 else ""))
+
+    # Method describing the worker runtime behaviour
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and len(self.queue) == 0 and len(self.spill) == 0:
+                    self.cond.wait()
+                if len(self.queue) > 0:
+                    imag, tstamp, frameid, devtstamp, frame = self.queue.popleft()
+                elif len(self.spill) > 0:
+                    imag, tstamp, frameid, devtstamp, frame = self.spill.popleft()
+                    self.spillbytes -= imag.nbytes
+                else:  # Stopped and drained
+                    return
+                self.busy += 1
+                self.cond.notify_all()  # Wake producers blocked on a full queue
+            ok = True
+            try:
+                self.write(imag, tstamp, frameid, devtstamp)
+            except Exception as e:
+                ok = False
+                self.logFailure(frameid, e)
+            if frame is not None:
+                frame.release()
+            with self.cond:
+                self.busy -= 1
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1